@@ -0,0 +1,235 @@
+"""
+This module implements company-wide salary and age analytics for API endpoints.
+
+Employee columns needed by the analytics are fetched with a single columnar query
+and converted to NumPy arrays. Grouped statistics are computed with vectorized array
+operations: rows are sorted by group key and contiguous segments are reduced
+(numpy ufunc reduceat), so no Python code runs per employee after the query.
+Salaries are aggregated as integer cents to keep sums exact.
+
+The schema keeps only current salaries (there are no hire or termination dates),
+so payroll totals are reported for the current state rather than over time.
+"""
+
+from datetime import date
+import numpy as np
+from department_app import db
+from department_app.models.entities import Department, Employee
+
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+DEFAULT_AGE_BAND = 10
+DEFAULT_TOP_EARNERS = 10
+MAX_TOP_EARNERS = 1000
+MONEY_STATISTICS = {"sum": "salary_sum", "mean": "average_monthly_salary", "stddev": "salary_stddev",
+                    "min": "salary_min", "max": "salary_max"}
+
+
+class EmployeeColumns:
+    """
+    This class holds employee data needed by analytics as NumPy arrays of equal length.
+
+    Attributes:
+    ids: employee ids (int64 array).
+    department_ids: department ids (int64 array).
+    salaries: monthly salaries in cents (int64 array).
+    dates_of_birth: dates of birth (datetime64[D] array).
+    """
+
+    def __init__(self, ids, department_ids, salaries, dates_of_birth):
+        self.ids = ids
+        self.department_ids = department_ids
+        self.salaries = salaries
+        self.dates_of_birth = dates_of_birth
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, filters=()) -> 'EmployeeColumns':
+        """
+        Fetches columns of employees matching filters with a single query.
+
+        Returns: EmployeeColumns.
+        """
+        rows = db.session.execute(db.select(Employee.id, Employee.department_id, Employee.monthly_salary,
+                                            Employee.date_of_birth).where(*filters)).all()
+        ids, department_ids, salaries, dates_of_birth = zip(*rows) if rows else ((), (), (), ())
+        return cls(np.array(ids, dtype=np.int64), np.array(department_ids, dtype=np.int64),
+                   np.rint(np.array(salaries, dtype=np.float64) * 100).astype(np.int64),
+                   np.array(dates_of_birth, dtype="datetime64[D]"))
+
+    def ages(self, on: date = None) -> np.ndarray:
+        """
+        Computes ages in full years on the given date (today by default).
+
+        Returns: int64 array.
+        """
+        on = on or date.today()
+        years = self.dates_of_birth.astype("datetime64[Y]").astype(np.int64) + 1970
+        months = self.dates_of_birth.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        days = (self.dates_of_birth - self.dates_of_birth.astype("datetime64[M]")).astype(np.int64) + 1
+        not_yet = (months > on.month) | ((months == on.month) & (days > on.day))
+        return on.year - years - not_yet
+
+
+def parse_int_arg(args: dict, name: str, default: int, maximum: int = None) -> int:
+    """
+    Gets positive integer request argument.
+
+    Returns: int.
+    """
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        raise ValueError("{} must be an integer".format(name.capitalize()))
+    if value < 1 or (maximum is not None and value > maximum):
+        raise ValueError("{} must be between 1 and {}".format(name.capitalize(), maximum) if maximum
+                         else "{} must be positive".format(name.capitalize()))
+    return value
+
+
+def grouped_salary_statistics(keys: np.ndarray, salaries: np.ndarray) -> tuple:
+    """
+    Computes salary statistics of groups of employees with equal keys.
+    Salaries (in cents) are sorted within groups, so minimums, maximums and
+    linearly interpolated percentiles are read at computed positions of segments.
+
+    Returns: tuple (array of unique keys, dict mapping statistic name to array of values).
+    """
+    order = np.lexsort((salaries, keys))
+    keys, salaries = keys[order], salaries[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    if not len(groups):
+        return groups, {}
+    sums = np.add.reduceat(salaries, starts)
+    means = sums / counts
+    deviations = np.sqrt(np.add.reduceat((salaries - np.repeat(means, counts)) ** 2, starts) / counts)
+    statistics = {"count": counts, "sum": sums, "mean": means, "stddev": deviations,
+                  "min": salaries[starts], "max": salaries[starts + counts - 1]}
+    for fraction in PERCENTILES:
+        position = starts + fraction * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        weight = position - lower
+        statistics[_percentile_name(fraction)] = salaries[lower] * (1 - weight) + salaries[upper] * weight
+    return groups, statistics
+
+
+def _percentile_name(fraction: float) -> str:
+    return "p{}".format(round(fraction * 100))
+
+
+def _money(cents) -> float:
+    return round(float(cents) / 100, 2)
+
+
+def _statistics_dicts(statistics: dict, count: int) -> list:
+    """
+    Converts arrays of grouped salary statistics to a list of per-group dicts with money values.
+
+    Returns: list of dict.
+    """
+    result = []
+    for index in range(count):
+        item = {"employees_count": int(statistics["count"][index])}
+        for key, name in MONEY_STATISTICS.items():
+            item[name] = _money(statistics[key][index])
+        item["percentiles"] = {_percentile_name(fraction): _money(statistics[_percentile_name(fraction)][index])
+                               for fraction in PERCENTILES}
+        result.append(item)
+    return result
+
+
+def _department_names(ids) -> dict:
+    ids = [int(id) for id in ids]
+    if not ids:
+        return {}
+    return dict(db.session.query(Department.id, Department.name).filter(Department.id.in_(ids)))
+
+
+def salary_analytics(args: dict) -> dict:
+    """
+    Computes salary statistics of the whole company and of every department for employees
+    matching filters described in Employee.search_filters.
+
+    Returns: dict.
+    """
+    columns = EmployeeColumns.load(Employee.search_filters(args))
+    _, company = grouped_salary_statistics(np.zeros(len(columns), dtype=np.int64), columns.salaries)
+    groups, departments = grouped_salary_statistics(columns.department_ids, columns.salaries)
+    names = _department_names(groups)
+    return {"company": _statistics_dicts(company, 1)[0] if company else {"employees_count": 0},
+            "departments": [dict(item, department_id=int(id), name=names.get(int(id)))
+                            for id, item in zip(groups, _statistics_dicts(departments, len(groups)))]}
+
+
+def age_analytics(args: dict) -> dict:
+    """
+    Computes employee counts and salary statistics by age bands of width given by
+    "band" argument (in years), for the whole company and for every department.
+
+    Returns: dict.
+    """
+    width = parse_int_arg(args, "band", DEFAULT_AGE_BAND, 100)
+    columns = EmployeeColumns.load(Employee.search_filters(args))
+    bands = np.maximum(columns.ages(), 0) // width
+    band_count = int(bands.max()) + 1 if len(bands) else 1
+
+    def band_dicts(groups, statistics):
+        return [dict(item, age_from=int(band) * width, age_to=(int(band) + 1) * width)
+                for band, item in zip(groups, _statistics_dicts(statistics, len(groups)))]
+
+    company = band_dicts(*grouped_salary_statistics(bands, columns.salaries))
+    groups, statistics = grouped_salary_statistics(columns.department_ids * band_count + bands, columns.salaries)
+    department_ids = groups // band_count
+    names = _department_names(np.unique(department_ids))
+    departments = {}
+    for department_id, item in zip(department_ids, band_dicts(groups % band_count, statistics)):
+        department = departments.setdefault(int(department_id), {"department_id": int(department_id),
+                                                                  "name": names.get(int(department_id)),
+                                                                  "bands": []})
+        department["bands"].append(item)
+    return {"band": width, "company": company, "departments": list(departments.values())}
+
+
+def top_earners(args: dict) -> list:
+    """
+    Finds n (given by "n" argument) employees with the highest salaries among employees
+    matching filters described in Employee.search_filters. Ties are ordered by id.
+
+    Returns: list of Employee.
+    """
+    n = parse_int_arg(args, "n", DEFAULT_TOP_EARNERS, MAX_TOP_EARNERS)
+    columns = EmployeeColumns.load(Employee.search_filters(args))
+    if not len(columns):
+        return []
+    if n < len(columns):
+        threshold = np.partition(columns.salaries, len(columns) - n)[len(columns) - n]
+        candidates = np.flatnonzero(columns.salaries >= threshold)
+    else:
+        candidates = np.arange(len(columns))
+    order = candidates[np.lexsort((columns.ids[candidates], -columns.salaries[candidates]))][:n]
+    ids = [int(id) for id in columns.ids[order]]
+    employees = {employee.id: employee for employee in Employee.query.filter(Employee.id.in_(ids))}
+    return [employees[id] for id in ids]
+
+
+def payroll_analytics(args: dict) -> dict:
+    """
+    Computes current monthly and annual payroll totals of the whole company and of every department
+    for employees matching filters described in Employee.search_filters.
+
+    Returns: dict.
+    """
+    columns = EmployeeColumns.load(Employee.search_filters(args))
+    groups, counts = np.unique(np.sort(columns.department_ids), return_counts=True)
+    totals = np.bincount(np.searchsorted(groups, columns.department_ids), weights=columns.salaries,
+                         minlength=len(groups)) if len(groups) else np.zeros(0)
+    company = int(columns.salaries.sum())
+    names = _department_names(groups)
+    return {"company": {"employees_count": len(columns), "monthly_payroll": _money(company),
+                        "annual_payroll": _money(company * 12)},
+            "departments": [{"department_id": int(id), "name": names.get(int(id)), "employees_count": int(count),
+                             "monthly_payroll": _money(total), "annual_payroll": _money(total * 12),
+                             "payroll_share": round(float(total) / company, 4) if company else None}
+                            for id, count, total in zip(groups, counts, totals)]}
@@ -0,0 +1,232 @@
+"""
+This module implements asyncio based variant of the read API for high-concurrency clients.
+
+The ASGI application serves the same GET routes with the same JSON documents as the corresponding
+flask API views (/api, /api/departments, /api/departments/<id>, /api/employees, /api/employees/<id>
+and /api/changes),
+reusing models' to_api_dict, search and pagination code, but runs queries with SQLAlchemy
+asynchronous sessions, so a waiting database call does not block a worker thread and a single
+process can serve thousands of concurrent keep-alive clients, including consumers long-polling
+the change feed. Writes are served by the flask application.
+
+Configuration is loaded as for the flask application (see department_app.config) and the database URI
+is switched to the asynchronous driver of the same database (aiomysql, aiosqlite or asyncpg).
+Responses of this application are not cached by the flask response cache and always use the primary
+database. Run it with an ASGI server, e.g.:
+
+    uvicorn --factory --workers 4 --port 8001 department_app.asgi:create_asgi_app
+
+and compare it with the WSGI application using department_app.loadtest.
+"""
+
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qsl
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from department_app import create_app, db
+from department_app.config import engine_options
+from department_app.changelog import changes_content, changes_statement, parse_changes_args
+from department_app.models.entities import Department, Employee
+from department_app.pagination import keyset_page, keyset_page_statement, parse_limit
+from department_app.search import fulltext_index_exists, search_statement
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "mysql": "mysql+aiomysql", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(uri: str):
+    """
+    Converts database URI to the URL using asynchronous driver of the same database.
+
+    Returns: URL.
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError("No asynchronous driver for {} database".format(backend))
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def async_engine_options(config) -> dict:
+    """
+    Builds asynchronous engine options from the same settings as the flask application engine options.
+
+    Returns: dict.
+    """
+    options = engine_options(config)
+    if options.get("poolclass") is QueuePool:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    if "options" in options.get("connect_args", {}):
+        timeout = options.pop("connect_args")["options"].split("=")[1]
+        options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+    return options
+
+
+class ApiRequest:
+    """
+    This class holds data of an API request.
+
+    Attributes:
+    path: request path (str).
+    query_string: raw query string (str).
+    args: query arguments (dict), the first value of every argument.
+    """
+
+    def __init__(self, path: str, query_string: str):
+        self.path = path
+        self.query_string = query_string
+        self.args = {}
+        for key, value in parse_qsl(query_string, keep_blank_values=True):
+            self.args.setdefault(key, value)
+
+
+class AsyncApi:
+    """
+    This class implements ASGI application serving the read API with asynchronous database sessions.
+
+    Attributes:
+    config: application configuration (dict-like).
+    engine: asynchronous engine (AsyncEngine).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        url = async_database_url(config["SQLALCHEMY_DATABASE_URI"])
+        self.engine = create_async_engine(url, **async_engine_options(config))
+        self._has_fulltext_index = None
+        self._routes = [(re.compile(r"/api/?"), self.api),
+                        (re.compile(r"/api/departments"), self.departments_api),
+                        (re.compile(r"/api/departments/(\d+)"), self.view_department_api),
+                        (re.compile(r"/api/employees"), self.employees_api),
+                        (re.compile(r"/api/employees/(\d+)"), self.view_employee_api),
+                        (re.compile(r"/api/changes"), self.changes_api)]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        status, content = await self.dispatch(scope["method"], scope["path"],
+                                              scope["query_string"].decode("latin-1"))
+        body = (json.dumps(content, sort_keys=True, separators=(",", ":")) + "\n").encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body if scope["method"] != "HEAD" else b""})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def dispatch(self, method: str, path: str, query_string: str = "") -> tuple:
+        """
+        Finds the view matching the request path and calls it with a new asynchronous session.
+
+        Returns: tuple (status code, JSON content).
+        """
+        for pattern, view in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if method not in ("GET", "HEAD"):
+                return 405, {"error": "Method not allowed"}
+            async with AsyncSession(self.engine) as session:
+                try:
+                    return await view(session, ApiRequest(path, query_string), *map(int, match.groups()))
+                except ValueError as e:
+                    return 400, {"error": str(e)}
+        return 404, {"error": "Not found"}
+
+    async def has_fulltext_index(self, session) -> bool:
+        """
+        Returns True if the full-text index for employee name search exists (see search.fulltext_index_exists).
+
+        Returns: bool.
+        """
+        if self._has_fulltext_index is None:
+            connection = await session.connection()
+            self._has_fulltext_index = await connection.run_sync(fulltext_index_exists)
+        return self._has_fulltext_index
+
+    async def api(self, session, request) -> tuple:
+        """Returns links to supported root endpoints."""
+        return 200, {"links": {"departments": "/api/departments", "employees": "/api/employees",
+                               "changes": "/api/changes"}}
+
+    async def departments_api(self, session, request) -> tuple:
+        """Returns a page of departments listing."""
+        limit = parse_limit(request.args)
+        statement, values, backwards = keyset_page_statement(Department.select_with_statistics(),
+                                                             Department.statistics_order_by(), limit,
+                                                             request.args.get("cursor"))
+        items = (await session.execute(statement)).scalars().all()
+        page = keyset_page(items, lambda department: department.statistics_order_key, limit, values, backwards)
+        result = [{"content": department.to_api_dict(),
+                   "links": {"self": "/api/departments/{}".format(department.id)}} for department in page.items]
+        return 200, {"content": result, "links": page.links(request.path, request.query_string, request.args)}
+
+    async def view_department_api(self, session, request, id: int) -> tuple:
+        """Returns a single department record."""
+        statement = Department.select_with_statistics().filter(Department.id == id)
+        department = (await session.execute(statement)).scalars().first()
+        if not department:
+            return 404, {"error": "Department not found"}
+        return 200, {"content": department.to_api_dict(),
+                     "links": {"self": "/api/departments/{}".format(department.id)}}
+
+    async def employees_api(self, session, request) -> tuple:
+        """Returns a page of employees listing possibly filtered by name, birth date, department and salary."""
+        statement, make_page = search_statement(request.args, db.select(Employee), self.engine.dialect.name,
+                                                await self.has_fulltext_index(session))
+        page = make_page((await session.execute(statement)).scalars().all())
+        result = [{"content": employee.to_api_dict(),
+                   "links": {"self": "/api/employees/{}".format(employee.id),
+                             "department": "/api/departments/{}".format(employee.department_id)}}
+                  for employee in page.items]
+        return 200, {"content": result, "links": page.links(request.path, request.query_string, request.args)}
+
+    async def view_employee_api(self, session, request, id: int) -> tuple:
+        """Returns a single employee record."""
+        employee = await session.get(Employee, id)
+        if not employee:
+            return 404, {"error": "Employee not found"}
+        return 200, {"content": employee.to_api_dict(),
+                     "links": {"self": "/api/employees/{}".format(employee.id),
+                               "department": "/api/departments/{}".format(employee.department_id)}}
+
+    async def changes_api(self, session, request) -> tuple:
+        """
+        Returns a page of changes recorded after the change with sequence number given by since argument,
+        waiting up to wait seconds for changes if there are none yet.
+        """
+        since, limit, wait = parse_changes_args(request.args, self.config["CHANGES_MAX_WAIT"])
+        deadline = time.monotonic() + wait
+        while True:
+            changes = (await session.execute(changes_statement(since, limit))).scalars().all()
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            await session.rollback()
+            await asyncio.sleep(min(self.config["CHANGES_POLL_INTERVAL"], remaining))
+        return 200, changes_content(changes, since, request.path, request.args)
+
+
+def create_asgi_app(is_testing=False, config=None) -> AsyncApi:
+    """
+    Initializes and returns ASGI application instance serving the asynchronous read API,
+    configured in the same way as the flask application created by create_app
+    (without registering the flask blueprints, which are not used).
+
+    Returns: AsyncApi.
+    """
+    return AsyncApi(create_app(is_testing, dict(config or {}, UI_ENABLED=False, API_ENABLED=False)).config)
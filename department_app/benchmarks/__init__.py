@@ -0,0 +1,19 @@
+"""
+This package implements benchmarks of department app routes and model methods
+against generated data of configurable size, run on in-process SQLite, and of application startup:
+
+    python -m department_app.benchmarks --departments 20 --employees 100000
+    python -m department_app.benchmarks --employees 1000000 --rounds 5 --filter employees_api
+
+Results are compared with the stored baseline (department_app/benchmarks/baseline.json by default).
+The run fails if a benchmark exceeds its query budget or executes more SQL statements than
+in the baseline; benchmarks slower than the baseline by more than the tolerance are reported
+and fail the run only with --strict, as timings vary with the load of the machine.
+Timings also depend on the machine, so a baseline should be recorded (--save) on the machine
+where runs are compared, at the same data size.
+"""
+
+from .data import generate_data
+from .suite import (Benchmark, BenchmarkResult, RouteBenchmarks, all_benchmarks, compare_results,
+                    create_benchmark_app, load_baseline, measure, model_benchmarks, results_to_dict,
+                    run_benchmarks, save_baseline, startup_benchmarks, uncovered_routes)
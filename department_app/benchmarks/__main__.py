@@ -0,0 +1,74 @@
+"""
+This module implements command line interface of the benchmarks (see department_app.benchmarks).
+"""
+
+import os
+import sys
+import click
+from department_app.benchmarks import (all_benchmarks, compare_results, create_benchmark_app, load_baseline,
+                                       results_to_dict, run_benchmarks, save_baseline, startup_benchmarks,
+                                       uncovered_routes)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _milliseconds(seconds: float) -> str:
+    return "{:10.3f}".format(seconds * 1000)
+
+
+def _print_result(result):
+    summary = result.to_dict()
+    budget = "-" if result.max_queries is None else str(result.max_queries)
+    click.echo("{:48} {} {} {} {} {:>4}/{:<4}{}".format(
+        result.name, _milliseconds(summary["median"]), _milliseconds(summary["mean"]),
+        _milliseconds(summary["stddev"]), _milliseconds(summary["min"]), summary["queries"], budget,
+        "  OVER QUERY BUDGET" if result.over_budget else ""))
+
+
+@click.command()
+@click.option("--departments", default=20, show_default=True, type=click.IntRange(1),
+              help="Number of generated departments.")
+@click.option("--employees", default=10000, show_default=True, type=click.IntRange(0),
+              help="Number of generated employees.")
+@click.option("--seed", default=0, show_default=True, help="Seed of the data generator.")
+@click.option("--rounds", default=10, show_default=True, type=click.IntRange(1),
+              help="Number of measured rounds of every benchmark.")
+@click.option("--filter", "pattern", help="Run only benchmarks whose names contain this text.")
+@click.option("--baseline", default=DEFAULT_BASELINE, show_default=True, type=click.Path(dir_okay=False),
+              help="Baseline file to compare results with.")
+@click.option("--save", is_flag=True, help="Store results as the new baseline instead of comparing them.")
+@click.option("--tolerance", default=0.25, show_default=True, type=click.FloatRange(0),
+              help="Allowed slowdown compared with the baseline, as a fraction.")
+@click.option("--strict", is_flag=True, help="Fail if a benchmark is slower than allowed by the tolerance.")
+def main(departments, employees, seed, rounds, pattern, baseline, save, tolerance, strict):
+    """Runs benchmarks and compares results with the baseline."""
+    click.echo("Generating {} departments and {} employees...".format(departments, employees))
+    app = create_benchmark_app(departments, employees, seed)
+    benchmarks = all_benchmarks(app) + startup_benchmarks()
+    for route in uncovered_routes(app, benchmarks):
+        click.echo("Warning: route {} has no benchmark".format(route), err=True)
+    click.echo("{:48} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+        "benchmark (ms per call)", "median", "mean", "stddev", "min", "queries"))
+    results = run_benchmarks(benchmarks, rounds, pattern=pattern, progress=_print_result)
+    failed = [result.name for result in results if result.over_budget]
+    if save:
+        save_baseline(baseline, results_to_dict(results, departments, employees))
+        click.echo("Baseline saved to {}".format(baseline))
+    elif os.path.exists(baseline):
+        stored = load_baseline(baseline)
+        if (stored["departments"], stored["employees"]) != (departments, employees):
+            click.echo("Warning: baseline was recorded with {} departments and {} employees".format(
+                stored["departments"], stored["employees"]), err=True)
+        click.echo("\nComparison with {}:".format(baseline))
+        for name, ratio, slower, more_queries in compare_results(results, stored, tolerance):
+            click.echo("{:48} {:8.2f}x{}{}".format(name, ratio, "  SLOWER" if slower else "",
+                                                  "  MORE QUERIES" if more_queries else ""))
+            if more_queries or (slower and strict):
+                failed.append(name)
+    if failed:
+        click.echo("\nFailed: {}".format(", ".join(sorted(set(failed)))), err=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
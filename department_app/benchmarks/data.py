@@ -0,0 +1,80 @@
+"""
+This module generates synthetic departments and employees for benchmarks.
+
+Data is generated from a seeded random number generator, so the same arguments always produce
+the same database content, and is inserted with Core executemany statements in batches
+(about 1M employees take a minute or two on SQLite). Stored department statistics are rebuilt
+after the employees are inserted.
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from department_app import db
+from department_app.models.entities import Department, Employee, normalize_name
+from department_app.statistics import rebuild_statistics
+
+FIRST_NAMES = ("James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William",
+               "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah",
+               "Charles", "Karen", "Olena", "Taras", "Iryna", "Andrii", "Natalia", "Dmytro", "Oksana")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Moore", "Jackson", "Martin",
+              "Lee", "Thompson", "White", "Harris", "Clark", "Lewis", "Walker", "Shevchenko", "Kovalenko",
+              "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Oliinyk", "Lysenko", "Marchenko")
+DEPARTMENT_NAMES = ("Accounting", "Engineering", "Finance", "Human Resources", "Legal", "Logistics",
+                    "Marketing", "Operations", "Procurement", "Quality Assurance", "Research", "Sales",
+                    "Security", "Support", "Training")
+OLDEST_DATE_OF_BIRTH = date(1950, 1, 1)
+BIRTH_DATES_SPAN = (date(2003, 12, 31) - OLDEST_DATE_OF_BIRTH).days
+
+
+def department_names(count: int) -> list:
+    """
+    Produces unique department names, numbering them once the base names are used up.
+
+    Returns: list of str.
+    """
+    return [DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)] +
+            ("" if i < len(DEPARTMENT_NAMES) else " {}".format(i // len(DEPARTMENT_NAMES) + 1))
+            for i in range(count)]
+
+
+def random_employee(rng: random.Random, department_id: int) -> dict:
+    """
+    Produces column values of a random employee of the department.
+
+    Returns: dict.
+    """
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    return {"first_name": first_name,
+            "last_name": last_name,
+            "search_name": normalize_name(last_name, first_name),
+            "date_of_birth": OLDEST_DATE_OF_BIRTH + timedelta(days=rng.randrange(BIRTH_DATES_SPAN)),
+            "monthly_salary": Decimal(int(rng.lognormvariate(8, 0.5) * 100)) / 100,
+            "department_id": department_id}
+
+
+def generate_data(departments: int, employees: int, seed: int = 0, batch_size: int = 10000):
+    """
+    Inserts departments and employees randomly distributed among them into the database
+    of the current application, which is expected to be empty, and commits them.
+    """
+    if departments < 1 and employees > 0:
+        raise ValueError("Employees need at least one department")
+    rng = random.Random(seed)
+    connection = db.session.connection()
+    if departments:
+        connection.execute(Department.__table__.insert(), [{"name": name} for name in department_names(departments)])
+    department_ids = [row[0] for row in connection.execute(db.select(Department.id).order_by(Department.id))]
+    # Skewed weights give departments of different sizes, as in a real organization.
+    weights = [rng.paretovariate(1.5) for _ in department_ids]
+    for start in range(0, employees, batch_size):
+        count = min(batch_size, employees - start)
+        connection.execute(Employee.__table__.insert(),
+                           [random_employee(rng, department_id)
+                            for department_id in rng.choices(department_ids, weights, k=count)])
+        db.session.commit()
+        connection = db.session.connection()
+    rebuild_statistics(connection)
+    db.session.commit()
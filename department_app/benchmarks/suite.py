@@ -0,0 +1,454 @@
+"""
+This module implements benchmarks of department app routes and model methods.
+
+Every route of the application is requested through the flask test client, so a benchmark
+measures the whole request handling (routing, views, queries and templates) without network I/O.
+The response and template fragment caches are disabled to measure the views themselves.
+Every benchmark is run for a number of rounds after a warm-up round and reports timing statistics
+together with the number of SQL statements executed per round, which is checked against
+the benchmark's query budget: budgets do not depend on the amount of data, so an exceeded budget
+usually means a query issued per row (N+1 queries) or a lost eager load.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+from sqlalchemy.engine import Engine
+from department_app import create_app, db
+from department_app.models.entities import Department, Employee
+from .data import generate_data
+
+NOT_BENCHMARKED_METHODS = {"HEAD", "OPTIONS"}
+STARTUP_CONFIGURATIONS = {"full": {}, "api_only": {"UI_ENABLED": False}, "ui_only": {"API_ENABLED": False}}
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Benchmark:
+    """
+    This class describes a benchmark.
+
+    Attributes:
+    name: unique benchmark name (str).
+    function: measured callable, called with the values returned by setup (callable).
+    setup: callable preparing arguments of every round, not measured (callable or None).
+    max_queries: maximum number of SQL statements executed per round (int or None if not checked).
+    rounds: number of rounds overriding the suite default, e.g. for slow benchmarks (int or None).
+    iterations: number of function calls per round; timings are reported per call (int).
+    rule: URL rule of the benchmarked route (str or None for model benchmarks).
+    method: HTTP method of the benchmarked route (str or None for model benchmarks).
+    """
+
+    def __init__(self, name: str, function, setup=None, max_queries: int = None, rounds: int = None,
+                 iterations: int = 1, rule: str = None, method: str = None):
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.max_queries = max_queries
+        self.rounds = rounds
+        self.iterations = iterations
+        self.rule = rule
+        self.method = method
+
+
+class BenchmarkResult:
+    """
+    This class holds results of a benchmark run.
+
+    Attributes:
+    name: benchmark name (str).
+    timings: durations of the measured rounds per function call in seconds (list of float).
+    queries: highest number of SQL statements executed in a round (int).
+    max_queries: query budget of the benchmark (int or None).
+    """
+
+    def __init__(self, name: str, timings: list, queries: int, max_queries: int = None):
+        self.name = name
+        self.timings = timings
+        self.queries = queries
+        self.max_queries = max_queries
+
+    @property
+    def over_budget(self) -> bool:
+        """
+        Read-only property allowing to check if the benchmark executed more queries than its budget.
+
+        Returns: bool.
+        """
+        return self.max_queries is not None and self.queries > self.max_queries
+
+    def to_dict(self) -> dict:
+        """
+        Produces a dict containing timing statistics in seconds and the query count.
+        Intended to be stored as a baseline.
+
+        Returns: dict.
+        """
+        return {"rounds": len(self.timings),
+                "min": min(self.timings),
+                "max": max(self.timings),
+                "mean": statistics.mean(self.timings),
+                "median": statistics.median(self.timings),
+                "stddev": statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0,
+                "queries": self.queries}
+
+
+class _QueryCounter:
+    """
+    This class counts SQL statements executed by all engines while it is installed.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        db.event.listen(Engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        db.event.remove(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def measure(benchmark: Benchmark, rounds: int, warmup: int = 1) -> BenchmarkResult:
+    """
+    Runs the benchmark for warmup rounds, which are not reported, and then for rounds rounds
+    (or the benchmark's own number of rounds).
+
+    Returns: BenchmarkResult.
+    """
+    rounds = benchmark.rounds or rounds
+    timings = []
+    queries = 0
+    counter = _QueryCounter()
+    with counter:
+        for round in range(warmup + rounds):
+            args = benchmark.setup() if benchmark.setup is not None else ()
+            counter.count = 0
+            started = time.perf_counter()
+            for _ in range(benchmark.iterations):
+                benchmark.function(*args)
+            elapsed = time.perf_counter() - started
+            if round >= warmup:
+                timings.append(elapsed / benchmark.iterations)
+                queries = max(queries, counter.count)
+    return BenchmarkResult(benchmark.name, timings, queries, benchmark.max_queries)
+
+
+class RouteBenchmarks:
+    """
+    This class builds benchmarks of application routes against generated data.
+
+    Attributes:
+    app: flask application with generated data (Flask).
+    client: test client of the application (FlaskClient).
+    department_id: id of the department used by single department routes (int).
+    employee_id: id of the employee used by single employee routes (int).
+    bulk_employee_ids: ids of up to 100 employees of the department updated by bulk requests (list of int).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self._created = 0
+        with app.app_context():
+            self.department_id = db.session.query(db.func.min(Department.id)).scalar()
+            employee_ids = db.session.query(db.func.min(Employee.id), db.func.max(Employee.id)).one()
+            self.employee_id = (employee_ids[0] + employee_ids[1]) // 2 if employee_ids[0] else None
+            self.bulk_employee_ids = [id for id, in db.session.query(Employee.id).filter(
+                Employee.department_id == self.department_id).order_by(Employee.id).limit(100)]
+            page = self.client.get("/api/employees").get_json()
+            self.next_page = page["links"].get("next", "/api/employees")
+
+    def _unique_name(self, prefix: str) -> str:
+        self._created += 1
+        return "{} {}".format(prefix, self._created)
+
+    def _new_department(self) -> tuple:
+        with self.app.app_context():
+            department = Department(name=self._unique_name("Benchmark"))
+            db.session.add(department)
+            db.session.commit()
+            return department.id,
+
+    def _new_employee(self) -> tuple:
+        with self.app.app_context():
+            employee = Employee(first_name="Bench", last_name=self._unique_name("Mark"),
+                                date_of_birth=date(1990, 1, 1), monthly_salary=3000,
+                                department_id=self.department_id)
+            db.session.add(employee)
+            db.session.commit()
+            return employee.id,
+
+    def _salary(self) -> str:
+        # Changes on every call, so that updates are not skipped as unchanged.
+        self._created += 1
+        return "{}.00".format(1000 + self._created % 1000)
+
+    def _employee_json(self) -> dict:
+        return {"first_name": "Bench", "last_name": self._unique_name("Mark"), "date_of_birth": "1990-01-01",
+                "monthly_salary": "1500.00", "department_id": self.department_id}
+
+    def _request(self, method: str, url, status: int = 200, **kwargs):
+        """
+        Creates a function sending the request and checking the response status,
+        so that a failing route is not benchmarked by its error path.
+        The url may be a function of the setup values.
+        """
+        def request(*args):
+            response = self.client.open(url(*args) if callable(url) else url, method=method,
+                                        **{key: value() if callable(value) else value
+                                           for key, value in kwargs.items()})
+            response.get_data()
+            if response.status_code != status:
+                raise AssertionError("{} {} returned {} instead of {}".format(
+                    method, url(*args) if callable(url) else url, response.status_code, status))
+        return request
+
+    def benchmarks(self) -> list:
+        """
+        Returns: list of Benchmark.
+        """
+        department = "/departments/{}".format(self.department_id)
+        employee = "/employees/{}".format(self.employee_id)
+        specs = [
+            # name, rule, method, url, expected status, request arguments, setup, max queries, rounds.
+            # Removing the lowest or highest salary of a department recomputes its statistics
+            # with an additional query, so employee deletes and updates allow one more query.
+            # Committed writes append to the change log with two statements (department_app.changelog)
+            # and department deletes select the ids of the deleted employees for it.
+            ("index", "/", "GET", "/", 302, {}, None, 0, None),
+            ("search", "/search", "GET", "/search?q=smith", 200, {}, None, 1, None),
+            ("departments", "/departments", "GET", "/departments", 200, {}, None, 1, None),
+            ("view_department", "/departments/<int:id>", "GET", department, 200, {}, None, 2, None),
+            ("delete_department_form", "/departments/<int:id>/delete", "GET", department + "/delete", 200, {},
+             None, 1, None),
+            ("delete_department", "/departments/<int:id>/delete", "POST", "/departments/{}/delete".format, 302, {},
+             self._new_department, 7, None),
+            ("new_department_form", "/departments/new/edit", "GET", "/departments/new/edit", 200, {}, None, 0,
+             None),
+            ("create_department", "/departments/new/edit", "POST", "/departments/new/edit", 302,
+             {"data": lambda: {"name": self._unique_name("Department")}}, None, 4, None),
+            ("edit_department_form", "/departments/<int:id>/edit", "GET", department + "/edit", 200, {}, None, 1,
+             None),
+            ("edit_department", "/departments/<int:id>/edit", "POST", department + "/edit", 302,
+             {"data": lambda: {"name": self._unique_name("Renamed")}}, None, 5, None),
+            ("employees", "/employees", "GET", "/employees", 200, {}, None, 1, None),
+            ("employees_search", "/employees", "GET", "/employees?q=smith+ja", 200, {}, None, 1, None),
+            ("view_employee", "/employees/<int:id>", "GET", employee, 200, {}, None, 1, None),
+            ("delete_employee_form", "/employees/<int:id>/delete", "GET", employee + "/delete", 200, {}, None, 1,
+             None),
+            ("delete_employee", "/employees/<int:id>/delete", "POST", "/employees/{}/delete".format, 302, {},
+             self._new_employee, 7, None),
+            ("new_employee_form", "/employees/new/edit", "GET", "/employees/new/edit", 200, {}, None, 1, None),
+            ("create_employee", "/employees/new/edit", "POST", "/employees/new/edit", 302,
+             {"data": self._employee_json}, None, 7, None),
+            ("edit_employee_form", "/employees/<int:id>/edit", "GET", employee + "/edit", 200, {}, None, 2, None),
+            ("edit_employee", "/employees/<int:id>/edit", "POST", employee + "/edit", 302,
+             {"data": lambda: dict(self._employee_json(), monthly_salary=self._salary())}, None, 9, None),
+            ("api", "/api", "GET", "/api", 200, {}, None, 0, None),
+            ("departments_api", "/api/departments", "GET", "/api/departments", 200, {}, None, 1, None),
+            ("department_statistics_api", "/api/departments/stats", "GET", "/api/departments/stats", 200, {},
+             None, 1, None),
+            ("pool_api", "/api/pool", "GET", "/api/pool", 200, {}, None, 0, None),
+            ("prometheus_metrics", "/metrics", "GET", "/metrics", 200, {}, None, 0, None),
+            ("analytics_api", "/api/analytics", "GET", "/api/analytics", 200, {}, None, 0, None),
+            ("salary_analytics_api", "/api/analytics/salaries", "GET", "/api/analytics/salaries", 200, {}, None,
+             2, None),
+            ("age_analytics_api", "/api/analytics/ages", "GET", "/api/analytics/ages", 200, {}, None, 2, None),
+            ("top_earners_api", "/api/analytics/top-earners", "GET", "/api/analytics/top-earners", 200, {}, None,
+             2, None),
+            ("payroll_analytics_api", "/api/analytics/payroll", "GET", "/api/analytics/payroll", 200, {}, None, 2,
+             None),
+            ("view_department_api", "/api/departments/<int:id>", "GET", "/api" + department, 200, {}, None, 1,
+             None),
+            ("edit_department_api", "/api/departments/<int:id>", "PUT", "/api" + department, 200,
+             {"json": lambda: {"name": self._unique_name("Renamed")}}, None, 5, None),
+            ("create_department_api", "/api/departments", "POST", "/api/departments", 200,
+             {"json": lambda: {"name": self._unique_name("Department")}}, None, 4, None),
+            ("bulk_departments_api", "/api/departments/bulk", "POST", "/api/departments/bulk", 200,
+             {"json": lambda: [{"content": {"name": self._unique_name("Bulk")}} for _ in range(100)]}, None, 3,
+             None),
+            ("delete_department_api", "/api/departments/<int:id>", "DELETE", "/api/departments/{}".format, 200, {},
+             self._new_department, 7, None),
+            ("employees_api", "/api/employees", "GET", "/api/employees", 200, {}, None, 1, None),
+            ("employees_api_next_page", "/api/employees", "GET", self.next_page, 200, {}, None, 1, None),
+            ("employees_api_search", "/api/employees", "GET", "/api/employees?q=smith+ja", 200, {}, None, 1, None),
+            ("employees_api_filter", "/api/employees", "GET",
+             "/api/employees?department_id={}&min_salary=3000".format(self.department_id), 200, {}, None, 1,
+             None),
+            ("export_employees_ndjson_api", "/api/employees/export.ndjson", "GET", "/api/employees/export.ndjson",
+             200, {}, None, 1, 3),
+            ("export_employees_csv_api", "/api/employees/export.csv", "GET", "/api/employees/export.csv", 200, {},
+             None, 1, 3),
+            ("view_employee_api", "/api/employees/<int:id>", "GET", "/api" + employee, 200, {}, None, 1, None),
+            ("edit_employee_api", "/api/employees/<int:id>", "PUT", "/api" + employee, 200,
+             {"json": lambda: {"monthly_salary": self._salary()}}, None, 8, None),
+            ("create_employee_api", "/api/employees", "POST", "/api/employees", 200,
+             {"json": self._employee_json}, None, 6, None),
+            # Versioned rows are updated by a single executemany statement checking their versions.
+            ("bulk_employees_api", "/api/employees/bulk", "POST", "/api/employees/bulk", 200,
+             {"json": lambda: [{"id": id, "content": {"monthly_salary": self._salary()}}
+                               for id in self.bulk_employee_ids]}, None, 6, None),
+            ("changes_api", "/api/changes", "GET", "/api/changes?since=0", 200, {}, None, 1, None),
+            ("delete_employee_api", "/api/employees/<int:id>", "DELETE", "/api/employees/{}".format, 200, {},
+             self._new_employee, 7, None),
+        ]
+        return [Benchmark(name, self._request(method, url, status, **kwargs), setup, max_queries, rounds,
+                          rule=rule, method=method)
+                for name, rule, method, url, status, kwargs, setup, max_queries, rounds in specs]
+
+
+def model_benchmarks(app) -> list:
+    """
+    Builds benchmarks of model methods. Instances are loaded before the benchmarks are run,
+    so only the methods themselves are measured.
+
+    Returns: list of Benchmark.
+    """
+    with app.app_context():
+        with_statistics = Department.query_with_statistics().order_by(Department.id).first()
+        with_employees = Department.query.options(db.selectinload(Department.employees)) \
+                                         .order_by(Department.id).first()
+        employee = Employee.query.order_by(Employee.id).first()
+        db.session.expunge_all()
+    employee_dict = {"first_name": "Bench", "last_name": "Mark", "date_of_birth": "1990-01-01",
+                     "monthly_salary": "1500.00", "department_id": str(with_statistics.id)}
+    return [Benchmark("Department.average_monthly_salary", lambda: with_statistics.average_monthly_salary,
+                      max_queries=0, iterations=1000),
+            Benchmark("Department.average_monthly_salary_from_employees",
+                      lambda: with_employees.average_monthly_salary, max_queries=0, iterations=10),
+            Benchmark("Department.to_api_dict", with_statistics.to_api_dict, max_queries=0, iterations=1000),
+            Benchmark("Department.populate_from_dict", Department().populate_from_dict, lambda: ({"name": "Name"},),
+                      max_queries=0, iterations=1000),
+            Benchmark("Employee.to_api_dict", employee.to_api_dict, max_queries=0, iterations=1000),
+            Benchmark("Employee.populate_from_dict", Employee().populate_from_dict, lambda: (employee_dict,),
+                      max_queries=0, iterations=1000)]
+
+
+def _start_worker(config: dict):
+    code = "from department_app import create_app; create_app(True, {!r})".format(config)
+    subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_ROOT, check=True)
+
+
+def startup_benchmarks() -> list:
+    """
+    Builds benchmarks of application startup in full, API-only and UI-only configurations:
+    creating the application in this process, as every test does, and starting a new Python process
+    importing the package and creating the application, as every worker does
+    (including the interpreter startup).
+
+    Returns: list of Benchmark.
+    """
+    return [Benchmark("startup.create_app_" + name, lambda config=config: create_app(True, config),
+                      max_queries=0, iterations=10) for name, config in STARTUP_CONFIGURATIONS.items()] + \
+           [Benchmark("startup.worker_" + name, lambda config=config: _start_worker(config), rounds=5)
+            for name, config in STARTUP_CONFIGURATIONS.items()]
+
+
+def create_benchmark_app(departments: int, employees: int, seed: int = 0, database: str = "sqlite://",
+                         config: dict = None):
+    """
+    Creates application with the response and fragment caches disabled and a new database
+    (in-memory SQLite by default) filled with generated data.
+
+    Returns: Flask.
+    """
+    app = create_app(True, dict({"SQLALCHEMY_DATABASE_URI": database, "RESPONSE_CACHE_ENABLED": False,
+                                 "FRAGMENT_CACHE_ENABLED": False}, **(config or {})))
+    with app.app_context():
+        db.create_all()
+        generate_data(departments, employees, seed)
+    return app
+
+
+def all_benchmarks(app) -> list:
+    """
+    Returns: list of Benchmark, route benchmarks followed by model benchmarks.
+    """
+    return RouteBenchmarks(app).benchmarks() + model_benchmarks(app)
+
+
+def uncovered_routes(app, benchmarks: list) -> list:
+    """
+    Finds application routes (URL rule and method pairs) without a benchmark.
+    Static files routes are not benchmarked.
+
+    Returns: list of str.
+    """
+    covered = {(benchmark.rule, benchmark.method) for benchmark in benchmarks}
+    return sorted("{} {}".format(method, rule.rule) for rule in app.url_map.iter_rules()
+                  if rule.endpoint.rpartition(".")[2] != "static"
+                  for method in rule.methods - NOT_BENCHMARKED_METHODS if (rule.rule, method) not in covered)
+
+
+def run_benchmarks(benchmarks: list, rounds: int, warmup: int = 1, pattern: str = None, progress=None) -> list:
+    """
+    Runs benchmarks whose names contain the pattern, calling progress with every result.
+
+    Returns: list of BenchmarkResult.
+    """
+    results = []
+    for benchmark in benchmarks:
+        if pattern and pattern not in benchmark.name:
+            continue
+        result = measure(benchmark, rounds, warmup)
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return results
+
+
+def results_to_dict(results: list, departments: int, employees: int) -> dict:
+    """
+    Produces a dict of results together with data sizes and the machine they were measured on.
+    Intended to be stored as a baseline.
+
+    Returns: dict.
+    """
+    return {"departments": departments,
+            "employees": employees,
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "processor": platform.machine()},
+            "benchmarks": {result.name: result.to_dict() for result in results}}
+
+
+def load_baseline(path: str) -> dict:
+    """
+    Returns: dict, baseline stored by save_baseline.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, baseline: dict):
+    """
+    Stores results produced by results_to_dict as a baseline.
+    """
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_results(results: list, baseline: dict, tolerance: float = 0.25) -> list:
+    """
+    Compares the fastest rounds and query counts of results with the baseline.
+    The fastest round is compared as the least affected by other processes of the machine.
+
+    Returns: list of tuples (name, ratio of the fastest rounds, slower by more than tolerance (a fraction),
+             executes more queries than in the baseline) of benchmarks in the baseline.
+    """
+    comparison = []
+    for result in results:
+        expected = baseline["benchmarks"].get(result.name)
+        if expected is None:
+            continue
+        ratio = min(result.timings) / expected["min"] if expected["min"] else 1.0
+        comparison.append((result.name, ratio, ratio > 1 + tolerance, result.queries > expected["queries"]))
+    return comparison
@@ -0,0 +1,349 @@
+"""
+This module implements bulk create, update and delete operations for API endpoints.
+
+Items are validated one by one with the models' populate_from_dict rules and written
+in batches: every batch loads the records it modifies with a single query and is committed
+as a single transaction. If a batch fails to be committed, its items are retried one by one
+so that every item gets its own result.
+
+Created and updated records are written with set-based statements instead of the session unit of work,
+which would emit an INSERT and a versioned UPDATE statement per record:
+- updates are validated on copies of the loaded records and written with a single executemany
+  UPDATE statement per batch, whose WHERE clause checks the id and the version of every row
+  (see department_app.concurrency), so that a modified row count reveals concurrent modifications;
+- creates are written with multi-row INSERT statements where the generated ids can be derived from
+  the last inserted id (see insert_rows), and with an INSERT statement per row otherwise.
+Statistics and the change log, which the session maintains for flushed records, are updated
+explicitly in the batch transaction. Deletes go through Department.delete_by_ids or the session.
+"""
+
+import json
+import weakref
+from collections import defaultdict
+from sqlalchemy.orm.exc import StaleDataError
+from department_app import db
+from department_app.changelog import ENTITIES, record_changes
+from department_app.concurrency import CONFLICT_MESSAGE
+from department_app.models.entities import Employee, normalize_name
+from department_app.statistics import update_statistics
+
+ACTIONS = ("create", "update", "delete")
+MAX_BATCH_SIZE = 10000
+# SQLite versions before 3.32 limit the number of parameters of a statement to 999.
+MAX_STATEMENT_PARAMETERS = 999
+
+_consecutive_ids = weakref.WeakKeyDictionary()
+
+
+def items_from_json(data) -> list:
+    """
+    Gets bulk items from a parsed JSON request body, which must be an array.
+
+    Returns: list.
+    """
+    if not isinstance(data, list):
+        raise TypeError("Request body must be an array")
+    return data
+
+
+def items_from_ndjson(lines):
+    """
+    Parses newline delimited JSON request body lazily, line by line.
+    Lines that are not valid JSON produce ValueError instances instead of items.
+
+    Returns: generator.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError("Invalid json")
+
+
+def request_items(request):
+    """
+    Gets bulk items from the request body: a JSON array or, if the request content type
+    is application/x-ndjson, newline delimited JSON objects read from the request stream.
+
+    Returns: iterable.
+    """
+    if request.mimetype == "application/x-ndjson":
+        return items_from_ndjson(request.stream)
+    data = request.get_json(force=True, silent=True)
+    if data is None:
+        raise ValueError("Invalid json")
+    return items_from_json(data)
+
+
+def parse_batch_size(args: dict, default: int) -> int:
+    """
+    Gets transaction batch size from "batch_size" request argument.
+
+    Returns: int.
+    """
+    try:
+        batch_size = int(args.get("batch_size", default))
+    except ValueError:
+        raise ValueError("Batch size must be an integer")
+    if batch_size < 1 or batch_size > MAX_BATCH_SIZE:
+        raise ValueError("Batch size must be between 1 and {}".format(MAX_BATCH_SIZE))
+    return batch_size
+
+
+def _batches(items, batch_size: int):
+    batch = []
+    for index, item in enumerate(items):
+        batch.append((index, item))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_item(item) -> tuple:
+    """
+    Validates bulk item structure.
+
+    Returns: tuple (action, id, content).
+    """
+    if isinstance(item, ValueError):
+        raise item
+    if not isinstance(item, dict):
+        raise TypeError("Item must be an object")
+    action = item.get("action", "update" if "id" in item else "create")
+    if action not in ACTIONS:
+        raise ValueError("Action must be one of: {}".format(", ".join(ACTIONS)))
+    id = item.get("id")
+    if action != "create" and not isinstance(id, int):
+        raise TypeError("Id must be an integer")
+    content = item.get("content", {})
+    if action != "delete" and not isinstance(content, dict):
+        raise TypeError("Content must be an object")
+    return action, id, content
+
+
+def check_required_fields(record):
+    """
+    Raises ValueError if a non nullable column without (server) default of the given record has no value.
+    """
+    for column in record.__table__.columns:
+        if column.nullable or column.primary_key or column.default is not None or column.server_default is not None:
+            continue
+        if getattr(record, column.key) is None:
+            raise ValueError("Field {} is required".format(column.key))
+
+
+def multirow_insert_ids_consecutive(connection) -> bool:
+    """
+    Checks whether rows inserted by a single multi-row INSERT statement get consecutive ids:
+    SQLite assigns every row the greatest rowid plus one while the statement holds the database
+    write lock, and MySQL allocates consecutive auto-increment values for a multi-row INSERT
+    unless innodb_autoinc_lock_mode is 2 (interleaved). Detected once per engine.
+
+    Returns: bool.
+    """
+    engine = connection.engine
+    if engine not in _consecutive_ids:
+        if connection.dialect.name == "sqlite":
+            _consecutive_ids[engine] = True
+        elif connection.dialect.name == "mysql":
+            lock_mode = connection.execute(db.text("SELECT @@innodb_autoinc_lock_mode")).scalar()
+            _consecutive_ids[engine] = lock_mode is not None and int(lock_mode) < 2
+        else:
+            _consecutive_ids[engine] = False
+    return _consecutive_ids[engine]
+
+
+def insert_rows(table, rows: list) -> list:
+    """
+    Inserts rows (dicts of column values) into the table in the session transaction with multi-row
+    INSERT statements of up to MAX_STATEMENT_PARAMETERS parameters each, if ids of the inserted rows
+    can be derived from the last inserted id (see multirow_insert_ids_consecutive), or with
+    an INSERT statement per row otherwise.
+
+    Returns: list of ids of the inserted rows in rows order.
+    """
+    connection = db.session.connection()
+    if len(rows) < 2 or not multirow_insert_ids_consecutive(connection):
+        return [db.session.execute(table.insert().values(row)).inserted_primary_key[0] for row in rows]
+    ids = []
+    # Columns with defaults get parameters as well, so every column of the table is counted.
+    chunk_size = max(1, MAX_STATEMENT_PARAMETERS // len(table.columns))
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        last_id = db.session.execute(table.insert().values(chunk)).lastrowid
+        # MySQL reports the id of the first inserted row and SQLite the id of the last one.
+        first_id = last_id if connection.dialect.name == "mysql" else last_id - len(chunk) + 1
+        ids.extend(range(first_id, first_id + len(chunk)))
+    return ids
+
+
+def _column_values(record) -> dict:
+    """
+    Gets values of the record's columns written by set-based statements: all columns except
+    the primary key, the version and columns with defaults. Employee search names, which
+    the session computes on flush, are computed from the names.
+
+    Returns: dict.
+    """
+    version = record.__mapper__.version_id_col
+    values = {column.key: getattr(record, column.key) for column in record.__table__.columns
+              if not (column.primary_key or column is version or column.default is not None
+                      or column.server_default is not None)}
+    if isinstance(record, Employee):
+        values["search_name"] = normalize_name(record.last_name, record.first_name)
+    return values
+
+
+def _update_rows(model, rows: list):
+    """
+    Updates rows given as (id, version, column values) tuples incrementing their versions
+    with a single executemany statement. Dialects which do not report the row count of
+    executemany statements execute the statement once per row.
+    Raises StaleDataError if any of the rows has another version or does not exist.
+    """
+    table = model.__table__
+    version = model.__mapper__.version_id_col
+    statement = table.update().where(table.c.id == db.bindparam("row_id")) \
+                     .where(version == db.bindparam("row_version")).values({version.key: version + 1})
+    parameters = [dict(values, row_id=id, row_version=row_version) for id, row_version, values in rows]
+    if db.session.connection().dialect.supports_sane_multi_rowcount:
+        updated = db.session.execute(statement, parameters).rowcount
+    else:
+        updated = sum(db.session.execute(statement, row_parameters).rowcount for row_parameters in parameters)
+    if updated != len(rows):
+        raise StaleDataError("{} rows were modified or deleted concurrently".format(len(rows) - updated))
+
+
+def _record_written(model, created: list, updated: list):
+    """
+    Updates statistics and the change log for records written by set-based statements:
+    created is a list of (id, column values) pairs and updated a list of (loaded record, column values) pairs.
+    """
+    if model is Employee:
+        changes = defaultdict(lambda: ([], []))
+        for _, values in created:
+            changes[values["department_id"]][0].append(values["monthly_salary"])
+        for record, values in updated:
+            if (record.department_id, record.monthly_salary) != (values["department_id"], values["monthly_salary"]):
+                changes[record.department_id][1].append(record.monthly_salary)
+                changes[values["department_id"]][0].append(values["monthly_salary"])
+        if changes:
+            update_statistics(db.session.connection(), changes)
+    entity = ENTITIES.get(model)
+    if entity is not None:
+        record_changes(db.session, entity, [id for id, _ in created], "create")
+        record_changes(db.session, entity, [record.id for record, _ in updated], "update")
+
+
+def _delete_records(model, records: list):
+    if hasattr(model, "delete_by_ids"):
+        model.delete_by_ids([record.id for record in records], versions={record.id: record.version
+                                                                         for record in records})
+    else:
+        for record in records:
+            db.session.delete(record)
+        db.session.flush()
+
+
+def _apply_batch(model, url_prefix: str, batch: list) -> dict:
+    """
+    Applies a batch of (index, item) pairs to the session and commits it.
+
+    Returns: dict mapping item index to its result dict.
+    """
+    results = {}
+    parsed = []
+    for index, item in batch:
+        try:
+            parsed.append((index,) + _parse_item(item))
+        except (ValueError, TypeError) as e:
+            results[index] = {"index": index, "status": 400, "error": str(e)}
+    batch_versions = {index: item["version"] for index, item in batch if isinstance(item, dict) and "version" in item}
+    ids = {id for _, action, id, _ in parsed if action != "create"}
+    existing = {record.id: record for record in model.query.filter(model.id.in_(ids))} if ids else {}
+    created = []
+    # Updates are applied to transient copies of the loaded records, which the session does not flush.
+    copies = {}
+    deleted = set()
+    for index, action, id, content in parsed:
+        if action == "create":
+            record = model()
+        else:
+            loaded = existing.get(id)
+            if loaded is None or id in deleted:
+                results[index] = {"index": index, "status": 404, "error": "Record not found"}
+                continue
+            if batch_versions.get(index, loaded.version) != loaded.version:
+                results[index] = {"index": index, "status": 412, "error": CONFLICT_MESSAGE}
+                continue
+            if action == "delete":
+                deleted.add(id)
+                results[index] = {"index": index, "status": 200, "id": id}
+                continue
+            if id in copies:
+                record = copies[id]
+            else:
+                record = model(**{column.key: getattr(loaded, column.key) for column in model.__table__.columns})
+        try:
+            record.populate_from_dict(content)
+            check_required_fields(record)
+        except (ValueError, TypeError) as e:
+            results[index] = {"index": index, "status": 400, "error": str(e)}
+            continue
+        if action == "create":
+            created.append((index, _column_values(record)))
+        else:
+            copies[id] = record
+            results[index] = {"index": index, "status": 200, "id": id}
+    inserted = list(zip(insert_rows(model.__table__, [values for _, values in created]),
+                        [values for _, values in created]))
+    for (index, _), (id, _) in zip(created, inserted):
+        results[index] = {"index": index, "status": 201, "id": id}
+    updated = [(existing[id], _column_values(record)) for id, record in copies.items()]
+    updated = [(record, values) for record, values in updated if values != _column_values(record)]
+    if updated:
+        _update_rows(model, [(record.id, record.version, values) for record, values in updated])
+    _record_written(model, inserted, updated)
+    if deleted:
+        _delete_records(model, [existing[id] for id in deleted])
+    db.session.commit()
+    for result in results.values():
+        if "id" in result:
+            result["links"] = {"self": "{}/{}".format(url_prefix, result["id"])}
+    return results
+
+
+def process_bulk(model, url_prefix: str, items, batch_size: int) -> list:
+    """
+    Creates, updates and deletes records of the given model according to items.
+    Every item is an object with "action" ("create", "update" or "delete", by default
+    "update" if "id" is given and "create" otherwise), "id" (for update and delete)
+    and "content" (for create and update) members. Content is validated with
+    the model's populate_from_dict method. Update and delete items may have "version" member:
+    if the record has another version, the item fails with 412 status.
+
+    Returns: list of per-item result dicts in items order.
+    """
+    results = []
+    for batch in _batches(items, batch_size):
+        try:
+            batch_results = _apply_batch(model, url_prefix, batch)
+        except Exception:
+            db.session.rollback()
+            batch_results = {}
+            for index, item in batch:
+                try:
+                    batch_results.update(_apply_batch(model, url_prefix, [(index, item)]))
+                except StaleDataError:
+                    db.session.rollback()
+                    batch_results[index] = {"index": index, "status": 412, "error": CONFLICT_MESSAGE}
+                except Exception:
+                    db.session.rollback()
+                    batch_results[index] = {"index": index, "status": 400, "error": "Database insertion failed!"}
+        results.extend(batch_results[index] for index, _ in batch)
+    return results
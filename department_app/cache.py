@@ -0,0 +1,239 @@
+"""
+This module implements response caching for read-only routes.
+
+Cached responses are keyed by route path, query arguments and current versions of
+the database tables the route depends on. Table versions are changed when a database
+session that modified those tables commits (detected with SQLAlchemy session events),
+so any write performed through the application invalidates exactly the responses
+that depend on the modified tables.
+
+With read replicas (see department_app.routing), responses computed on a replica may lag behind
+the primary database, even if they are cached under the latest table versions. Such responses are
+cached under separate keys served only to clients reading from replicas, and only for
+REPLICA_STICKY_SECONDS, so clients pinned to the primary after a write read their own writes.
+
+Cached responses carry an ETag, and requests with a matching If-None-Match header
+get 304 Not Modified responses without a body.
+
+The cache backend is an in-process LRU cache by default. Any object with get(key),
+set(key, value, ttl) and delete(key) methods (e.g. cachelib RedisCache or MemcachedCache)
+may be configured as RESPONSE_CACHE_BACKEND to share the cache between processes.
+Table versions are stored in the backend too, so a write committed by one worker process only
+invalidates responses cached by other workers if they share the backend. Therefore caching
+is enabled by default only when RESPONSE_CACHE_BACKEND is configured; the in-process cache
+may be enabled explicitly with RESPONSE_CACHE_ENABLED for single process deployments.
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session, make_response, Response
+from department_app import db, replicas
+
+
+class LRUCache:
+    """
+    This class implements thread safe in-process cache backend with least recently used
+    eviction policy and time to live for entries.
+
+    Attributes:
+    max_size: maximum number of entries (int).
+    default_ttl: default time to live of entries in seconds (int), 0 means no expiration.
+    """
+
+    def __init__(self, max_size: int = 1024, default_ttl: int = 300):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Returns value stored for the key or None if there is no such value or it has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int = None):
+        """
+        Stores value for the key, evicting least recently used entries if the cache is full.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else 0)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True
+
+    def delete(self, key: str):
+        """
+        Removes value stored for the key.
+        """
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """
+        Removes all values.
+        """
+        with self._lock:
+            self._entries.clear()
+        return True
+
+
+class CachedResponse:
+    """
+    This class holds data of a cached response.
+
+    Attributes:
+    body: response body (bytes).
+    status: response status code (int).
+    mimetype: response mimetype (str).
+    etag: response ETag (str).
+    weak: whether the ETag is weak (bool).
+    """
+
+    def __init__(self, body: bytes, status: int, mimetype: str, etag: str, weak: bool = False):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = etag
+        self.weak = weak
+
+    def to_response(self) -> Response:
+        """
+        Produces a response from cached data.
+
+        Returns: Response.
+        """
+        response = Response(self.body, status=self.status, mimetype=self.mimetype)
+        response.set_etag(self.etag, self.weak)
+        return response
+
+
+class ResponseCache:
+    """
+    This class implements flask extension caching responses of read-only routes.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Initializes the extension for the flask application.
+        """
+        app.config.setdefault("RESPONSE_CACHE_SIZE", 1024)
+        app.config.setdefault("RESPONSE_CACHE_TTL", 300)
+        app.config.setdefault("RESPONSE_CACHE_BACKEND", None)
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", app.config["RESPONSE_CACHE_BACKEND"] is not None)
+        backend = app.config["RESPONSE_CACHE_BACKEND"] or LRUCache(app.config["RESPONSE_CACHE_SIZE"],
+                                                                   app.config["RESPONSE_CACHE_TTL"])
+        app.extensions["response_cache"] = backend
+
+    @staticmethod
+    def backend(app=None):
+        """
+        Returns cache backend of the application (current application by default).
+        """
+        return (app or current_app).extensions["response_cache"]
+
+    @classmethod
+    def table_versions(cls, tables: tuple) -> list:
+        """
+        Returns current versions of the given database tables.
+
+        Returns: list of str.
+        """
+        backend = cls.backend()
+        versions = []
+        for table in tables:
+            version = backend.get("version:" + table)
+            if version is None:
+                version = uuid.uuid4().hex
+                backend.set("version:" + table, version, 0)
+            versions.append(version)
+        return versions
+
+    @classmethod
+    def invalidate(cls, tables, app=None):
+        """
+        Invalidates all cached responses depending on any of the given database tables.
+        """
+        backend = cls.backend(app)
+        for table in tables:
+            backend.set("version:" + table, uuid.uuid4().hex, 0)
+
+    def cached(self, *tables):
+        """
+        Decorator caching successful responses of a read-only view, which depend on the given
+        database tables. Responses are not cached if there are flashed messages to be displayed.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not current_app.config["RESPONSE_CACHE_ENABLED"] or "_flashes" in session:
+                    return view(*args, **kwargs)
+                source = "primary" if replicas.primary_required() else "replica"
+                key = "response:{}?{}|{}|{}".format(request.path,
+                                                    "&".join(sorted(request.query_string.decode().split("&"))),
+                                                    ",".join(self.table_versions(tables)), source)
+                cached_response = self.backend().get(key)
+                if cached_response is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    # Streamed responses are rendered in full to be cached.
+                    body = response.get_data()
+                    # ETags set by the view (e.g. record versions) are kept.
+                    etag, weak = response.get_etag()
+                    cached_response = CachedResponse(body, response.status_code, response.mimetype,
+                                                     etag or hashlib.sha1(body).hexdigest(), bool(weak))
+                    ttl = current_app.config["REPLICA_STICKY_SECONDS"] if g.get("replica_engine") else None
+                    self.backend().set(key, cached_response, ttl)
+                return cached_response.to_response().make_conditional(request)
+            return wrapper
+        return decorator
+
+
+def _record_tables(session, tables):
+    session.info.setdefault("modified_tables", set()).update(tables)
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _record_flushed_tables(session, flush_context):
+    _record_tables(session, {record.__table__.name for record in
+                             list(session.new) + list(session.dirty) + list(session.deleted)
+                             if hasattr(record, "__table__")})
+
+
+@db.event.listens_for(db.session, "do_orm_execute")
+def _record_executed_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _record_tables(orm_execute_state.session, {orm_execute_state.statement.table.name})
+
+
+@db.event.listens_for(db.session, "after_commit")
+def _invalidate_modified_tables(session):
+    tables = session.info.pop("modified_tables", None)
+    app = getattr(session, "app", None)
+    if tables and app is not None and "response_cache" in app.extensions:
+        ResponseCache.invalidate(tables, app)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_modified_tables(session):
+    session.info.pop("modified_tables", None)
@@ -0,0 +1,139 @@
+"""
+This module maintains the change log of departments and employees and implements the incremental sync feed.
+
+Every department and employee created, modified or deleted through the session, by bulk operations
+(department_app.bulk), by the import commands or by Department.delete_by_ids, is recorded in
+the append-only change_log table (Change) in the same transaction. Changes are collected by session
+flush events and written when the transaction is committed: the transaction first updates the single row of change_log_lock table, so transactions
+writing the change log are serialized from that point until they commit, and sequence numbers
+(the autoincremented primary key) increase in commit order. A consumer which has read the changes
+up to some sequence number therefore never misses a change committed later with a lower number.
+
+Consumers sync incrementally with /api/changes?since=<seq>, which returns up to limit changes
+with greater sequence numbers in sequence order and links to the changed records, together with
+the "next" link to poll for the following changes. With wait=<seconds> argument (up to
+CHANGES_MAX_WAIT) the request waits for changes, polling the database every CHANGES_POLL_INTERVAL
+seconds, if there are none yet. A waiting request holds a worker thread of the flask application,
+so many long-polling consumers are better served by the ASGI application (department_app.asgi).
+
+Rows inserted by the benchmark data generator bypass the change log, so consumers should sync
+fully after generating data.
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime
+from department_app import db
+from department_app.models.entities import Department, Employee, Change, ChangeLogLock
+from department_app.pagination import parse_limit, path_with_args
+
+ENTITIES = {Department: "department", Employee: "employee"}
+
+
+def record_changes(session, entity: str, ids: list, action: str):
+    """
+    Records changes of the given entity records to be written to the change log when
+    the session transaction is committed. Intended to be used by set-based statements,
+    changes of records flushed by the session are recorded automatically.
+    """
+    pending = session.info.setdefault("pending_changes", OrderedDict())
+    for id in ids:
+        pending[(entity, id, action)] = None
+
+
+def write_changes(session):
+    """
+    Writes changes recorded in the session to the change log, taking the change log lock.
+    """
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    connection = session.connection()
+    lock = ChangeLogLock.__table__
+    if not connection.execute(lock.update().values(commits=lock.c.commits + 1)).rowcount:
+        connection.execute(lock.insert().values(id=1, commits=1))
+    changed_at = datetime.utcnow()
+    connection.execute(Change.__table__.insert(),
+                       [{"entity": entity, "record_id": id, "action": action, "changed_at": changed_at}
+                        for entity, id, action in pending])
+
+
+def parse_changes_args(args: dict, max_wait: float) -> tuple:
+    """
+    Gets "since" sequence number, page size and wait time from request arguments.
+
+    Returns: tuple (since, limit, wait).
+    """
+    try:
+        since = int(args.get("since", 0))
+    except ValueError:
+        raise ValueError("Since must be an integer")
+    if since < 0:
+        raise ValueError("Since must not be negative")
+    try:
+        wait = float(args.get("wait", 0))
+    except ValueError:
+        raise ValueError("Wait must be a number")
+    if not 0 <= wait <= max_wait:
+        raise ValueError("Wait must be between 0 and {}".format(max_wait))
+    return since, parse_limit(args), wait
+
+
+def changes_statement(since: int, limit: int):
+    """
+    Builds statement selecting up to limit changes with sequence numbers greater than since.
+
+    Returns: Select.
+    """
+    return db.select(Change).where(Change.seq > since).order_by(Change.seq).limit(limit)
+
+
+def changes_content(changes: list, since: int, path: str, args: dict) -> dict:
+    """
+    Produces the body of a change feed response. The "next" link continues after the last change
+    or, if there are no changes, repeats the request.
+
+    Returns: dict.
+    """
+    result = [{"content": change.to_api_dict(),
+               "links": {"self": "/api/{}s/{}".format(change.entity, change.record_id)}} for change in changes]
+    last_seq = changes[-1].seq if changes else since
+    return {"content": result, "links": {"self": path_with_args(path, args),
+                                         "next": path_with_args(path, args, since=last_seq)}}
+
+
+def wait_for_changes(since: int, limit: int, wait: float, interval: float) -> list:
+    """
+    Fetches changes after since, polling the database for up to wait seconds until there are some.
+
+    Returns: list of Change.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        changes = db.session.execute(changes_statement(since, limit)).scalars().all()
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        # Ending the transaction lets the next poll see changes committed meanwhile.
+        db.session.rollback()
+        time.sleep(min(interval, remaining))
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _record_flushed_changes(session, flush_context):
+    for records, action in ((session.new, "create"), (session.dirty, "update"), (session.deleted, "delete")):
+        for record in records:
+            entity = ENTITIES.get(type(record))
+            if entity is not None and (action != "update" or session.is_modified(record, include_collections=False)):
+                record_changes(session, entity, [record.id], action)
+
+
+@db.event.listens_for(db.session, "before_commit")
+def _write_pending_changes(session):
+    session.flush()
+    write_changes(session)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_pending_changes(session):
+    session.info.pop("pending_changes", None)
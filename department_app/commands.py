@@ -0,0 +1,270 @@
+"""
+This module implements flask command line interface commands of department app.
+
+Import commands read CSV files in a streaming fashion, validate every row with the models'
+populate_from_dict rules and insert valid rows in batches with multi-row INSERT statements
+(see department_app.bulk.insert_rows), so memory usage is bounded by the batch size regardless
+of the file size. Inserted rows are recorded in the change log in the batch transaction.
+Invalid rows are written to a reject file along with the validation error. If a batch fails,
+its rows are inserted one by one, so that only the rows failing in the database are rejected.
+
+Statistics commands check and rebuild materialized department statistics.
+
+Database commands apply versioned schema migrations (see department_app.migrations).
+"""
+
+import csv
+import time
+from collections import defaultdict
+import click
+from flask.cli import AppGroup
+from department_app import db, migrations
+from department_app.bulk import check_required_fields, insert_rows
+from department_app.changelog import ENTITIES, record_changes
+from department_app.models.entities import Department, Employee
+from department_app.statistics import update_statistics, rebuild_statistics
+
+EMPLOYEE_IMPORT_FIELDS = ("first_name", "last_name", "date_of_birth", "monthly_salary", "department_id")
+
+import_cli = AppGroup("import", help="Import departments and employees from CSV files.")
+statistics_cli = AppGroup("statistics", help="Maintain materialized department statistics.")
+database_cli = AppGroup("db", help="Apply versioned schema migrations.")
+
+
+class RejectWriter:
+    """
+    This class writes rejected CSV rows along with the rejection reason to a reject file.
+    The file is only created when the first row is rejected.
+
+    Attributes:
+    path: reject file path (str).
+    count: number of rejected rows (int).
+    """
+
+    def __init__(self, path: str, fieldnames: list):
+        self.path = path
+        self.count = 0
+        self._fieldnames = list(fieldnames) + ["error"]
+        self._file = None
+        self._writer = None
+
+    def write(self, row: dict, error: str):
+        """
+        Writes a rejected row to the reject file.
+        """
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerow(dict(row, error=error))
+        self.count += 1
+
+    def close(self):
+        """
+        Closes the reject file if it was created.
+        """
+        if self._file is not None:
+            self._file.close()
+
+
+class BatchInserter:
+    """
+    This class collects rows and inserts them into the table of a model with multi-row
+    INSERT statements, committing every batch in a separate transaction along with
+    the change log entries of the inserted rows.
+
+    Attributes:
+    count: number of inserted rows (int).
+    """
+
+    def __init__(self, model, batch_size: int, rejects: RejectWriter, on_insert=None, on_reject=None):
+        self.count = 0
+        self._model = model
+        self._batch_size = batch_size
+        self._rejects = rejects
+        self._on_insert = on_insert
+        self._on_reject = on_reject
+        self._rows = []
+        self._sources = []
+        self._started = time.perf_counter()
+
+    def add(self, values: dict, source: dict):
+        """
+        Adds column values of a row to the current batch, inserting the batch if it is full.
+        """
+        self._rows.append(values)
+        self._sources.append(source)
+        if len(self._rows) >= self._batch_size:
+            self.flush()
+
+    def _insert(self, rows: list):
+        ids = insert_rows(self._model.__table__, rows)
+        record_changes(db.session, ENTITIES[self._model], ids, "create")
+        if self._on_insert is not None:
+            self._on_insert(rows)
+        db.session.commit()
+        self.count += len(rows)
+
+    def flush(self):
+        """
+        Inserts the current batch. If the batch fails, its rows are inserted one by one,
+        every row in a separate transaction, and the failing rows are rejected along with the database error.
+        """
+        if not self._rows:
+            return
+        try:
+            self._insert(self._rows)
+        except Exception:
+            db.session.rollback()
+            for values, source in zip(self._rows, self._sources):
+                try:
+                    self._insert([values])
+                except Exception as e:
+                    db.session.rollback()
+                    self._rejects.write(source, str(getattr(e, "orig", None) or e))
+                    if self._on_reject is not None:
+                        self._on_reject(values)
+        self._rows = []
+        self._sources = []
+        click.echo("{} rows imported, {} rejected ({:.0f} rows/s)".format(
+            self.count, self._rejects.count, self.rate()))
+
+    def rate(self) -> float:
+        """
+        Returns import throughput in rows (both imported and rejected) per second.
+
+        Returns: float.
+        """
+        elapsed = time.perf_counter() - self._started
+        return (self.count + self._rejects.count) / elapsed if elapsed > 0 else 0.0
+
+
+def _run_import(path: str, reject_file: str, batch_size: int, model, convert, on_insert=None, on_reject=None):
+    """
+    Reads CSV file row by row, converts rows to column values with convert function
+    (raising ValueError or TypeError for invalid rows) and inserts them in batches.
+    Optional on_insert function is called with column values of every inserted batch
+    in the batch transaction and optional on_reject function with column values of
+    every row rejected by the database.
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        reader = csv.DictReader(source)
+        rejects = RejectWriter(reject_file or path + ".rejects.csv", reader.fieldnames or [])
+        inserter = BatchInserter(model, batch_size, rejects, on_insert, on_reject)
+        try:
+            for row in reader:
+                try:
+                    values = convert(row)
+                except (ValueError, TypeError) as e:
+                    rejects.write(row, str(e))
+                    continue
+                inserter.add(values, row)
+            inserter.flush()
+        finally:
+            rejects.close()
+    click.echo("Done: {} rows imported, {} rejected ({:.0f} rows/s)".format(
+        inserter.count, rejects.count, inserter.rate()))
+    if rejects.count:
+        click.echo("Rejected rows written to {}".format(rejects.path))
+
+
+@import_cli.command("departments")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(1),
+              help="Number of rows inserted in a single transaction.")
+@click.option("--reject-file", default=None, help="Path of CSV file for invalid rows (PATH.rejects.csv by default).")
+def import_departments(path, batch_size, reject_file):
+    """Imports departments from CSV file with "name" column."""
+    # Names of existing departments and of departments imported or about to be imported.
+    names = {name for name, in db.session.query(Department.name)}
+
+    def convert(row):
+        department = Department()
+        department.populate_from_dict(row)
+        check_required_fields(department)
+        if department.name in names:
+            raise ValueError("Department already exists")
+        names.add(department.name)
+        return {"name": department.name}
+
+    def on_reject(values):
+        names.discard(values["name"])
+
+    _run_import(path, reject_file, batch_size, Department, convert, on_reject=on_reject)
+
+
+@import_cli.command("employees")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(1),
+              help="Number of rows inserted in a single transaction.")
+@click.option("--reject-file", default=None, help="Path of CSV file for invalid rows (PATH.rejects.csv by default).")
+def import_employees(path, batch_size, reject_file):
+    """
+    Imports employees from CSV file with "first_name", "last_name", "date_of_birth",
+    "monthly_salary" and either "department" (department name) or "department_id" columns.
+    """
+    department_ids = {name: id for name, id in db.session.query(Department.name, Department.id)}
+    known_ids = set(department_ids.values())
+
+    def convert(row):
+        if row.get("department"):
+            if row["department"] not in department_ids:
+                raise ValueError("Department not found")
+            row = dict(row, department_id=str(department_ids[row["department"]]))
+        employee = Employee()
+        employee.populate_from_dict({key: value for key, value in row.items() if key in EMPLOYEE_IMPORT_FIELDS})
+        check_required_fields(employee)
+        if employee.department_id not in known_ids:
+            raise ValueError("Department not found")
+        return {"first_name": employee.first_name, "last_name": employee.last_name,
+                "date_of_birth": employee.date_of_birth, "monthly_salary": employee.monthly_salary,
+                "department_id": employee.department_id}
+
+    def on_insert(rows):
+        changes = defaultdict(lambda: ([], []))
+        for row in rows:
+            changes[row["department_id"]][0].append(row["monthly_salary"])
+        update_statistics(db.session.connection(), changes)
+
+    _run_import(path, reject_file, batch_size, Employee, convert, on_insert)
+
+
+@statistics_cli.command("rebuild")
+@click.option("--check", is_flag=True, help="Only report departments with inconsistent statistics.")
+def rebuild_department_statistics(check):
+    """Recomputes statistics of all departments from scratch and reports inconsistencies."""
+    inconsistent = rebuild_statistics(db.session.connection(), check_only=check)
+    if check:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    if inconsistent:
+        click.echo("Inconsistent statistics of departments: {}".format(", ".join(map(str, inconsistent))))
+    else:
+        click.echo("All department statistics are consistent")
+    if check and inconsistent:
+        raise SystemExit(1)
+
+
+@database_cli.command("upgrade")
+@click.option("--target", default=None, type=int, help="Version to upgrade to (the latest by default).")
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(1),
+              help="Number of rows updated in a single transaction by backfills.")
+@click.option("--pause", default=0.0, show_default=True, type=click.FloatRange(0),
+              help="Seconds to wait between backfill batches, e.g. to let replicas catch up.")
+def upgrade_database(target, batch_size, pause):
+    """Applies schema migrations which are not applied yet."""
+    with db.engine.connect() as connection:
+        applied = migrations.upgrade(connection, target, batch_size, pause, echo=click.echo)
+    click.echo("{} migrations applied".format(len(applied)) if applied else "Database is up to date")
+
+
+@database_cli.command("status")
+def database_status():
+    """Lists schema migrations along with the time they were applied."""
+    with db.engine.connect() as connection:
+        applied = migrations.applied_versions(connection)
+    for migration in migrations.load_migrations():
+        applied_at = applied.get(migration.version)
+        click.echo("{} {:<19} {}".format(migration, applied_at.isoformat(" ", "seconds") if applied_at else "pending",
+                                         migration.description))
@@ -0,0 +1,44 @@
+"""
+This module implements optimistic concurrency control of department app.
+
+Departments and employees have version column used as SQLAlchemy version_id_col, so
+UPDATE and DELETE statements issued by the session check the version the record was loaded with
+and raise StaleDataError if the record was modified or deleted meanwhile. No row locks are taken.
+
+The version is surfaced to clients:
+- API responses of single records have ETag header starting with the record version
+  (see Employee.etag and Department.content_etag) and PUT and DELETE requests with If-Match header
+  not matching the current version are rejected with 412 Precondition Failed. Department responses
+  include statistics, which change without updating the department, so their ETags are weak and
+  also cover the statistics, while If-Match preconditions only compare the version;
+- HTML edit forms submit the version the form was rendered with, and a form submitted
+  for an outdated version is displayed again with the current values and 412 status.
+"""
+
+from flask import request
+
+CONFLICT_MESSAGE = "Record was modified by another user, please review the changes and try again"
+
+
+def etag_matches(record) -> bool:
+    """
+    Checks If-Match header of the current request against the entity tag of the record's version:
+    an entity tag matches if it is the record's etag or starts with it followed by "-".
+    Requests without If-Match header always match.
+
+    Returns: bool.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return True
+    return any(tag.split("-")[0] == record.etag for tag in request.if_match.as_set(include_weak=True))
+
+
+def version_matches(record, form: dict) -> bool:
+    """
+    Checks the version submitted with an HTML form against the version of the record.
+    Forms without version (e.g. for new records) always match.
+
+    Returns: bool.
+    """
+    version = form.get("version", "")
+    return not version or not record.version or version == str(record.version)
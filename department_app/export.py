@@ -0,0 +1,59 @@
+"""
+This module implements streaming export of employee records.
+
+Employees are fetched with a server side cursor in batches (yield_per), and every batch
+is serialized into a separate chunk of the response, so memory usage does not depend
+on the number of exported records and the first chunk is sent right away.
+"""
+
+import csv
+import io
+import json
+from department_app.models.entities import Employee
+
+EMPLOYEE_EXPORT_FIELDS = ['id', 'first_name', 'last_name', 'date_of_birth', 'monthly_salary', 'department_id']
+
+
+def employee_batches(query, batch_size: int):
+    """
+    Iterates over employees of the given query ordered by id in batches of batch_size records.
+
+    Returns: generator of lists of Employee.
+    """
+    query = query.order_by(Employee.id).execution_options(stream_results=True).yield_per(batch_size)
+    batch = []
+    for employee in query:
+        batch.append(employee)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def employees_ndjson_chunks(query, batch_size: int):
+    """
+    Serializes employees of the given query to newline delimited JSON, one chunk per batch.
+
+    Returns: generator of str.
+    """
+    for batch in employee_batches(query, batch_size):
+        yield "".join([json.dumps(employee.to_api_dict()) + "\n" for employee in batch])
+
+
+def employees_csv_chunks(query, batch_size: int):
+    """
+    Serializes employees of the given query to CSV with a header row, one chunk per batch.
+    The header is sent as the first chunk before the query is executed.
+
+    Returns: generator of str.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EMPLOYEE_EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in employee_batches(query, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([employee.to_dict() for employee in batch])
+        yield buffer.getvalue()
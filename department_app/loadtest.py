@@ -0,0 +1,159 @@
+"""
+This module implements a load test comparing API servers under many concurrent keep-alive clients.
+
+Every simulated client keeps its own HTTP/1.1 connection open and sends requests one after another
+for the given duration, reconnecting when the server closes the connection. The test reports
+throughput, error count and latency percentiles for every target URL, e.g. to compare
+the WSGI application with the asynchronous API (department_app.asgi):
+
+    gunicorn --workers 4 --threads 8 --bind :8000 department_app.wsgi:app
+    uvicorn --factory --workers 4 --port 8001 department_app.asgi:create_asgi_app
+    python -m department_app.loadtest --concurrency 1000 --duration 30 \\
+        http://127.0.0.1:8000/api/departments http://127.0.0.1:8001/api/departments
+
+Thousands of clients need a raised open files limit (ulimit -n) on both sides.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+import click
+
+
+class LoadTestResult:
+    """
+    This class holds results of a load test of a single URL.
+
+    Attributes:
+    url: tested URL (str).
+    concurrency: number of concurrent clients (int).
+    duration: test duration in seconds (float).
+    latencies: latencies of successful requests in seconds (list of float).
+    errors: number of failed requests (int).
+    """
+
+    def __init__(self, url: str, concurrency: int, duration: float):
+        self.url = url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.latencies = []
+        self.errors = 0
+
+    @property
+    def requests_per_second(self) -> float:
+        """
+        Read-only property allowing to get throughput of successful requests.
+
+        Returns: float.
+        """
+        return len(self.latencies) / self.duration if self.duration else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Returns latency percentile (fraction between 0 and 1) in milliseconds.
+
+        Returns: float or None (if there are no successful requests).
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000
+
+    def __str__(self) -> str:
+        def milliseconds(value):
+            return "{:.1f}ms".format(value) if value is not None else "-"
+        return "{}: {} clients, {} requests, {} errors, {:.0f} req/s, p50 {}, p90 {}, p99 {}".format(
+            self.url, self.concurrency, len(self.latencies), self.errors, self.requests_per_second,
+            milliseconds(self.percentile(0.5)), milliseconds(self.percentile(0.9)),
+            milliseconds(self.percentile(0.99)))
+
+
+async def _read_response(reader) -> tuple:
+    """
+    Reads HTTP response with Content-Length or chunked body.
+
+    Returns: tuple (status code, True if the server keeps the connection open).
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        return int(status), False
+    keep_alive = headers.get("connection") != "close" and version == b"HTTP/1.1"
+    return int(status), keep_alive
+
+
+async def _client(url: str, deadline: float, result: LoadTestResult):
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    request = "GET {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n\r\n".format(path or "/", parts.netloc)
+    writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write(request.encode())
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+            continue
+        if status < 400:
+            result.latencies.append(time.perf_counter() - started)
+        else:
+            result.errors += 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load_test(url: str, concurrency: int, duration: float) -> LoadTestResult:
+    """
+    Sends GET requests to the URL from concurrency clients for duration seconds.
+
+    Returns: LoadTestResult.
+    """
+    result = LoadTestResult(url, concurrency, duration)
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[_client(url, deadline, result) for _ in range(concurrency)])
+    return result
+
+
+@click.command()
+@click.argument("urls", nargs=-1, required=True)
+@click.option("--concurrency", default=100, show_default=True, type=click.IntRange(1),
+              help="Number of concurrent keep-alive clients.")
+@click.option("--duration", default=10.0, show_default=True, type=click.FloatRange(0.1),
+              help="Duration of the test of every URL in seconds.")
+def main(urls, concurrency, duration):
+    """Runs load test of every URL one after another and prints the results."""
+    for url in urls:
+        click.echo(str(asyncio.run(run_load_test(url, concurrency, duration))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+This module implements request and database instrumentation of department app.
+
+When enabled (METRICS_ENABLED), the extension measures:
+- latency of every request by endpoint and method;
+- number and duration of SQL statements per request (SQLAlchemy engine events),
+  logging statements slower than SLOW_QUERY_SECONDS;
+- lazy loads of relationships per request (SQLAlchemy session events), logging a possible
+  N+1 query problem when a relationship is lazily loaded at least N_PLUS_ONE_THRESHOLD times
+  while handling a single request (e.g. Department.employees in a listing view).
+
+Metrics are exposed by /metrics endpoint in Prometheus text format, together with connection
+pool metrics. They are collected per worker process, so every worker should be scraped.
+When the extension is disabled, requests are not instrumented, /metrics endpoint is not registered
+and the event listeners return right after checking that the current request is not instrumented.
+"""
+
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy.engine import Engine
+from department_app import db
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: dict, value) -> str:
+    if labels:
+        name += "{" + ",".join('{}="{}"'.format(key, _escape(label)) for key, label in labels.items()) + "}"
+    return "{} {}".format(name, repr(float(value)) if isinstance(value, float) else value)
+
+
+class Counter:
+    """
+    This class implements thread safe counter metric with labels.
+
+    Attributes:
+    name: metric name (str).
+    documentation: metric help text (str).
+    labels: label names (tuple of str).
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increments the counter of the given label values.
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        Produces samples of this metric.
+
+        Returns: generator of tuples (sample name, labels dict, value).
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram(Counter):
+    """
+    This class implements thread safe histogram metric with labels.
+
+    Attributes:
+    buckets: upper bounds of the histogram buckets (tuple).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        """
+        Records an observed value for the given label values.
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                yield self.name + "_bucket", dict(labels, le=str(bound)), count
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, counts[-1]
+
+
+class MetricsRegistry:
+    """
+    This class holds metrics of a flask application.
+
+    Attributes:
+    request_duration: request latency histogram by endpoint, method and status (Histogram).
+    sql_statements: SQL statements per request histogram by endpoint (Histogram).
+    sql_duration: SQL statement duration histogram by endpoint (Histogram).
+    slow_queries: slow SQL statements counter by endpoint (Counter).
+    lazy_loads: relationship lazy loads counter by endpoint and relationship (Counter).
+    n_plus_one: possible N+1 query problems counter by endpoint and relationship (Counter).
+    """
+
+    def __init__(self):
+        self.request_duration = Histogram("department_app_request_duration_seconds",
+                                          "Request latency in seconds.", ("endpoint", "method", "status"))
+        self.sql_statements = Histogram("department_app_sql_statements_per_request",
+                                        "Number of SQL statements executed per request.", ("endpoint",),
+                                        COUNT_BUCKETS)
+        self.sql_duration = Histogram("department_app_sql_duration_seconds",
+                                      "SQL statement execution time in seconds.", ("endpoint",))
+        self.slow_queries = Counter("department_app_slow_queries_total",
+                                    "Number of SQL statements slower than the slow query threshold.", ("endpoint",))
+        self.lazy_loads = Counter("department_app_lazy_loads_total",
+                                  "Number of relationship lazy loads.", ("endpoint", "relationship"))
+        self.n_plus_one = Counter("department_app_n_plus_one_total",
+                                  "Number of requests lazily loading a relationship at least "
+                                  "N_PLUS_ONE_THRESHOLD times.", ("endpoint", "relationship"))
+
+    def metrics(self) -> list:
+        """
+        Returns: list of metrics of this registry.
+        """
+        return [self.request_duration, self.sql_statements, self.sql_duration, self.slow_queries,
+                self.lazy_loads, self.n_plus_one]
+
+    def render(self, values: list = ()) -> str:
+        """
+        Renders metrics and additional unlabeled values, passed as list of
+        (name, help text, type, value) tuples, in Prometheus text exposition format.
+
+        Returns: str.
+        """
+        lines = []
+        for metric in self.metrics():
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(_format_sample(*sample) for sample in metric.samples())
+        for name, documentation, kind, value in values:
+            lines.append("# HELP {} {}".format(name, documentation))
+            lines.append("# TYPE {} {}".format(name, kind))
+            lines.append(_format_sample(name, {}, value))
+        return "\n".join(lines) + "\n"
+
+
+class Metrics:
+    """
+    This class implements flask extension collecting request and database metrics.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Initializes the extension for the flask application.
+        """
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("SLOW_QUERY_SECONDS", 0.5)
+        app.config.setdefault("N_PLUS_ONE_THRESHOLD", 10)
+        if not app.config["METRICS_ENABLED"]:
+            return
+        app.extensions["metrics"] = MetricsRegistry()
+        app.before_request(_start_request)
+        app.after_request(_record_status)
+        app.teardown_request(_finish_request)
+        app.add_url_rule("/metrics", "prometheus_metrics", prometheus_metrics)
+
+    @staticmethod
+    def registry(app=None):
+        """
+        Returns metrics registry of the application (current application by default),
+        or None if metrics are disabled.
+
+        Returns: MetricsRegistry or None.
+        """
+        app = app or current_app
+        return app.extensions.get("metrics")
+
+
+def prometheus_metrics():
+    """Returns request, database and connection pool metrics of this worker process in Prometheus format."""
+    registry = Metrics.registry()
+    return Response(registry.render(current_app.extensions["pool_metrics"].prometheus_values()),
+                    mimetype="text/plain; version=0.0.4")
+
+
+def _request_metrics():
+    """
+    Returns metrics state of the current request or None if the request is not instrumented.
+    """
+    if not has_request_context():
+        return None
+    return g.get("request_metrics")
+
+
+def _start_request():
+    g.request_metrics = {"started": time.perf_counter(), "statements": 0, "lazy_loads": {}, "status": 500}
+
+
+def _record_status(response):
+    state = _request_metrics()
+    if state is not None:
+        state["status"] = response.status_code
+    return response
+
+
+def _finish_request(exception=None):
+    state = g.pop("request_metrics", None)
+    if state is None:
+        return
+    registry = current_app.extensions["metrics"]
+    endpoint = request.endpoint or "unknown"
+    registry.request_duration.observe(time.perf_counter() - state["started"], endpoint=endpoint,
+                                      method=request.method, status=str(state["status"]))
+    registry.sql_statements.observe(state["statements"], endpoint=endpoint)
+    threshold = current_app.config["N_PLUS_ONE_THRESHOLD"]
+    for relationship, count in state["lazy_loads"].items():
+        registry.lazy_loads.inc(count, endpoint=endpoint, relationship=relationship)
+        if count >= threshold:
+            registry.n_plus_one.inc(endpoint=endpoint, relationship=relationship)
+            current_app.logger.warning("Possible N+1 queries in %s: %s lazily loaded %d times",
+                                       endpoint, relationship, count)
+
+
+@db.event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if _request_metrics() is not None:
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@db.event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    state = _request_metrics()
+    if state is None or not connection.info.get("query_started"):
+        return
+    duration = time.perf_counter() - connection.info["query_started"].pop()
+    state["statements"] += 1
+    registry = current_app.extensions["metrics"]
+    endpoint = request.endpoint or "unknown"
+    registry.sql_duration.observe(duration, endpoint=endpoint)
+    if duration >= current_app.config["SLOW_QUERY_SECONDS"]:
+        registry.slow_queries.inc(endpoint=endpoint)
+        current_app.logger.warning("Slow query in %s (%.3fs): %s", endpoint, duration, statement)
+
+
+@db.event.listens_for(db.session, "do_orm_execute")
+def _record_lazy_load(orm_execute_state):
+    state = _request_metrics()
+    if state is not None and orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        relationship = str(orm_execute_state.loader_strategy_path[-1])
+        state["lazy_loads"][relationship] = state["lazy_loads"].get(relationship, 0) + 1
@@ -0,0 +1,293 @@
+"""
+This package implements versioned schema migrations of department app.
+
+Every module v<NNN>_<name>.py of this package is a migration script: its docstring describes the schema
+change and its upgrade(operations) function applies it with Operations, which makes schema changes online,
+so that they can be applied to a live database without downtime:
+- columns and indexes are added with ALGORITHM=INPLACE, LOCK=NONE on MySQL, so InnoDB builds them while
+  the table stays readable and writable, and indexes are created CONCURRENTLY on PostgreSQL;
+- existing rows are backfilled in primary key order, batch_size rows per short transaction, optionally
+  pausing between batches so that replicas keep up, instead of a single UPDATE locking the whole table.
+
+Operations are idempotent: tables, columns and indexes which already exist are skipped and backfills only
+update rows which still need it. MySQL commits DDL statements implicitly, so a migration interrupted
+midway cannot be rolled back and is simply applied again. For the same reason databases created with
+db.create_all() (e.g. in development and tests) are brought under version control by applying
+all migrations, which then only record their versions.
+
+Applied versions are recorded in schema_migration table. Migrations are applied with "flask db upgrade"
+and listed with "flask db status" (see department_app.commands).
+"""
+
+import importlib
+import pkgutil
+import re
+import time
+from datetime import datetime
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from department_app import db
+
+_SCRIPT_NAME = re.compile(r"v(\d+)_(\w+)$")
+
+schema_migration = db.Table("schema_migration", db.MetaData(),
+                            db.Column("version", db.Integer, primary_key=True, autoincrement=False),
+                            db.Column("name", db.String(80), nullable=False),
+                            db.Column("applied_at", db.DateTime, nullable=False))
+
+
+class Migration:
+    """
+    This class describes a migration script.
+
+    Attributes:
+    version: version number (int).
+    name: script name without the version (str).
+    description: first line of the script docstring (str).
+    """
+
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.description = (module.__doc__ or "").strip().split("\n")[0]
+        self._module = module
+
+    def upgrade(self, operations):
+        """
+        Applies the migration with the given Operations.
+        """
+        self._module.upgrade(operations)
+
+    def __str__(self):
+        return "{:03d} {}".format(self.version, self.name)
+
+
+def load_migrations() -> list:
+    """
+    Imports migration scripts of this package.
+
+    Returns: list of Migration ordered by version.
+    """
+    migrations = {}
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _SCRIPT_NAME.match(module_info.name)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError("Duplicate migration version {}".format(version))
+        module = importlib.import_module("{}.{}".format(__name__, module_info.name))
+        migrations[version] = Migration(version, match.group(2), module)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def add_column_ddl(column, dialect) -> str:
+    """
+    Builds statement adding the column (bound to its table) to an existing table.
+    On MySQL the column is added in place without locking the table.
+
+    Returns: str.
+    """
+    statement = "ALTER TABLE {} ADD COLUMN {}".format(
+        column.table.name, CreateColumn(column).compile(dialect=dialect))
+    if dialect.name == "mysql":
+        statement += ", ALGORITHM=INPLACE, LOCK=NONE"
+    return statement
+
+
+def create_index_ddl(index, dialect, lock: str = "NONE") -> str:
+    """
+    Builds statement creating the index online: in place with the given lock level on MySQL
+    (LOCK=NONE permits concurrent reads and writes, FULLTEXT indexes require LOCK=SHARED)
+    and concurrently on PostgreSQL.
+
+    Returns: str.
+    """
+    statement = str(CreateIndex(index).compile(dialect=dialect))
+    if dialect.name == "mysql":
+        statement += " ALGORITHM=INPLACE LOCK={}".format(lock)
+    elif dialect.name == "postgresql":
+        statement = re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", statement)
+    return statement
+
+
+class Operations:
+    """
+    This class implements idempotent online schema operations used by migration scripts.
+    Every operation runs in its own transaction.
+
+    Attributes:
+    connection: database connection (Connection).
+    dialect: database dialect name (str).
+    batch_size: number of rows updated in a single transaction by backfills (int).
+    pause: seconds to wait between backfill batches (float).
+    """
+
+    def __init__(self, connection, batch_size: int = 5000, pause: float = 0.0, echo=None):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.batch_size = batch_size
+        self.pause = pause
+        self._echo = echo or (lambda message: None)
+
+    def _inspector(self):
+        # A new inspector every time, as inspectors cache the schema which migrations change.
+        return db.inspect(self.connection)
+
+    def has_table(self, table_name: str) -> bool:
+        """
+        Returns: bool, whether the table exists.
+        """
+        return self._inspector().has_table(table_name)
+
+    def get_column(self, table_name: str, column_name: str) -> dict:
+        """
+        Returns: dict describing the column as returned by Inspector.get_columns, or None if there is no such column.
+        """
+        for column in self._inspector().get_columns(table_name):
+            if column["name"] == column_name:
+                return column
+        return None
+
+    def has_index(self, table_name: str, index_name: str) -> bool:
+        """
+        Returns: bool, whether the table has an index with the given name.
+        """
+        return any(index["name"] == index_name for index in self._inspector().get_indexes(table_name))
+
+    def execute(self, statement, parameters=None):
+        """
+        Executes a statement (SQL string or statement object) in a separate transaction.
+        """
+        if isinstance(statement, str):
+            statement = db.text(statement)
+        with self.connection.begin():
+            self.connection.execute(statement, parameters or {})
+
+    def create_table(self, table) -> bool:
+        """
+        Creates the table along with its indexes unless it exists.
+
+        Returns: bool, whether the table was created.
+        """
+        if self.has_table(table.name):
+            return False
+        with self.connection.begin():
+            table.create(self.connection)
+        self._echo("Created table {}".format(table.name))
+        return True
+
+    def add_column(self, column):
+        """
+        Adds the column (bound to its table) to the table unless it exists.
+        Columns added to tables with rows must be nullable or have a server default.
+        """
+        if self.get_column(column.table.name, column.name) is not None:
+            return
+        self.execute(add_column_ddl(column, self.connection.dialect))
+        self._echo("Added column {}.{}".format(column.table.name, column.name))
+
+    def set_not_null(self, column):
+        """
+        Makes the column (bound to its table) NOT NULL unless it already is. All rows must have been backfilled.
+        SQLite cannot alter columns, so the column stays nullable there.
+        """
+        if not self.get_column(column.table.name, column.name)["nullable"]:
+            return
+        table_name = column.table.name
+        column_type = column.type.compile(dialect=self.connection.dialect)
+        if self.dialect == "mysql":
+            self.execute("ALTER TABLE {} MODIFY {} {} NOT NULL, ALGORITHM=INPLACE, LOCK=NONE".format(
+                table_name, column.name, column_type))
+        elif self.dialect == "sqlite":
+            self._echo("SQLite cannot alter columns, {}.{} stays nullable".format(table_name, column.name))
+            return
+        else:
+            self.execute("ALTER TABLE {} ALTER COLUMN {} SET NOT NULL".format(table_name, column.name))
+        self._echo("Made column {}.{} not null".format(table_name, column.name))
+
+    def create_index(self, index, lock: str = "NONE"):
+        """
+        Creates the index (bound to its table) online unless it exists (see create_index_ddl).
+        """
+        if self.has_index(index.table.name, index.name):
+            return
+        statement = create_index_ddl(index, self.connection.dialect, lock)
+        self._echo("Creating index {} on {}".format(index.name, index.table.name))
+        if self.dialect == "postgresql":
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+            with self.connection.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(db.text(statement))
+        else:
+            self.execute(statement)
+
+    def backfill(self, table, compute, where=None) -> int:
+        """
+        Updates rows of the table matching the where clause in batches of batch_size rows,
+        every batch in a separate transaction. compute function gets a row (mapping of the table columns)
+        and returns dict of new column values. Rows are read in primary key order, so every batch
+        locks a short range of the primary key index only.
+
+        Returns: number of updated rows.
+        """
+        key = table.primary_key.columns.values()[0]
+        count = 0
+        last = None
+        while True:
+            query = db.select(table).order_by(key).limit(self.batch_size)
+            if where is not None:
+                query = query.where(where)
+            if last is not None:
+                query = query.where(key > last)
+            with self.connection.begin():
+                rows = self.connection.execute(query).mappings().all()
+                if rows:
+                    self.connection.execute(table.update().where(key == db.bindparam("row_key")),
+                                            [dict(compute(row), row_key=row[key.name]) for row in rows])
+            if not rows:
+                break
+            count += len(rows)
+            last = rows[-1][key.name]
+            self._echo("{}: {} rows updated".format(table.name, count))
+            if len(rows) < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+        return count
+
+
+def applied_versions(connection) -> dict:
+    """
+    Reads versions of the applied migrations.
+
+    Returns: dict mapping version (int) to the time it was applied (datetime).
+    """
+    if not db.inspect(connection).has_table(schema_migration.name):
+        return {}
+    return {version: applied_at for version, applied_at in
+            connection.execute(db.select(schema_migration.c.version, schema_migration.c.applied_at))}
+
+
+def upgrade(connection, target: int = None, batch_size: int = 5000, pause: float = 0.0, echo=None) -> list:
+    """
+    Applies migrations which are not applied yet, up to the target version if it is given,
+    recording every applied migration in schema_migration table.
+
+    Returns: list of applied Migration.
+    """
+    echo = echo or (lambda message: None)
+    migrations = load_migrations()
+    with connection.begin():
+        schema_migration.create(connection, checkfirst=True)
+    applied = applied_versions(connection)
+    operations = Operations(connection, batch_size, pause, echo)
+    result = []
+    for migration in migrations:
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+        echo("Applying {}: {}".format(migration, migration.description))
+        migration.upgrade(operations)
+        with connection.begin():
+            connection.execute(schema_migration.insert().values(version=migration.version, name=migration.name,
+                                                                applied_at=datetime.utcnow()))
+        result.append(migration)
+    return result
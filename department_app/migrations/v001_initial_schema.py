@@ -0,0 +1,25 @@
+"""
+Creates department and employee tables.
+
+The tables are created as they were before the schema was versioned, later migrations add
+the columns, indexes and tables introduced since then.
+"""
+
+from department_app import db
+
+metadata = db.MetaData()
+department = db.Table("department", metadata,
+                      db.Column("id", db.Integer, primary_key=True),
+                      db.Column("name", db.String(80), unique=True, nullable=False))
+employee = db.Table("employee", metadata,
+                    db.Column("id", db.Integer, primary_key=True),
+                    db.Column("first_name", db.String(80), nullable=False),
+                    db.Column("last_name", db.String(80), nullable=False),
+                    db.Column("date_of_birth", db.Date, nullable=False),
+                    db.Column("monthly_salary", db.Numeric(10, 2), nullable=False),
+                    db.Column("department_id", db.Integer, db.ForeignKey("department.id"), nullable=False))
+
+
+def upgrade(operations):
+    operations.create_table(department)
+    operations.create_table(employee)
@@ -0,0 +1,19 @@
+"""
+Indexes employee names, department and date of birth for listings and search filters.
+"""
+
+from department_app import db
+
+employee = db.Table("employee", db.MetaData(),
+                    db.Column("id", db.Integer, primary_key=True),
+                    db.Column("first_name", db.String(80)),
+                    db.Column("last_name", db.String(80)),
+                    db.Column("date_of_birth", db.Date),
+                    db.Column("department_id", db.Integer))
+
+
+def upgrade(operations):
+    operations.create_index(db.Index("ix_employee_name", employee.c.last_name, employee.c.first_name))
+    operations.create_index(db.Index("ix_employee_department_name", employee.c.department_id,
+                                     employee.c.last_name, employee.c.first_name))
+    operations.create_index(db.Index("ix_employee_date_of_birth", employee.c.date_of_birth))
@@ -0,0 +1,23 @@
+"""
+Adds indexed employee.search_name column with normalized names for name prefix search.
+
+The column is added as nullable, backfilled in batches and then made NOT NULL, so the table is not locked
+on MySQL. Employees created meanwhile get their search_name from the application.
+"""
+
+from department_app import db
+from department_app.models.entities import normalize_name
+
+employee = db.Table("employee", db.MetaData(),
+                    db.Column("id", db.Integer, primary_key=True),
+                    db.Column("first_name", db.String(80)),
+                    db.Column("last_name", db.String(80)),
+                    db.Column("search_name", db.String(161)))
+
+
+def upgrade(operations):
+    operations.add_column(employee.c.search_name)
+    operations.backfill(employee, lambda row: {"search_name": normalize_name(row["last_name"], row["first_name"])},
+                        where=employee.c.search_name.is_(None))
+    operations.set_not_null(employee.c.search_name)
+    operations.create_index(db.Index("ix_employee_search_name", employee.c.search_name))
@@ -0,0 +1,26 @@
+"""
+Adds full-text index of employee names: FTS5 table on SQLite and FULLTEXT index on MySQL.
+
+MySQL cannot build FULLTEXT indexes with LOCK=NONE, so employees cannot be modified (but can be read)
+while the index is built.
+"""
+
+from department_app import db
+from department_app.search import FTS5_DDL, fts5_supported
+
+employee = db.Table("employee", db.MetaData(),
+                    db.Column("id", db.Integer, primary_key=True),
+                    db.Column("first_name", db.String(80)),
+                    db.Column("last_name", db.String(80)))
+
+
+def upgrade(operations):
+    if operations.dialect == "sqlite":
+        if operations.has_table("employee_fts") or not fts5_supported(operations.connection):
+            return
+        for statement in FTS5_DDL:
+            operations.execute(statement)
+        operations.execute("INSERT INTO employee_fts(employee_fts) VALUES ('rebuild')")
+    elif operations.dialect == "mysql":
+        operations.create_index(db.Index("ix_employee_fulltext", employee.c.first_name, employee.c.last_name,
+                                         mysql_prefix="FULLTEXT"), lock="SHARED")
@@ -0,0 +1,41 @@
+"""
+Makes employee.department_id foreign key delete employees along with their department.
+
+The constraint is replaced online: on MySQL in place with foreign key checks disabled for the statement,
+as existing rows already satisfy the old constraint, and on PostgreSQL it is added NOT VALID and validated
+separately, which does not block writes. SQLite cannot alter constraints, so the constraint is left
+as it is there: departments are deleted along with their employees by Department.delete_by_ids anyway.
+"""
+
+from department_app import db
+
+CONSTRAINT = "fk_employee_department_id"
+ADD_CONSTRAINT = "ADD CONSTRAINT {} FOREIGN KEY (department_id) REFERENCES department (id) " \
+                 "ON DELETE CASCADE".format(CONSTRAINT)
+
+
+def _department_foreign_keys(operations) -> list:
+    return [foreign_key for foreign_key in db.inspect(operations.connection).get_foreign_keys("employee")
+            if foreign_key["constrained_columns"] == ["department_id"]]
+
+
+def upgrade(operations):
+    if operations.dialect == "sqlite":
+        return
+    foreign_keys = _department_foreign_keys(operations)
+    if any(foreign_key["options"].get("ondelete", "").upper() == "CASCADE" for foreign_key in foreign_keys):
+        return
+    if operations.dialect == "mysql":
+        drops = "".join("DROP FOREIGN KEY {}, ".format(foreign_key["name"]) for foreign_key in foreign_keys)
+        with operations.connection.begin():
+            operations.connection.execute(db.text("SET foreign_key_checks = 0"))
+            try:
+                operations.connection.execute(db.text("ALTER TABLE employee {}{}, ALGORITHM=INPLACE, LOCK=NONE"
+                                                      .format(drops, ADD_CONSTRAINT)))
+            finally:
+                operations.connection.execute(db.text("SET foreign_key_checks = 1"))
+    else:
+        operations.execute("ALTER TABLE employee {} NOT VALID".format(ADD_CONSTRAINT))
+        operations.execute("ALTER TABLE employee VALIDATE CONSTRAINT {}".format(CONSTRAINT))
+        for foreign_key in foreign_keys:
+            operations.execute("ALTER TABLE employee DROP CONSTRAINT {}".format(foreign_key["name"]))
@@ -0,0 +1,26 @@
+"""
+Adds department_statistics table with materialized statistics of departments and computes them.
+
+Statistics are maintained by the application from then on. Statistics of employees modified between
+this migration and the deployment of the application maintaining them are fixed with
+"flask statistics rebuild".
+"""
+
+from department_app import db
+from department_app.statistics import rebuild_statistics
+
+department_statistics = db.Table(
+    "department_statistics", db.MetaData(),
+    db.Column("department_id", db.Integer, db.ForeignKey("department.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("employees_count", db.Integer, nullable=False),
+    db.Column("salary_sum", db.Numeric(16, 2), nullable=False),
+    db.Column("salary_min", db.Numeric(10, 2)),
+    db.Column("salary_max", db.Numeric(10, 2)),
+    db.Column("salary_histogram", db.Text, nullable=False))
+db.Table("department", department_statistics.metadata, db.Column("id", db.Integer, primary_key=True))
+
+
+def upgrade(operations):
+    operations.create_table(department_statistics)
+    with operations.connection.begin():
+        rebuild_statistics(operations.connection)
@@ -0,0 +1,19 @@
+"""
+Adds version columns of departments and employees used for optimistic concurrency control.
+
+The columns have server default 1, so existing rows need no backfill.
+"""
+
+from department_app import db
+
+department = db.Table("department", db.MetaData(),
+                      db.Column("id", db.Integer, primary_key=True),
+                      db.Column("version", db.Integer, nullable=False, server_default="1"))
+employee = db.Table("employee", db.MetaData(),
+                    db.Column("id", db.Integer, primary_key=True),
+                    db.Column("version", db.Integer, nullable=False, server_default="1"))
+
+
+def upgrade(operations):
+    operations.add_column(department.c.version)
+    operations.add_column(employee.c.version)
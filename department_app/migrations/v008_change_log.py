@@ -0,0 +1,24 @@
+"""
+Adds change_log table and the change_log_lock row serializing transactions writing it.
+"""
+
+from department_app import db
+
+metadata = db.MetaData()
+change_log = db.Table("change_log", metadata,
+                      db.Column("seq", db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True),
+                      db.Column("entity", db.String(20), nullable=False),
+                      db.Column("record_id", db.Integer, nullable=False),
+                      db.Column("action", db.String(6), nullable=False),
+                      db.Column("changed_at", db.DateTime, nullable=False))
+change_log_lock = db.Table("change_log_lock", metadata,
+                           db.Column("id", db.Integer, primary_key=True, autoincrement=False),
+                           db.Column("commits", db.BigInteger, nullable=False))
+
+
+def upgrade(operations):
+    operations.create_table(change_log)
+    operations.create_table(change_log_lock)
+    with operations.connection.begin():
+        if operations.connection.execute(db.select(change_log_lock.c.id)).first() is None:
+            operations.connection.execute(change_log_lock.insert().values(id=1, commits=0))
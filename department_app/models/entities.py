@@ -1,6 +1,24 @@
 from department_app import db
+from sqlalchemy.orm.exc import StaleDataError
 from decimal import Decimal, InvalidOperation
 from datetime import date
+from bisect import bisect_right
+import json
+
+def normalize_name(*names) -> str:
+    """
+    Produces normalized form of a name used for name search: 
+    lower case words separated by single spaces.
+    
+    Returns: str.
+    """
+    return " ".join(" ".join(names).lower().split())
+
+
+def _default_search_name(context) -> str:
+    parameters = context.get_current_parameters()
+    return normalize_name(parameters['last_name'], parameters['first_name'])
+
 
 class Department(db.Model):
     """
@@ -11,15 +29,150 @@ class Department(db.Model):
         that the corresponding database column is maintained.
     name: This ensures that Department instances have name (str) attribute and 
           that the corresponding database column is maintained.
-    employees: This ensures that Department instances have employees (list) attribute,
+    employees: This ensures that Department instances have employees (list) attribute ordered by name,
                that Employee instances have department (Department) attribute  
                and that the corresponding one to many relationship is maintained in the database structure. 
+    version: This ensures that Department instances have version (int) attribute, which is incremented
+             on every update and checked by UPDATE and DELETE statements of the session, so that
+             concurrent modifications are detected (optimistic concurrency control).
     """
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
-    employees = db.relationship("Employee", backref='department')
-    
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+    employees = db.relationship("Employee", backref='department', passive_deletes=True,
+                                order_by="[Employee.last_name, Employee.first_name, Employee.id]")
+
+    _employees_count = db.query_expression()
+    _salary_sum = db.query_expression()
+    _salary_order = db.query_expression()
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @classmethod
+    def statistics_order_by(cls) -> list:
+        """
+        Describes the ordering of departments listing: by average monthly salary (descending, 
+        departments without employees last), then by id.
+        The average is rounded in SQL to cents, the same scale as the value stored in page cursors,
+        so that keyset predicates compare cursor values with exactly the values the rows are ordered by.
+        
+        Returns: list of (column expression, descending) pairs.
+        """
+        # SQLite stores whole NUMERIC values as integers, so the sum is multiplied by 1.0 to avoid integer division.
+        average = DepartmentStatistics.salary_sum * 1.0 / db.func.nullif(DepartmentStatistics.employees_count, 0)
+        average = db.cast(db.func.round(average, 2), db.Numeric(16, 2))
+        return [(db.func.coalesce(average, -1), True), (cls.id, False)]
+
+    @classmethod
+    def query_with_statistics(cls):
+        """
+        Builds a query of departments joined with their materialized statistics (DepartmentStatistics),
+        ordered as described by statistics_order_by().
+        Departments loaded by this query serve average_monthly_salary and employees_count 
+        from the query result instead of loading the employees relationship.
+        
+        Returns: Query.
+        """
+        return cls._with_statistics(cls.query).populate_existing()
+
+    @classmethod
+    def select_with_statistics(cls):
+        """
+        Builds a select statement of departments joined with their materialized statistics,
+        loading the same values as query_with_statistics(). Intended to be executed
+        with asynchronous sessions, which can not load relationships lazily.
+        
+        Returns: Select.
+        """
+        return cls._with_statistics(db.select(cls)).execution_options(populate_existing=True)
+
+    @classmethod
+    def query_api_rows(cls):
+        """
+        Builds a query of rows containing only the columns needed by row_to_api_dict()
+        (id, name, employees_count, salary_sum) and salary_order, which is the first column of
+        statistics_order_by(). Rows are fetched without constructing Department instances,
+        which is intended for listings serialized right away.
+
+        Returns: Query.
+        """
+        order_by = cls.statistics_order_by()
+        return db.session.query(cls.id, cls.name,
+                                db.func.coalesce(DepartmentStatistics.employees_count, 0).label("employees_count"),
+                                DepartmentStatistics.salary_sum.label("salary_sum"),
+                                order_by[0][0].label("salary_order")) \
+                         .outerjoin(DepartmentStatistics, DepartmentStatistics.department_id == cls.id)
+
+    @staticmethod
+    def row_to_api_dict(row) -> dict:
+        """
+        Produces the same dict as to_api_dict() from a row fetched by query_api_rows().
+
+        Returns: dict.
+        """
+        average = (Decimal(row.salary_sum) / row.employees_count).quantize(Decimal('0.01')) \
+            if row.employees_count else None
+        return {'id': row.id, 'name': row.name if row.name else '',
+                'average_monthly_salary': float(average) if average else None,
+                'employees_count': row.employees_count}
+
+    @classmethod
+    def _with_statistics(cls, query):
+        order_by = cls.statistics_order_by()
+        return query.outerjoin(DepartmentStatistics, DepartmentStatistics.department_id == cls.id) \
+                    .options(db.with_expression(cls._employees_count, 
+                                                db.func.coalesce(DepartmentStatistics.employees_count, 0)),
+                             db.with_expression(cls._salary_sum, DepartmentStatistics.salary_sum),
+                             db.with_expression(cls._salary_order, order_by[0][0])) \
+                    .order_by(*[column.desc() if descending else column for column, descending in order_by])
+
+    @classmethod
+    def delete_by_ids(cls, ids: list, reassign_to: int = None, versions: dict = None):
+        """
+        Deletes departments with the given ids using set-based statements without loading
+        departments or their employees into the session. Employees of the deleted departments
+        are deleted as well or, if reassign_to department id is given, moved to that department
+        with a single UPDATE statement.
+        If versions dict (department id to expected version) is given, StaleDataError is raised
+        when any of the departments has another version, i.e. it was modified or deleted meanwhile.
+        Deleted departments and deleted or moved employees are recorded in the change log.
+        Changes are not committed.
+        """
+        from department_app.statistics import merge_statistics
+        from department_app.changelog import record_changes
+        employees = Employee.query.filter(Employee.department_id.in_(ids))
+        employee_ids = [id for id, in employees.with_entities(Employee.id)]
+        if reassign_to is None:
+            employees.delete(synchronize_session=False)
+            record_changes(db.session, "employee", employee_ids, "delete")
+        else:
+            if reassign_to in ids or not db.session.query(cls.query.filter(cls.id == reassign_to).exists()).scalar():
+                raise ValueError("Department to reassign employees to is not valid")
+            employees.update({Employee.department_id: reassign_to, Employee.version: Employee.version + 1},
+                             synchronize_session=False)
+            merge_statistics(db.session.connection(), ids, reassign_to)
+            record_changes(db.session, "employee", employee_ids, "update")
+        DepartmentStatistics.query.filter(DepartmentStatistics.department_id.in_(ids)) \
+                                  .delete(synchronize_session=False)
+        departments = cls.query.filter(cls.id.in_(ids))
+        if versions is not None:
+            departments = departments.filter(db.or_(*[db.and_(cls.id == id, cls.version == versions.get(id))
+                                                      for id in ids]))
+        if departments.delete(synchronize_session=False) != len(ids) and versions is not None:
+            raise StaleDataError("Departments were modified or deleted concurrently")
+        record_changes(db.session, "department", ids, "delete")
+
+    @property
+    def statistics_order_key(self) -> list:
+        """
+        Read-only property allowing to get values of statistics_order_by() columns for this department.
+        Only available for departments loaded by query_with_statistics().
+        
+        Returns: list.
+        """
+        return [self._salary_order, self.id]
+
     @property
     def average_monthly_salary(self) -> Decimal:
         """
@@ -27,10 +180,14 @@ class Department(db.Model):
         
         Returns: Decimal or None (if there are no employees).
         """
-        count = len(self.employees)
+        count = self.employees_count
         if not count:
             return None
-        return Decimal(sum([employee.monthly_salary for employee in self.employees]) / count).quantize(Decimal('0.01'))
+        if self._employees_count is not None:
+            total = Decimal(self._salary_sum)
+        else:
+            total = sum([employee.monthly_salary for employee in self.employees])
+        return Decimal(total / count).quantize(Decimal('0.01'))
 
     @property
     def employees_count(self) -> int:
@@ -39,8 +196,30 @@ class Department(db.Model):
         
         Returns: int.
         """
+        if self._employees_count is not None:
+            return self._employees_count
         return len(self.employees)
 
+    @property
+    def etag(self) -> str:
+        """
+        Read-only property allowing to get entity tag of this department's version,
+        which If-Match preconditions are checked against. It changes when the department is updated.
+        
+        Returns: str.
+        """
+        return str(self.version)
+
+    @property
+    def content_etag(self) -> str:
+        """
+        Read-only property allowing to get weak entity tag of this department's API representation.
+        It starts with the version and also changes when statistics of the department change.
+        
+        Returns: str.
+        """
+        return "{}-{}-{}".format(self.version, self.employees_count, self.average_monthly_salary)
+
     def __repr__(self) -> str:
         """
         Returns string representation of this object for debug purposes.
@@ -101,17 +280,122 @@ class Employee(db.Model):
                    This links employee to its Department and corresponds to Employee.id field.
     full_name: Calculated property, ensuring that Employee instances have full_name (str) attribute,
                containing both first and last names.
+    search_name: This ensures that the corresponding database column containing normalized (lower case)
+                 last and first names is maintained. It is indexed to support name prefix search.
+    version: This ensures that Employee instances have version (int) attribute, which is incremented
+             on every update and checked by UPDATE and DELETE statements of the session, so that
+             concurrent modifications are detected (optimistic concurrency control).
     """
 
+    __table_args__ = (db.Index('ix_employee_name', 'last_name', 'first_name'),
+                      db.Index('ix_employee_department_name', 'department_id', 'last_name', 'first_name'))
+
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(80), nullable=False)
     last_name = db.Column(db.String(80), nullable=False)
-    date_of_birth = db.Column(db.Date, nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False, index=True)
     monthly_salary = db.Column(db.Numeric(10,2), nullable=False)
-    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id', ondelete='CASCADE'), nullable=False)
+    search_name = db.Column(db.String(161), nullable=False, index=True, default=_default_search_name)
+    version = db.Column(db.Integer, nullable=False, server_default="1")
 
     full_name = db.column_property(last_name + " " + first_name)
 
+    __mapper_args__ = {"version_id_col": version}
+
+    @classmethod
+    def name_order_by(cls) -> list:
+        """
+        Describes the ordering of employees listing: by last name, first name and id.
+        
+        Returns: list of (column expression, descending) pairs.
+        """
+        return [(cls.last_name, False), (cls.first_name, False), (cls.id, False)]
+
+    @property
+    def name_order_key(self) -> list:
+        """
+        Read-only property allowing to get values of name_order_by() columns for this employee.
+        
+        Returns: list.
+        """
+        return [self.last_name, self.first_name, self.id]
+
+    @classmethod
+    def query_api_rows(cls):
+        """
+        Builds a query of rows containing only the columns needed by row_to_api_dict().
+        Rows are fetched without constructing Employee instances, and salaries are fetched
+        as floats instead of Decimal, which is intended for listings serialized right away.
+
+        Returns: Query.
+        """
+        return db.session.query(cls.id, cls.first_name, cls.last_name, cls.date_of_birth,
+                                db.type_coerce(cls.monthly_salary, db.Numeric(10, 2, asdecimal=False))
+                                  .label("monthly_salary"),
+                                cls.department_id)
+
+    @staticmethod
+    def row_to_api_dict(row) -> dict:
+        """
+        Produces the same dict as to_api_dict() from a row fetched by query_api_rows().
+        Salaries are rounded to cents, as Decimal salaries of Employee instances are.
+
+        Returns: dict.
+        """
+        return {'id': row.id, 
+                'first_name': row.first_name, 
+                'last_name': row.last_name,
+                'date_of_birth': row.date_of_birth.isoformat() if row.date_of_birth else None, 
+                'monthly_salary': round(float(row.monthly_salary), 2) if row.monthly_salary is not None else None,
+                'department_id': row.department_id}
+
+    @classmethod
+    def search_filters(cls, args: dict) -> list:
+        """
+        Builds filter predicates from search arguments passed as dict:
+        from_date and to_date (YYYY-MM-DD) limit employees by date of birth,
+        or, if exact_date is set, from_date is the exact date of birth;
+        department_id limits employees to a department;
+        min_salary and max_salary limit employees by monthly salary.
+        Every predicate compares a single indexed column with a constant.
+        
+        Returns: list of SQL expressions.
+        """
+        filters = []
+        try:
+            if args.get('from_date') and args.get('exact_date'):
+                filters.append(cls.date_of_birth == date.fromisoformat(args['from_date']))
+            else:
+                if args.get('from_date'):
+                    filters.append(cls.date_of_birth >= date.fromisoformat(args['from_date']))
+                if args.get('to_date'):
+                    filters.append(cls.date_of_birth <= date.fromisoformat(args['to_date']))
+        except ValueError:
+            raise ValueError("Date format is invalid. Should be YYYY-MM-DD")
+        if args.get('department_id'):
+            try:
+                filters.append(cls.department_id == int(args['department_id']))
+            except ValueError:
+                raise ValueError("Department is not valid")
+        try:
+            if args.get('min_salary'):
+                filters.append(cls.monthly_salary >= Decimal(args['min_salary']))
+            if args.get('max_salary'):
+                filters.append(cls.monthly_salary <= Decimal(args['max_salary']))
+        except InvalidOperation:
+            raise ValueError("Salary must be a decimal number")
+        return filters
+
+    @property
+    def etag(self) -> str:
+        """
+        Read-only property allowing to get entity tag of this employee's API representation.
+        
+        Returns: str.
+        """
+        return str(self.version)
+
     def __repr__(self) -> str:
         """
         Returns string representation of this object for debug purposes.
@@ -181,4 +465,219 @@ class Employee(db.Model):
         self.last_name = d.get('last_name', self.last_name)
         self.date_of_birth = date_of_birth
         self.monthly_salary = salary
-        self.department_id = id
\ No newline at end of file
+        self.department_id = id
+
+
+SALARY_BUCKET_BOUNDS = (500, 1000, 1500, 2000, 3000, 4000, 5000, 7500, 10000, 15000, 20000, 50000)
+
+
+class DepartmentStatistics(db.Model):
+    """
+    This class implements materialized salary statistics of a department, which are kept
+    up to date incrementally whenever employees are created, modified or deleted.
+
+    Attributes:
+    department_id: This ensures that DepartmentStatistics instances have department_id (int) attribute and 
+                   that the corresponding database column is maintained. It is the primary key.
+    employees_count: This ensures that DepartmentStatistics instances have employees_count (int) attribute and 
+                     that the corresponding database column is maintained.
+    salary_sum: This ensures that DepartmentStatistics instances have salary_sum (Decimal) attribute and 
+                that the corresponding database column is maintained.
+    salary_min: This ensures that DepartmentStatistics instances have salary_min (Decimal) attribute and 
+                that the corresponding database column is maintained.
+    salary_max: This ensures that DepartmentStatistics instances have salary_max (Decimal) attribute and 
+                that the corresponding database column is maintained.
+    salary_histogram: This ensures that DepartmentStatistics instances have salary_histogram (str) attribute and 
+                      that the corresponding database column is maintained. It contains JSON list of
+                      employee counts in salary buckets separated by SALARY_BUCKET_BOUNDS.
+    """
+
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id', ondelete='CASCADE'), 
+                              primary_key=True, autoincrement=False)
+    employees_count = db.Column(db.Integer, nullable=False, default=0)
+    salary_sum = db.Column(db.Numeric(16,2), nullable=False, default=0)
+    salary_min = db.Column(db.Numeric(10,2))
+    salary_max = db.Column(db.Numeric(10,2))
+    salary_histogram = db.Column(db.Text, nullable=False, default='[]')
+
+    department = db.relationship("Department")
+
+    @staticmethod
+    def bucket(salary: Decimal) -> int:
+        """
+        Returns index of the histogram bucket containing the salary.
+        
+        Returns: int.
+        """
+        return bisect_right(SALARY_BUCKET_BOUNDS, salary)
+
+    @property
+    def histogram(self) -> list:
+        """
+        Read-only property allowing to get employee counts in salary buckets.
+        
+        Returns: list of int.
+        """
+        counts = json.loads(self.salary_histogram) if self.salary_histogram else []
+        return counts + [0] * (len(SALARY_BUCKET_BOUNDS) + 1 - len(counts))
+
+    @property
+    def average_monthly_salary(self) -> Decimal:
+        """
+        Read-only property allowing to get average monthly salary among department employees.
+        
+        Returns: Decimal or None (if there are no employees).
+        """
+        if not self.employees_count:
+            return None
+        return (Decimal(self.salary_sum) / self.employees_count).quantize(Decimal('0.01'))
+
+    def add_salaries(self, salaries: list):
+        """
+        Updates statistics with salaries of employees added to the department.
+        """
+        histogram = self.histogram
+        for salary in salaries:
+            histogram[self.bucket(salary)] += 1
+        self.salary_histogram = json.dumps(histogram)
+        self.employees_count = (self.employees_count or 0) + len(salaries)
+        self.salary_sum = Decimal(self.salary_sum or 0) + sum(salaries, Decimal(0))
+        self.salary_min = min([salary for salary in [self.salary_min] + salaries if salary is not None], 
+                              default=None)
+        self.salary_max = max([salary for salary in [self.salary_max] + salaries if salary is not None], 
+                              default=None)
+
+    def remove_salaries(self, salaries: list) -> bool:
+        """
+        Updates statistics with salaries of employees removed from the department.
+        
+        Returns: bool, True if salary_min or salary_max must be recomputed.
+        """
+        histogram = self.histogram
+        for salary in salaries:
+            histogram[self.bucket(salary)] -= 1
+        self.salary_histogram = json.dumps(histogram)
+        self.employees_count = (self.employees_count or 0) - len(salaries)
+        self.salary_sum = Decimal(self.salary_sum or 0) - sum(salaries, Decimal(0))
+        if not self.employees_count:
+            self.salary_min = self.salary_max = None
+            return False
+        return any(salary <= self.salary_min or salary >= self.salary_max for salary in salaries)
+
+    def merge(self, other: 'DepartmentStatistics'):
+        """
+        Updates statistics with all employees of the other department statistics.
+        """
+        self.salary_histogram = json.dumps([count + other_count for count, other_count
+                                            in zip(self.histogram, other.histogram)])
+        self.employees_count = (self.employees_count or 0) + (other.employees_count or 0)
+        self.salary_sum = Decimal(self.salary_sum or 0) + Decimal(other.salary_sum or 0)
+        self.salary_min = min([salary for salary in [self.salary_min, other.salary_min] if salary is not None], 
+                              default=None)
+        self.salary_max = max([salary for salary in [self.salary_max, other.salary_max] if salary is not None], 
+                              default=None)
+
+    def percentile(self, fraction: float) -> Decimal:
+        """
+        Estimates salary percentile (fraction between 0 and 1) from the histogram,
+        interpolating linearly within the bucket and limiting the result by salary_min and salary_max.
+        
+        Returns: Decimal or None (if there are no employees).
+        """
+        if not self.employees_count:
+            return None
+        rank = Decimal(str(fraction)) * self.employees_count
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            if count and cumulative + count >= rank:
+                lower = Decimal(SALARY_BUCKET_BOUNDS[index - 1]) if index else Decimal(0)
+                upper = Decimal(SALARY_BUCKET_BOUNDS[index]) if index < len(SALARY_BUCKET_BOUNDS) \
+                        else Decimal(self.salary_max)
+                lower = max(lower, Decimal(self.salary_min))
+                upper = min(upper, Decimal(self.salary_max))
+                value = lower + (upper - lower) * (rank - cumulative) / count
+                return value.quantize(Decimal('0.01'))
+            cumulative += count
+        return Decimal(self.salary_max).quantize(Decimal('0.01'))
+
+    def to_api_dict(self) -> dict:
+        """
+        Produces a dict containing these statistics' attribute values and salary percentiles.
+        Intended to be converted to JSON and used in the body of API responses.
+        
+        Returns: dict.
+        """
+        def number(value):
+            return float(value) if value is not None else None
+        bounds = [0] + list(SALARY_BUCKET_BOUNDS) + [None]
+        return {'department_id': self.department_id,
+                'employees_count': self.employees_count or 0,
+                'salary_sum': number(self.salary_sum or 0),
+                'salary_min': number(self.salary_min),
+                'salary_max': number(self.salary_max),
+                'average_monthly_salary': number(self.average_monthly_salary),
+                'percentiles': {'p25': number(self.percentile(0.25)), 'p50': number(self.percentile(0.5)),
+                                'p75': number(self.percentile(0.75)), 'p90': number(self.percentile(0.9))},
+                'histogram': [{'from': bounds[index], 'to': bounds[index + 1], 'count': count}
+                              for index, count in enumerate(self.histogram)]}
+
+
+class Change(db.Model):
+    """
+    This class implements an entry of the append-only change log (change_log table) of departments
+    and employees, which is maintained by department_app.changelog.
+
+    Attributes:
+    seq: This ensures that Change instances have seq (int) attribute and that the corresponding
+         database column is maintained. It is the primary key, which increases in commit order.
+    entity: This ensures that Change instances have entity (str) attribute ("department" or "employee")
+            and that the corresponding database column is maintained.
+    record_id: This ensures that Change instances have record_id (int) attribute and that
+               the corresponding database column containing the id of the changed record is maintained.
+    action: This ensures that Change instances have action (str) attribute ("create", "update" or "delete")
+            and that the corresponding database column is maintained.
+    changed_at: This ensures that Change instances have changed_at (datetime, UTC) attribute and that
+                the corresponding database column is maintained.
+    """
+
+    __tablename__ = 'change_log'
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(6), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def to_api_dict(self) -> dict:
+        """
+        Produces a dict containing this Change's attribute values.
+        Intended to be converted to JSON and used in the body of API responses.
+        
+        Returns: dict.
+        """
+        return {'seq': self.seq, 'entity': self.entity, 'id': self.record_id, 'action': self.action,
+                'changed_at': self.changed_at.isoformat() + 'Z'}
+
+
+class ChangeLogLock(db.Model):
+    """
+    This class implements the single row locked by transactions writing the change log,
+    so that change log entries of concurrent transactions get sequence numbers in commit order.
+
+    Attributes:
+    id: This ensures that the corresponding primary key column is maintained. The row has id 1.
+    commits: This ensures that ChangeLogLock instances have commits (int) attribute and that
+             the corresponding database column counting transactions which wrote the change log is maintained.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    commits = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+db.event.listen(ChangeLogLock.__table__, 'after_create',
+                db.DDL("INSERT INTO change_log_lock (id, commits) VALUES (1, 0)"))
+
+
+@db.event.listens_for(Employee, 'before_update')
+def _update_search_name(mapper, connection, employee):
+    employee.search_name = normalize_name(employee.last_name, employee.first_name)
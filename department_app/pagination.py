@@ -0,0 +1,246 @@
+"""
+This module implements keyset (cursor based) pagination for listing pages and API endpoints.
+
+Pages are fetched with the listing ordering applied by the database and a predicate
+comparing the ordering columns with the values of the last (or first) row of the previous page,
+so fetching any page costs O(page size) regardless of its depth.
+Results ordered by relevance, which can not be paginated this way, are paginated by offset.
+
+Building the page statement and building the page from fetched rows are separate steps
+(e.g. keyset_page_statement and keyset_page), so pages may also be fetched with asynchronous sessions.
+"""
+
+import base64
+import json
+from decimal import Decimal
+from flask import request
+from werkzeug.urls import url_encode
+from department_app import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+class Page:
+    """
+    This class represents a single page of listing results.
+
+    Attributes:
+    items: list of rows of this page in listing order.
+    next_cursor: cursor (str) pointing to the following page or None if this is the last page.
+    prev_cursor: cursor (str) pointing to the preceding page or None if this is the first page.
+    """
+
+    def __init__(self, items: list, next_cursor: str = None, prev_cursor: str = None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def links(self, path: str = None, query_string: str = None, args: dict = None) -> dict:
+        """
+        Produces a dict with self, next and prev links of this page for the current request
+        or, if path, raw query string and parsed query arguments are given, for that request.
+        Intended to be used as "links" member of API listing responses.
+
+        Returns: dict.
+        """
+        if path is None:
+            path, query_string, args = request.path, request.query_string.decode(), request.args.to_dict()
+        links = {"self": "{}?{}".format(path, query_string).rstrip("?")}
+        if self.next_cursor:
+            links["next"] = path_with_args(path, args, cursor=self.next_cursor)
+        if self.prev_cursor:
+            links["prev"] = path_with_args(path, args, cursor=self.prev_cursor)
+        return links
+
+
+def path_with_args(path: str, args: dict, **kwargs) -> str:
+    """
+    Builds the path with query arguments args updated by the given keyword arguments.
+    Arguments with None value are removed.
+
+    Returns: str.
+    """
+    args = dict(args)
+    args.update(kwargs)
+    query = url_encode({key: value for key, value in args.items() if value is not None}, sort=True)
+    return "{}?{}".format(path, query) if query else path
+
+
+def url_with_args(**kwargs) -> str:
+    """
+    Builds the current request path with its query arguments updated by the given keyword arguments.
+    Arguments with None value are removed.
+
+    Returns: str.
+    """
+    return path_with_args(request.path, request.args.to_dict(), **kwargs)
+
+
+def parse_limit(args: dict, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """
+    Gets page size from "limit" request argument.
+
+    Returns: int.
+    """
+    try:
+        limit = int(args.get("limit", default))
+    except ValueError:
+        raise ValueError("Limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError("Limit must be between 1 and {}".format(MAX_PAGE_SIZE))
+    return limit
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {"decimal": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return Decimal(value["decimal"])
+    return value
+
+
+def encode_cursor(values: list, direction: str) -> str:
+    """
+    Produces an opaque cursor from key values of a row and paging direction ("next" or "prev").
+
+    Returns: str.
+    """
+    data = json.dumps({"k": [_encode_value(value) for value in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Restores key values and paging direction from a cursor produced by encode_cursor().
+
+    Returns: tuple (list, str).
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = [_decode_value(value) for value in data["k"]]
+        direction = data["d"]
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        raise ValueError("Cursor is not valid")
+    if direction not in ("next", "prev"):
+        raise ValueError("Cursor is not valid")
+    return values, direction
+
+
+def keyset_predicate(order_by: list, values: list, backwards: bool = False):
+    """
+    Builds a predicate selecting rows following (or preceding if backwards is True)
+    the row with the given key values in the ordering described by order_by
+    list of (column expression, descending) pairs.
+    The predicate is expanded to (a > x) OR (a = x AND b > y) ... form, which is supported
+    by every database and allows using an index on the ordering columns.
+
+    Returns: SQL expression.
+    """
+    if len(values) != len(order_by):
+        raise ValueError("Cursor is not valid")
+    alternatives = []
+    for position, ((column, descending), value) in enumerate(zip(order_by, values)):
+        equal = [prefix_column == prefix_value
+                 for (prefix_column, _), prefix_value in zip(order_by[:position], values[:position])]
+        after = column < value if descending != backwards else column > value
+        alternatives.append(db.and_(*equal, after))
+    return db.or_(*alternatives)
+
+
+def keyset_page_statement(query, order_by: list, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> tuple:
+    """
+    Restricts query (Query or Select) to a single page of results.
+    Arguments are described in paginate().
+
+    Returns: tuple (query, cursor key values or None, True if paging backwards).
+    """
+    values, direction = decode_cursor(cursor) if cursor else (None, "next")
+    backwards = direction == "prev"
+    if values is not None:
+        query = query.filter(keyset_predicate(order_by, values, backwards))
+    ordering = [column.desc() if descending != backwards else column.asc() for column, descending in order_by]
+    return query.order_by(None).order_by(*ordering).limit(limit + 1), values, backwards
+
+
+def keyset_page(items: list, key, limit: int, values: list, backwards: bool) -> Page:
+    """
+    Builds a page from rows fetched with the statement produced by keyset_page_statement().
+
+    Returns: Page.
+    """
+    items = list(items)
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
+    if items:
+        first, last = key(items[0]), key(items[-1])
+    else:
+        first = last = values
+    next_cursor = prev_cursor = None
+    if (has_more and not backwards) or (backwards and values is not None and last is not None):
+        next_cursor = encode_cursor(last, "next")
+    if (has_more and backwards) or (not backwards and values is not None and first is not None):
+        prev_cursor = encode_cursor(first, "prev")
+    return Page(items, next_cursor, prev_cursor)
+
+
+def paginate(query, order_by: list, key, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> Page:
+    """
+    Fetches a single page of query results.
+
+    Arguments:
+    query: query to be paginated. Its ordering is replaced by order_by.
+    order_by: list of (column expression, descending) pairs uniquely ordering the rows.
+    key: function returning the list of order_by column values for a row.
+    limit: page size.
+    cursor: cursor of the page to be fetched or None for the first page.
+
+    Returns: Page.
+    """
+    query, values, backwards = keyset_page_statement(query, order_by, limit, cursor)
+    return keyset_page(query.all(), key, limit, values, backwards)
+
+
+def offset_page_statement(query, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> tuple:
+    """
+    Restricts query (Query or Select) to a single page of results keeping the query ordering.
+
+    Returns: tuple (query, offset).
+    """
+    offset = 0
+    if cursor:
+        values, _ = decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise ValueError("Cursor is not valid")
+        offset = values[0]
+    return query.offset(offset).limit(limit + 1), offset
+
+
+def offset_page(items: list, limit: int, offset: int) -> Page:
+    """
+    Builds a page from rows fetched with the statement produced by offset_page_statement().
+
+    Returns: Page.
+    """
+    items = list(items)
+    next_cursor = encode_cursor([offset + limit], "next") if len(items) > limit else None
+    prev_cursor = encode_cursor([max(offset - limit, 0)], "prev") if offset > 0 else None
+    return Page(items[:limit], next_cursor, prev_cursor)
+
+
+def paginate_offset(query, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> Page:
+    """
+    Fetches a single page of query results keeping the query ordering.
+    Pages are selected by offset, so this is intended for orderings which can not be
+    expressed as a keyset predicate, e.g. search results ordered by relevance.
+
+    Returns: Page.
+    """
+    query, offset = offset_page_statement(query, limit, cursor)
+    return offset_page(query.all(), limit, offset)
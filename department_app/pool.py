@@ -0,0 +1,104 @@
+"""
+This module collects database connection pool metrics of a worker process.
+
+Metrics are gathered with SQLAlchemy pool events (connect, checkout, checkin, invalidate)
+and, together with the pool's own status, are intended to be used to size the number of
+workers and pool settings against the database max_connections limit.
+"""
+
+import threading
+from department_app import db
+
+
+class PoolMetrics:
+    """
+    This class counts connection pool events of an engine.
+
+    Attributes:
+    connections_opened: number of database connections opened by the pool (int).
+    connections_invalidated: number of connections invalidated, e.g. after failed pings (int).
+    checkouts: number of connection checkouts (int).
+    checked_out: number of connections currently checked out (int).
+    max_checked_out: highest number of simultaneously checked out connections (int).
+    """
+
+    def __init__(self, engine=None):
+        self.connections_opened = 0
+        self.connections_invalidated = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self._engine = None
+        self._lock = threading.Lock()
+        if engine is not None:
+            self.install(engine)
+
+    def install(self, engine):
+        """
+        Starts collecting metrics of the engine's connection pool.
+        """
+        self._engine = engine
+        db.event.listen(engine.pool, "connect", self._on_connect)
+        db.event.listen(engine.pool, "checkout", self._on_checkout)
+        db.event.listen(engine.pool, "checkin", self._on_checkin)
+        db.event.listen(engine.pool, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.connections_invalidated += 1
+
+    def prometheus_values(self) -> list:
+        """
+        Produces pool metrics as (name, help text, type, value) tuples for the Prometheus exposition.
+        Values unknown for the pool class are omitted.
+
+        Returns: list of tuple.
+        """
+        metrics = self.to_dict()
+        descriptions = [("pool_size", "Number of connections kept open by the pool.", "gauge"),
+                        ("max_connections", "Maximum number of connections of the pool.", "gauge"),
+                        ("checked_in", "Number of idle connections in the pool.", "gauge"),
+                        ("checked_out", "Number of connections currently in use.", "gauge"),
+                        ("max_checked_out", "Highest number of connections simultaneously in use.", "gauge"),
+                        ("checkouts", "Number of connection checkouts.", "counter"),
+                        ("connections_opened", "Number of database connections opened.", "counter"),
+                        ("connections_invalidated", "Number of invalidated connections.", "counter")]
+        return [("department_app_db_pool_" + name + ("_total" if kind == "counter" else ""),
+                 documentation, kind, metrics[name])
+                for name, documentation, kind in descriptions if metrics[name] is not None]
+
+    def to_dict(self) -> dict:
+        """
+        Produces a dict containing collected metrics and the current pool status.
+        Pool size and overflow are None for pools without a fixed size (e.g. in-memory SQLite).
+
+        Returns: dict.
+        """
+        pool = self._engine.pool if self._engine is not None else None
+        size = pool.size() if hasattr(pool, "size") else None
+        overflow = pool._max_overflow if hasattr(pool, "_max_overflow") else None
+        with self._lock:
+            return {"pool": type(pool).__name__ if pool is not None else None,
+                    "pool_size": size,
+                    "max_overflow": overflow,
+                    "max_connections": size + overflow if size is not None and overflow is not None else None,
+                    "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                    "checked_out": self.checked_out,
+                    "max_checked_out": self.max_checked_out,
+                    "checkouts": self.checkouts,
+                    "connections_opened": self.connections_opened,
+                    "connections_invalidated": self.connections_invalidated}
@@ -0,0 +1,125 @@
+"""
+This module implements optional routing of read-only requests to read replica databases.
+
+Views decorated with ReplicaRouter.read_only run their queries on one of the replica engines
+configured with SQLALCHEMY_REPLICA_URIS, selected round robin per request. All other views,
+and any flush performed during a read-only request, use the primary database.
+
+To let clients read their own writes despite replication lag, a client that sent a write request
+(any method other than GET, HEAD and OPTIONS) is pinned to the primary database for
+REPLICA_STICKY_SECONDS seconds with a timestamp kept in its session cookie.
+Other clients may see data lagging behind the primary. The response cache keeps responses
+computed on replicas apart from responses computed on the primary, and only for REPLICA_STICKY_SECONDS,
+so pinned clients never get a lagging response from the cache (see department_app.cache).
+"""
+
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm
+from department_app.config import engine_options
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingSession(SignallingSession):
+    """
+    This class implements session using replica engine selected for the current request, if any.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        engine = g.get("replica_engine") if has_request_context() else None
+        if engine is not None and not self._flushing:
+            return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    This class implements flask-sqlalchemy extension with sessions supporting read replicas.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReplicaRouter:
+    """
+    This class implements flask extension routing read-only views to read replica databases.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Initializes the extension for the flask application.
+        """
+        app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+        app.config.setdefault("REPLICA_STICKY_SECONDS", 10)
+        app.extensions["replica_router"] = {"engines": None, "counter": itertools.count()}
+        app.after_request(self._pin_writing_client)
+        app.teardown_request(self._forget_replica)
+
+    def engines(self, app=None) -> list:
+        """
+        Returns replica engines of the application (current application by default),
+        creating them on first use with the same engine options as the primary engine.
+
+        Returns: list of Engine.
+        """
+        app = app or current_app
+        state = app.extensions["replica_router"]
+        if state["engines"] is None:
+            with self._lock:
+                if state["engines"] is None:
+                    state["engines"] = [create_engine(uri, **engine_options(dict(app.config,
+                                                                                 SQLALCHEMY_DATABASE_URI=uri)))
+                                        for uri in app.config["SQLALCHEMY_REPLICA_URIS"]]
+        return state["engines"]
+
+    def primary_required(self) -> bool:
+        """
+        Checks whether read-only views of the current request must use the primary database:
+        there are no replicas, the request is a write request or the client is pinned to the primary.
+
+        Returns: bool.
+        """
+        return not self.engines() or request.method not in READ_METHODS or \
+            session.get("primary_until", 0) > time.time()
+
+    def select_engine(self):
+        """
+        Returns replica engine for the current request or None if the primary database must be used.
+
+        Returns: Engine or None.
+        """
+        if self.primary_required():
+            return None
+        engines = self.engines()
+        return engines[next(current_app.extensions["replica_router"]["counter"]) % len(engines)]
+
+    def read_only(self, view):
+        """
+        Decorator routing queries of a read-only view to a read replica.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.replica_engine = self.select_engine()
+            return view(*args, **kwargs)
+        return wrapper
+
+    @staticmethod
+    def _pin_writing_client(response):
+        if request.method not in READ_METHODS and current_app.config["SQLALCHEMY_REPLICA_URIS"]:
+            session["primary_until"] = time.time() + current_app.config["REPLICA_STICKY_SECONDS"]
+        return response
+
+    @staticmethod
+    def _forget_replica(exception=None):
+        g.pop("replica_engine", None)
@@ -0,0 +1,176 @@
+"""
+This module implements employee name search.
+
+Depending on the database, names are matched with:
+- SQLite FTS5 full-text index (employee_fts table kept in sync by triggers), ranked by bm25;
+- MySQL FULLTEXT index on first and last names, ranked by relevance;
+- prefix range scan over the indexed employee.search_name column (normalized "last first" name)
+  on other databases, or if the full-text index (employee_fts table or ix_employee_fulltext index)
+  does not exist. In this case the search query must be a prefix of "last first" name.
+
+Whether the full-text index exists is detected once per engine, so workers must be restarted
+to use a full-text index added by a migration (see department_app.migrations).
+"""
+
+import re
+import weakref
+from department_app import db
+from department_app.models.entities import Employee, normalize_name
+from department_app.pagination import Page, keyset_page_statement, keyset_page, offset_page_statement, \
+                                      offset_page, parse_limit
+
+MYSQL_MIN_TOKEN_SIZE = 3
+
+_fulltext_indexes = weakref.WeakKeyDictionary()
+
+
+FTS5_DDL = ("CREATE VIRTUAL TABLE employee_fts USING fts5(first_name, last_name, "
+            "content='employee', content_rowid='id')",
+            "CREATE TRIGGER employee_fts_insert AFTER INSERT ON employee BEGIN "
+            "INSERT INTO employee_fts(rowid, first_name, last_name) "
+            "VALUES (new.id, new.first_name, new.last_name); END",
+            "CREATE TRIGGER employee_fts_delete AFTER DELETE ON employee BEGIN "
+            "INSERT INTO employee_fts(employee_fts, rowid, first_name, last_name) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name); END",
+            "CREATE TRIGGER employee_fts_update AFTER UPDATE OF first_name, last_name ON employee BEGIN "
+            "INSERT INTO employee_fts(employee_fts, rowid, first_name, last_name) "
+            "VALUES ('delete', old.id, old.first_name, old.last_name); "
+            "INSERT INTO employee_fts(rowid, first_name, last_name) "
+            "VALUES (new.id, new.first_name, new.last_name); END")
+
+
+def fts5_supported(connection) -> bool:
+    """
+    Checks whether SQLite library of the connection is compiled with FTS5 extension.
+
+    Returns: bool.
+    """
+    return bool(connection.execute(db.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def _fts5_supported(ddl, target, bind, **kw) -> bool:
+    return fts5_supported(bind)
+
+
+for _statement in FTS5_DDL:
+    db.event.listen(Employee.__table__, "after_create",
+                    db.DDL(_statement).execute_if(dialect="sqlite", callable_=_fts5_supported))
+db.event.listen(Employee.__table__, "before_drop",
+                db.DDL("DROP TABLE IF EXISTS employee_fts").execute_if(dialect="sqlite"))
+db.event.listen(Employee.__table__, "after_create",
+                db.DDL("ALTER TABLE employee ADD FULLTEXT INDEX ix_employee_fulltext (first_name, last_name)")
+                  .execute_if(dialect="mysql"))
+
+
+def search_tokens(q: str) -> list:
+    """
+    Splits search query to lower case words consisting of letters and digits.
+
+    Returns: list of str.
+    """
+    return re.findall(r"\w+", q.lower())
+
+
+def fulltext_index_exists(connection) -> bool:
+    """
+    Checks whether the full-text index of employee names exists: employee_fts table on SQLite
+    or ix_employee_fulltext index on MySQL.
+
+    Returns: bool.
+    """
+    inspector = db.inspect(connection)
+    if connection.dialect.name == "sqlite":
+        return inspector.has_table("employee_fts")
+    if connection.dialect.name == "mysql":
+        return any(index["name"] == "ix_employee_fulltext" for index in inspector.get_indexes("employee"))
+    return False
+
+
+def _has_fulltext_index(engine) -> bool:
+    if engine not in _fulltext_indexes:
+        with engine.connect() as connection:
+            _fulltext_indexes[engine] = fulltext_index_exists(connection)
+    return _fulltext_indexes[engine]
+
+
+def _prefix_range(prefix: str):
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(Employee.search_name >= prefix, Employee.search_name < upper)
+
+
+def _fts5_search(query, tokens: list):
+    match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+    fts = db.table("employee_fts", db.column("rowid"), db.column("rank"))
+    matches = db.select(fts.c.rowid.label("id"), fts.c.rank.label("rank")) \
+                .where(db.literal_column("employee_fts").op("MATCH")(match)).subquery()
+    return query.join(matches, matches.c.id == Employee.id).order_by(matches.c.rank, Employee.id)
+
+
+def _mysql_fulltext_search(query, tokens: list):
+    against = " ".join("+{}*".format(token) for token in tokens)
+    relevance = db.text("MATCH (employee.first_name, employee.last_name) AGAINST (:against IN BOOLEAN MODE)") \
+                  .bindparams(against=against)
+    return query.filter(relevance).order_by(db.desc(relevance), Employee.id)
+
+
+def _prefix_search(query, tokens: list):
+    return query.filter(_prefix_range(" ".join(tokens))).order_by(Employee.search_name, Employee.id)
+
+
+def name_search(query, q: str, dialect: str = None, has_fulltext_index: bool = None):
+    """
+    Restricts employees query (Query or Select) to employees whose names match search query q
+    and orders them by relevance.
+    Database dialect name and availability of the full-text index are detected
+    with the application engine unless they are given.
+
+    Returns: Query or Select.
+    """
+    tokens = search_tokens(q)
+    if not tokens:
+        raise ValueError("Search query must contain letters or digits")
+    if dialect is None:
+        engine = db.get_engine()
+        dialect = engine.dialect.name
+        has_fulltext_index = _has_fulltext_index(engine)
+    if dialect == "sqlite" and has_fulltext_index:
+        return _fts5_search(query, tokens)
+    if dialect == "mysql" and has_fulltext_index and min(len(token) for token in tokens) >= MYSQL_MIN_TOKEN_SIZE:
+        return _mysql_fulltext_search(query, tokens)
+    return _prefix_search(query, [normalize_name(token) for token in tokens])
+
+
+def _name_order_key(employee) -> list:
+    # Works both for Employee instances and for rows of Employee.query_api_rows().
+    return [employee.last_name, employee.first_name, employee.id]
+
+
+def search_statement(args: dict, query=None, dialect: str = None, has_fulltext_index: bool = None) -> tuple:
+    """
+    Builds a statement fetching a page of employees matching search arguments passed as dict:
+    filters described in Employee.search_filters, name search query q,
+    page size limit and page cursor.
+    Employees are ordered by relevance if q is given or by name otherwise.
+    Base query (Query or Select, e.g. with loader options or of Employee.query_api_rows() rows)
+    may be passed as query argument.
+
+    Returns: tuple (query, function building Page from the fetched rows).
+    """
+    query = (Employee.query if query is None else query).filter(*Employee.search_filters(args))
+    limit = parse_limit(args)
+    if args.get("q"):
+        query, offset = offset_page_statement(name_search(query, args["q"], dialect, has_fulltext_index),
+                                              limit, args.get("cursor"))
+        return query, lambda items: offset_page(items, limit, offset)
+    query, values, backwards = keyset_page_statement(query, Employee.name_order_by(), limit, args.get("cursor"))
+    return query, lambda items: keyset_page(items, _name_order_key, limit, values, backwards)
+
+
+def search_employees(args: dict, query=None) -> Page:
+    """
+    Fetches a page of employees matching search arguments described in search_statement().
+
+    Returns: Page.
+    """
+    query, make_page = search_statement(args, query)
+    return make_page(query.all())
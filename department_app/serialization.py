@@ -0,0 +1,64 @@
+"""
+This module implements fast JSON serialization of API responses.
+
+Responses are encoded with orjson if it is installed (pip install department-app[fast-json])
+and with the standard json module otherwise. Either way the body is byte-identical
+to the body produced by flask.jsonify with the application settings: compact separators,
+keys sorted if JSON_SORT_KEYS is set and non-ASCII characters escaped if JSON_AS_ASCII is set.
+Bodies orjson does not encode the same way (e.g. non-ASCII text when escaping is required)
+are encoded with the json module, and pretty printed responses (JSONIFY_PRETTYPRINT_REGULAR
+or debug mode) are created by flask.jsonify.
+"""
+
+import json
+import re
+from flask import current_app, jsonify
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# orjson writes floats below 1e-4 or from 1e16 in magnitude differently from the json module
+# (e.g. 0.00001 instead of 1e-05 and 1e16 instead of 1e+16). Bodies possibly containing them
+# (or strings looking like them) are encoded again with the json module.
+_DIFFERENT_FLOAT = re.compile(rb"[0-9]e|0\.0000")
+
+
+def _is_ascii_without_delete(body: bytes) -> bool:
+    # The json module escapes DEL (0x7f) when escaping non-ASCII characters, orjson does not.
+    return body.isascii() and b"\x7f" not in body
+
+
+def dumps(data, sort_keys: bool = True, ensure_ascii: bool = True) -> bytes:
+    """
+    Serializes data consisting of dicts, lists, strings, numbers, booleans and None to compact JSON,
+    byte-identical to json.dumps with the same options and compact separators.
+
+    Returns: bytes.
+    """
+    if orjson is not None:
+        try:
+            body = orjson.dumps(data, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            body = None
+        if body is not None and (not ensure_ascii or _is_ascii_without_delete(body)) \
+                and not _DIFFERENT_FLOAT.search(body):
+            return body
+    return json.dumps(data, sort_keys=sort_keys, ensure_ascii=ensure_ascii, separators=(",", ":")).encode()
+
+
+def json_response(data, status: int = 200):
+    """
+    Creates JSON response of the current application, as flask.jsonify does.
+
+    Returns: Response.
+    """
+    config = current_app.config
+    if config["JSONIFY_PRETTYPRINT_REGULAR"] or current_app.debug:
+        response = jsonify(data)
+        response.status_code = status
+        return response
+    body = dumps(data, config["JSON_SORT_KEYS"], config["JSON_AS_ASCII"]) + b"\n"
+    return current_app.response_class(body, status=status, mimetype=config["JSONIFY_MIMETYPE"])
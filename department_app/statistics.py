@@ -0,0 +1,184 @@
+"""
+This module maintains materialized department statistics (DepartmentStatistics).
+
+Statistics rows are updated incrementally in the same transaction as the employee changes:
+salaries of employees created, modified, moved between departments or deleted through
+the session are collected by session flush events and applied to the statistics
+of the affected departments only. Minimum and maximum salaries are recomputed
+for a department only when an employee with the extreme salary is removed from it.
+Set-based statements bypassing the session (department deletion, bulk operations, CSV import) update
+statistics explicitly with update_statistics and merge_statistics functions.
+"""
+
+import json
+from collections import defaultdict
+from decimal import Decimal
+from department_app import db
+from department_app.models.entities import Department, Employee, DepartmentStatistics, SALARY_BUCKET_BOUNDS
+
+
+def _salary(value) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal('0.01')) if value is not None else None
+
+
+def _original_value(record, attribute: str):
+    history = db.inspect(record).attrs[attribute].load_history()
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _statistics_values(statistics: DepartmentStatistics) -> dict:
+    return {column.key: getattr(statistics, column.key) for column in DepartmentStatistics.__table__.columns}
+
+
+def _load_statistics(connection, department_id: int) -> tuple:
+    table = DepartmentStatistics.__table__
+    row = connection.execute(db.select(table).where(table.c.department_id == department_id)
+                               .with_for_update()).mappings().first()
+    if row is None:
+        return DepartmentStatistics(department_id=department_id), False
+    return DepartmentStatistics(**row), True
+
+
+def _save_statistics(connection, statistics: DepartmentStatistics, exists: bool):
+    table = DepartmentStatistics.__table__
+    if exists:
+        connection.execute(table.update().where(table.c.department_id == statistics.department_id)
+                                .values(_statistics_values(statistics)))
+    else:
+        connection.execute(table.insert().values(_statistics_values(statistics)))
+
+
+def update_statistics(connection, changes: dict):
+    """
+    Applies salary changes to statistics of the affected departments.
+    Changes are passed as dict mapping department id to a tuple of lists of
+    added and removed salaries. Statistics rows are locked in department id order,
+    so that concurrent transactions (e.g. moving employees in opposite directions) do not deadlock.
+    """
+    for department_id in sorted(department_id for department_id in changes if department_id is not None):
+        added, removed = changes[department_id]
+        if not (added or removed):
+            continue
+        statistics, exists = _load_statistics(connection, department_id)
+        statistics.add_salaries(added)
+        if statistics.remove_salaries(removed):
+            statistics.salary_min, statistics.salary_max = connection.execute(
+                db.select(db.func.min(Employee.monthly_salary), db.func.max(Employee.monthly_salary))
+                  .where(Employee.department_id == department_id)).first()
+        _save_statistics(connection, statistics, exists)
+
+
+def merge_statistics(connection, source_ids: list, target_id: int):
+    """
+    Adds statistics of source departments to statistics of the target department.
+    Intended to be used when all employees of source departments are moved to the target department.
+    Statistics rows of all the departments are locked in department id order.
+    """
+    table = DepartmentStatistics.__table__
+    rows = connection.execute(db.select(table).where(table.c.department_id.in_(list(source_ids) + [target_id]))
+                                .order_by(table.c.department_id).with_for_update()).mappings()
+    sources = {row["department_id"]: DepartmentStatistics(**row) for row in rows}
+    statistics = sources.pop(target_id, None)
+    exists = statistics is not None
+    if not exists:
+        statistics = DepartmentStatistics(department_id=target_id)
+    for source in sources.values():
+        statistics.merge(source)
+    _save_statistics(connection, statistics, exists)
+
+
+def compute_statistics(connection) -> dict:
+    """
+    Computes statistics of all departments from scratch with aggregate queries.
+
+    Returns: dict mapping department id to DepartmentStatistics.
+    """
+    computed = {department_id: DepartmentStatistics(department_id=department_id, employees_count=0,
+                                                    salary_sum=Decimal(0), salary_histogram='[]')
+                for department_id, in connection.execute(db.select(Department.id))}
+    aggregates = db.select(Employee.department_id, db.func.count(Employee.id), db.func.sum(Employee.monthly_salary),
+                           db.func.min(Employee.monthly_salary), db.func.max(Employee.monthly_salary)) \
+                   .group_by(Employee.department_id)
+    for department_id, count, total, minimum, maximum in connection.execute(aggregates):
+        statistics = computed.setdefault(department_id, DepartmentStatistics(department_id=department_id))
+        statistics.employees_count = count
+        statistics.salary_sum = _salary(total)
+        statistics.salary_min = _salary(minimum)
+        statistics.salary_max = _salary(maximum)
+    bucket = db.case(*[(Employee.monthly_salary < bound, index) for index, bound in enumerate(SALARY_BUCKET_BOUNDS)],
+                     else_=len(SALARY_BUCKET_BOUNDS))
+    buckets = db.select(Employee.department_id, bucket, db.func.count(Employee.id)) \
+                .group_by(Employee.department_id, bucket)
+    histograms = defaultdict(lambda: [0] * (len(SALARY_BUCKET_BOUNDS) + 1))
+    for department_id, index, count in connection.execute(buckets):
+        histograms[department_id][index] = count
+    for department_id, statistics in computed.items():
+        statistics.salary_histogram = json.dumps(histograms[department_id])
+    return computed
+
+
+def rebuild_statistics(connection, check_only: bool = False) -> list:
+    """
+    Compares stored statistics of all departments with statistics computed from scratch
+    and, unless check_only is True, replaces stored statistics with the computed ones.
+
+    Returns: list of ids of departments whose stored statistics were inconsistent.
+    """
+    table = DepartmentStatistics.__table__
+    computed = compute_statistics(connection)
+    stored = {row["department_id"]: DepartmentStatistics(**row)
+              for row in connection.execute(db.select(table)).mappings()}
+    inconsistent = []
+    for department_id in sorted(set(computed) | set(stored)):
+        expected = computed.get(department_id)
+        actual = stored.get(department_id)
+        if expected is None or actual is None or \
+                (actual.employees_count, _salary(actual.salary_sum), _salary(actual.salary_min),
+                 _salary(actual.salary_max), actual.histogram) != \
+                (expected.employees_count, _salary(expected.salary_sum), _salary(expected.salary_min),
+                 _salary(expected.salary_max), expected.histogram):
+            inconsistent.append(department_id)
+    if not check_only:
+        connection.execute(table.delete())
+        if computed:
+            connection.execute(table.insert(), [_statistics_values(statistics) for statistics in computed.values()])
+    return inconsistent
+
+
+@db.event.listens_for(db.session, "before_flush")
+def _record_removed_salaries(session, flush_context, instances):
+    removed = session.info.setdefault("statistics_removed", {})
+    for record in list(session.dirty) + list(session.deleted):
+        if isinstance(record, Employee) and record not in removed and db.inspect(record).has_identity:
+            removed[record] = (_original_value(record, "department_id"),
+                               _salary(_original_value(record, "monthly_salary")))
+
+
+@db.event.listens_for(db.session, "after_flush")
+def _update_flushed_statistics(session, flush_context):
+    removed = session.info.pop("statistics_removed", {})
+    changes = defaultdict(lambda: ([], []))
+    for record, (department_id, salary) in removed.items():
+        if record in session.deleted:
+            changes[department_id][1].append(salary)
+        elif (record.department_id, _salary(record.monthly_salary)) != (department_id, salary):
+            changes[department_id][1].append(salary)
+            changes[record.department_id][0].append(_salary(record.monthly_salary))
+    for record in session.new:
+        if isinstance(record, Employee):
+            changes[record.department_id][0].append(_salary(record.monthly_salary))
+    if changes:
+        update_statistics(session.connection(), changes)
+    deleted_departments = [record.id for record in session.deleted if isinstance(record, Department)]
+    if deleted_departments:
+        table = DepartmentStatistics.__table__
+        session.connection().execute(table.delete().where(table.c.department_id.in_(deleted_departments)))
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def _forget_removed_salaries(session):
+    session.info.pop("statistics_removed", None)
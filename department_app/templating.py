@@ -0,0 +1,88 @@
+"""
+This module implements faster rendering of HTML pages with long listings.
+
+- Compiled templates are stored in a persistent Jinja bytecode cache directory
+  (TEMPLATE_BYTECODE_CACHE_DIR), so new worker processes load templates without compiling them.
+  Cached bytecode is executed when it is loaded, so the directory must only be writable by
+  the application user: by default Jinja uses a per-user temporary directory with 0700 mode
+  and checks its owner, and a configured directory is created with 0700 mode.
+- Parts of templates may be cached as fragments with cached_fragment template function:
+
+      {% call cached_fragment("departments", ["department", "employee"], key...) %}...{% endcall %}
+
+  Fragments are stored in the response cache backend and keyed by the fragment name, key values
+  and current versions of the given database tables, which change whenever a write to those tables
+  is committed (see department_app.cache), so the edit and delete routes invalidate them.
+  Unlike cached responses, fragments are also served on pages displaying flashed messages.
+  Like cached responses, fragments are only cached by default if RESPONSE_CACHE_BACKEND is configured,
+  as the table versions of an in-process cache are not invalidated by writes of other workers.
+- Pages are streamed with stream_template, so the beginning of a page is sent before
+  long listings are rendered. Views pass queries (or functions fetching rows) to the template
+  instead of fetched rows, so that rows are only fetched when a fragment is rendered.
+"""
+
+import os
+from flask import current_app, get_flashed_messages, stream_with_context
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from department_app.cache import ResponseCache
+
+
+class TemplateCache:
+    """
+    This class implements flask extension configuring the bytecode cache and fragment caching of templates.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Initializes the extension for the flask application.
+        """
+        app.config.setdefault("TEMPLATE_BYTECODE_CACHE_DIR", "")
+        app.config.setdefault("FRAGMENT_CACHE_ENABLED", app.config.get("RESPONSE_CACHE_BACKEND") is not None)
+        app.config.setdefault("TEMPLATE_STREAM_BUFFER_SIZE", 20)
+        directory = app.config["TEMPLATE_BYTECODE_CACHE_DIR"]
+        if directory is None:
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+        elif directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+        app.add_template_global(cached_fragment)
+
+
+def cached_fragment(name: str, tables: list, *key, caller=None) -> Markup:
+    """
+    Renders the body of the call block or returns it from the cache. The fragment is keyed
+    by its name, the given key values and current versions of the given database tables.
+
+    Returns: Markup.
+    """
+    if not current_app.config["FRAGMENT_CACHE_ENABLED"]:
+        return Markup(caller())
+    cache_key = "fragment:{}:{}|{}".format(name, ":".join(str(value) for value in key),
+                                           ",".join(ResponseCache.table_versions(tables)))
+    backend = ResponseCache.backend()
+    fragment = backend.get(cache_key)
+    if fragment is None:
+        fragment = str(caller())
+        backend.set(cache_key, fragment)
+    return Markup(fragment)
+
+
+def stream_template(template_name: str, **context):
+    """
+    Renders the template as a streamed response, sent in chunks of TEMPLATE_STREAM_BUFFER_SIZE
+    template outputs. Flashed messages are removed from the session before streaming starts,
+    because the session is saved before the response body is generated.
+
+    Returns: Response.
+    """
+    app = current_app._get_current_object()
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config["TEMPLATE_STREAM_BUFFER_SIZE"])
+    return app.response_class(stream_with_context(stream), mimetype="text/html")
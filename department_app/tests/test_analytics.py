@@ -0,0 +1,68 @@
+from datetime import date
+import numpy as np
+from department_app import db
+from department_app.analytics import EmployeeColumns, grouped_salary_statistics
+from department_app.models.entities import Department, Employee
+from department_app.tests.test_entities import BaseTestCase
+
+class AnalyticsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        accounting = Department(name="Accounting")
+        it = Department(name="IT")
+        db.session.add_all([accounting, it])
+        for i, salary in enumerate(["1000", "2000", "3000.50", "4000"]):
+            db.session.add(Employee(first_name="Name{}".format(i), last_name="Smith",
+                                    date_of_birth=date(1960 + 10 * i, 1, 1), monthly_salary=salary,
+                                    department=accounting if i < 3 else it))
+        db.session.commit()
+
+    def test_grouped_statistics(self):
+        groups, statistics = grouped_salary_statistics(np.array([2, 1, 2, 2]), np.array([30, 10, 10, 20]))
+        self.assertEqual(groups.tolist(), [1, 2])
+        self.assertEqual(statistics["count"].tolist(), [1, 3])
+        self.assertEqual(statistics["sum"].tolist(), [10, 60])
+        self.assertEqual(statistics["min"].tolist(), [10, 10])
+        self.assertEqual(statistics["max"].tolist(), [10, 30])
+        self.assertEqual(statistics["p50"].tolist(), [10, 20])
+        self.assertEqual(statistics["p25"].tolist(), [10, 15])
+
+    def test_ages(self):
+        columns = EmployeeColumns(np.array([1, 2]), np.array([1, 1]), np.array([100, 100]),
+                                  np.array([date(2000, 3, 15), date(2000, 3, 16)], dtype="datetime64[D]"))
+        self.assertEqual(columns.ages(date(2020, 3, 15)).tolist(), [20, 19])
+
+    def test_salaries(self):
+        response = self.client.get("/api/analytics/salaries")
+        self.assertEqual(response.status_code, 200)
+        content = response.get_json()["content"]
+        self.assertEqual(content["company"]["employees_count"], 4)
+        self.assertEqual(content["company"]["salary_sum"], 10000.5)
+        self.assertEqual([(item["name"], item["employees_count"], item["average_monthly_salary"])
+                          for item in content["departments"]], [("Accounting", 3, 2000.17), ("IT", 1, 4000.0)])
+        self.assertEqual(content["departments"][0]["percentiles"]["p50"], 2000.0)
+        response = self.client.get("/api/analytics/salaries?min_salary=5000")
+        self.assertEqual(response.get_json()["content"], {"company": {"employees_count": 0}, "departments": []})
+
+    def test_ages_bands(self):
+        response = self.client.get("/api/analytics/ages?band=100")
+        content = response.get_json()["content"]
+        self.assertEqual([(item["age_from"], item["age_to"], item["employees_count"]) for item in content["company"]],
+                         [(0, 100, 4)])
+        self.assertEqual([len(item["bands"]) for item in content["departments"]], [1, 1])
+        self.assertEqual(self.client.get("/api/analytics/ages?band=0").status_code, 400)
+
+    def test_top_earners(self):
+        response = self.client.get("/api/analytics/top-earners?n=2")
+        self.assertEqual([item["content"]["first_name"] for item in response.get_json()["content"]],
+                         ["Name3", "Name2"])
+        response = self.client.get("/api/analytics/top-earners?n=10&department_id=1")
+        self.assertEqual(len(response.get_json()["content"]), 3)
+        self.assertEqual(self.client.get("/api/analytics/top-earners?n=abc").status_code, 400)
+
+    def test_payroll(self):
+        content = self.client.get("/api/analytics/payroll").get_json()["content"]
+        self.assertEqual(content["company"]["monthly_payroll"], 10000.5)
+        self.assertEqual(content["company"]["annual_payroll"], 120006.0)
+        self.assertEqual([item["monthly_payroll"] for item in content["departments"]], [6000.5, 4000.0])
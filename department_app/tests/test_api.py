@@ -0,0 +1,343 @@
+import json
+from datetime import date
+from department_app import db
+from department_app.models.entities import Change, Department, Employee
+from department_app.tests.test_entities import BaseTestCase
+
+class ApiTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def _count_queries(self, url, **kwargs):
+        statements = []
+        def count(*args):
+            statements.append(args)
+        db.event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            response = self.client.open(url, **kwargs)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", count)
+        return response, len(statements)
+
+    def _create_test_employees(self, count=5):
+        department = Department(name="Accounting")
+        db.session.add(department)
+        for i in range(count):
+            db.session.add(Employee(first_name="Name{}".format(i), last_name="Smith",
+                                    date_of_birth=date(1980 + i, 1, 1), monthly_salary=1000 + i,
+                                    department=department))
+        db.session.commit()
+        return department
+
+class PaginationTestCase(ApiTestCase):
+    def test_employees_pages(self):
+        self._create_test_employees(5)
+        response = self.client.get("/api/employees?limit=2")
+        self.assertEqual(response.status_code, 200)
+        first_page = response.get_json()
+        self.assertEqual([item["content"]["first_name"] for item in first_page["content"]], ["Name0", "Name1"])
+        self.assertNotIn("prev", first_page["links"])
+        second_page = self.client.get(first_page["links"]["next"]).get_json()
+        self.assertEqual([item["content"]["first_name"] for item in second_page["content"]], ["Name2", "Name3"])
+        last_page = self.client.get(second_page["links"]["next"]).get_json()
+        self.assertEqual([item["content"]["first_name"] for item in last_page["content"]], ["Name4"])
+        self.assertNotIn("next", last_page["links"])
+        previous_page = self.client.get(last_page["links"]["prev"]).get_json()
+        self.assertEqual(previous_page["content"], second_page["content"])
+
+    def test_departments_pages(self):
+        self._create_test_employees(1)
+        db.session.add_all([Department(name="IT"), Department(name="Sales")])
+        db.session.commit()
+        first_page = self.client.get("/api/departments?limit=2").get_json()
+        self.assertEqual([item["content"]["name"] for item in first_page["content"]], ["Accounting", "IT"])
+        last_page = self.client.get(first_page["links"]["next"]).get_json()
+        self.assertEqual([item["content"]["name"] for item in last_page["content"]], ["Sales"])
+        self.assertNotIn("next", last_page["links"])
+
+    def test_departments_pages_with_uneven_averages(self):
+        salaries = ["99.99", "100", "100.01", "101"]
+        for index in range(32):
+            department = Department(name="Department{}".format(index))
+            for offset in range(index % 3 + 1):
+                db.session.add(Employee(first_name="Name{}".format(offset), last_name="Smith",
+                                        date_of_birth=date(1990, 1, 1),
+                                        monthly_salary=salaries[(index + offset) % 4], department=department))
+        db.session.commit()
+        for limit in (1, 7):
+            ids = []
+            url = "/api/departments?limit={}".format(limit)
+            while url and len(ids) <= 32:
+                page = self.client.get(url).get_json()
+                ids += [item["content"]["id"] for item in page["content"]]
+                url = page["links"].get("next")
+            self.assertEqual(sorted(ids), list(range(1, 33)))
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.client.get("/api/employees?limit=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/employees?cursor=abc").status_code, 400)
+        self.assertEqual(self.client.get("/employees?limit=abc").status_code, 400)
+
+    def test_employees_page_links(self):
+        self._create_test_employees(3)
+        response = self.client.get("/employees?limit=2")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Next page", response.data)
+        self.assertNotIn(b"Previous page", response.data)
+
+class ExportTestCase(ApiTestCase):
+    def test_ndjson_export(self):
+        self._create_test_employees(3)
+        self.app.config["EXPORT_BATCH_SIZE"] = 2
+        response = self.client.get("/api/employees/export.ndjson?from_date=1981-01-01&to_date=1990-01-01")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        records = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([record["first_name"] for record in records], ["Name1", "Name2"])
+        self.assertEqual(records[0]["monthly_salary"], 1001.0)
+
+    def test_csv_export(self):
+        department = self._create_test_employees(3)
+        response = self.client.get("/api/employees/export.csv")
+        self.assertEqual(response.status_code, 200)
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], "id,first_name,last_name,date_of_birth,monthly_salary,department_id")
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1], "1,Name0,Smith,1980-01-01,1000.00,{}".format(department.id))
+
+    def test_export_invalid_date(self):
+        self.assertEqual(self.client.get("/api/employees/export.csv?from_date=abc").status_code, 400)
+
+class BulkTestCase(ApiTestCase):
+    def test_bulk_employees(self):
+        department = self._create_test_employees(2)
+        items = [{"content": {"first_name": "Carl", "last_name": "Jones", "date_of_birth": "1990-01-01",
+                              "monthly_salary": "1500", "department_id": department.id}},
+                 {"id": 1, "content": {"monthly_salary": "2000"}},
+                 {"action": "delete", "id": 2},
+                 {"action": "delete", "id": 100},
+                 {"content": {"first_name": "Dan"}},
+                 {"content": {"date_of_birth": "abc"}}]
+        response = self.client.post("/api/employees/bulk?batch_size=4", json=items)
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["content"]
+        self.assertEqual([result["status"] for result in results], [201, 200, 200, 404, 400, 400])
+        self.assertEqual(results[0]["links"]["self"], "/api/employees/{}".format(results[0]["id"]))
+        self.assertEqual(results[4]["error"], "Field last_name is required")
+        db.session.expire_all()
+        self.assertEqual(Employee.query.get(1).monthly_salary, 2000)
+        self.assertIsNone(Employee.query.get(2))
+        self.assertEqual(Employee.query.count(), 2)
+
+    def test_bulk_statements_per_batch(self):
+        from department_app.statistics import rebuild_statistics
+        department = self._create_test_employees(5)
+        items = [{"id": id, "version": 1, "content": {"monthly_salary": str(2000 + id)}} for id in range(1, 6)] + \
+                [{"content": {"first_name": "New{}".format(i), "last_name": "Jones", "date_of_birth": "1990-01-01",
+                              "monthly_salary": "1500", "department_id": department.id}} for i in range(5)]
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement.split(" (")[0].split(" SET")[0], executemany))
+        db.event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = self.client.post("/api/employees/bulk", json=items)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", record)
+        results = response.get_json()["content"]
+        self.assertEqual([result["status"] for result in results], [200] * 5 + [201] * 5)
+        self.assertEqual(statements.count(("UPDATE employee", True)), 1)
+        self.assertEqual(statements.count(("INSERT INTO employee", False)), 1)
+        self.assertEqual(len([statement for statement, _ in statements if statement.endswith(" employee")]), 2)
+        db.session.expire_all()
+        self.assertEqual([(employee.id, employee.monthly_salary, employee.version) for employee in
+                          Employee.query.filter(Employee.id.in_([result["id"] for result in results]))
+                                        .order_by(Employee.id)],
+                         [(id, 2000 + id, 2) for id in range(1, 6)] + [(id, 1500, 1) for id in range(6, 11)])
+        self.assertEqual(Employee.query.filter_by(search_name="jones new4").count(), 1)
+        self.assertEqual(rebuild_statistics(db.session.connection(), check_only=True), [])
+        self.assertEqual(Change.query.filter_by(entity="employee", action="update").count(), 5)
+        self.assertEqual(Change.query.filter_by(entity="employee", action="create").count(), 10)
+
+    def test_bulk_stale_update(self):
+        self._create_test_employees(2)
+        employee = Employee.query.get(2)
+        employee.monthly_salary = 3000
+        db.session.commit()
+        items = [{"id": 1, "content": {"monthly_salary": "2000"}}, {"id": 2, "content": {"monthly_salary": "2500"}}]
+        version_checked = []
+        # A concurrent update between loading and writing the batch.
+        def update_concurrently(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE employee") and not version_checked:
+                version_checked.append(statement)
+                conn.exec_driver_sql("UPDATE employee SET version = version + 1 WHERE id = 2")
+        db.event.listen(db.engine, "before_cursor_execute", update_concurrently)
+        try:
+            response = self.client.post("/api/employees/bulk", json=items)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", update_concurrently)
+        self.assertEqual([result["status"] for result in response.get_json()["content"]], [200, 200])
+        db.session.expire_all()
+        self.assertEqual([employee.monthly_salary for employee in Employee.query.order_by(Employee.id)], [2000, 2500])
+
+    def test_bulk_departments_ndjson(self):
+        self._create_test_employees(2)
+        body = '{"content": {"name": "IT"}}\n{"content": {"name": "IT"}}\nnot json\n{"action": "delete", "id": 1}\n'
+        response = self.client.post("/api/departments/bulk", data=body, content_type="application/x-ndjson")
+        results = response.get_json()["content"]
+        self.assertEqual([result["status"] for result in results], [201, 400, 400, 200])
+        self.assertEqual(results[1]["error"], "Database insertion failed!")
+        self.assertEqual(results[2]["error"], "Invalid json")
+        self.assertEqual(Department.query.count(), 1)
+        self.assertEqual(Employee.query.count(), 0)
+
+    def test_bulk_invalid_body(self):
+        self.assertEqual(self.client.post("/api/employees/bulk", json={"id": 1}).status_code, 400)
+        self.assertEqual(self.client.post("/api/employees/bulk?batch_size=0", json=[]).status_code, 400)
+
+class NameSearchTestCase(ApiTestCase):
+    def _create_named_employees(self):
+        department = Department(name="Accounting")
+        for first_name, last_name in [("Anna", "Smith"), ("Bob", "Smithson"), ("Anna", "Jones"), ("Carl", "Annan")]:
+            db.session.add(Employee(first_name=first_name, last_name=last_name, date_of_birth=date(1980, 1, 1),
+                                    monthly_salary=1000, department=department))
+        db.session.commit()
+
+    def _names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item["content"]["last_name"] + " " + item["content"]["first_name"]
+                for item in response.get_json()["content"]]
+
+    def test_name_search(self):
+        self._create_named_employees()
+        self.assertEqual(sorted(self._names("/api/employees?q=smi")), ["Smith Anna", "Smithson Bob"])
+        self.assertEqual(self._names("/api/employees?q=anna+smi"), ["Smith Anna"])
+        self.assertEqual(self._names("/api/employees?q=zzz"), [])
+
+    def test_name_search_pages(self):
+        self._create_named_employees()
+        first_page = self.client.get("/api/employees?q=ann&limit=2").get_json()
+        self.assertEqual(len(first_page["content"]), 2)
+        last_page = self.client.get(first_page["links"]["next"]).get_json()
+        self.assertEqual(len(last_page["content"]), 1)
+        self.assertIn("prev", last_page["links"])
+
+    def test_name_search_after_update(self):
+        self._create_named_employees()
+        employee = Employee.query.filter_by(last_name="Jones").one()
+        employee.last_name = "Brown"
+        db.session.commit()
+        self.assertEqual(employee.search_name, "brown anna")
+        self.assertEqual(self._names("/api/employees?q=brow"), ["Brown Anna"])
+        self.assertEqual(self._names("/api/employees?q=jones"), [])
+
+    def test_prefix_search(self):
+        from department_app.search import _prefix_search
+        self._create_named_employees()
+        names = [employee.full_name for employee in _prefix_search(Employee.query, ["smith"])]
+        self.assertEqual(names, ["Smith Anna", "Smithson Bob"])
+        names = [employee.full_name for employee in _prefix_search(Employee.query, ["smith", "an"])]
+        self.assertEqual(names, ["Smith Anna"])
+
+    def test_mysql_search_without_fulltext_index(self):
+        from department_app.search import name_search
+        statement = str(name_search(Employee.query, "smith", "mysql", has_fulltext_index=False))
+        self.assertNotIn("MATCH", statement)
+        self.assertIn("search_name", statement)
+        statement = str(name_search(Employee.query, "smith", "mysql", has_fulltext_index=True))
+        self.assertIn("MATCH", statement)
+
+    def test_fulltext_index_detected_once(self):
+        from unittest import mock
+        self._create_named_employees()
+        with mock.patch("department_app.search.fulltext_index_exists", return_value=False) as exists:
+            self.assertEqual(sorted(self._names("/api/employees?q=smi")), ["Smith Anna", "Smithson Bob"])
+            self.assertEqual(self._names("/api/employees?q=smith+an"), ["Smith Anna"])
+        self.assertEqual(exists.call_count, 1)
+
+    def test_invalid_name_search(self):
+        self.assertEqual(self.client.get("/api/employees?q=%21%21").status_code, 400)
+
+class EagerLoadingTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["RESPONSE_CACHE_ENABLED"] = False
+
+    def _create_test_employees_in(self, department, count):
+        for i in range(count):
+            db.session.add(Employee(first_name="Extra{}".format(i), last_name="Brown",
+                                    date_of_birth=date(1990, 1, 1), monthly_salary=500, department=department))
+        db.session.commit()
+
+    def test_view_department_queries(self):
+        self._create_test_employees(2)
+        db.session.expunge_all()
+        _, small_queries = self._count_queries("/departments/1")
+        self._create_test_employees_in(Department.query.get(1), 20)
+        db.session.expunge_all()
+        response, large_queries = self._count_queries("/departments/1")
+        self.assertEqual(small_queries, large_queries)
+        self.assertLess(response.data.index(b"Smith Name0"), response.data.index(b"Smith Name1"))
+
+    def test_view_employee_queries(self):
+        self._create_test_employees(1)
+        db.session.expunge_all()
+        response, queries = self._count_queries("/employees/1")
+        self.assertIn(b"Accounting", response.data)
+        self.assertEqual(queries, 1)
+
+    def test_employees_listing_queries(self):
+        self._create_test_employees(2)
+        other = Department(name="IT")
+        self._create_test_employees_in(other, 3)
+        db.session.expunge_all()
+        response, queries = self._count_queries("/employees")
+        self.assertIn(b"IT", response.data)
+        self.assertEqual(queries, 1)
+
+class DepartmentDeleteTestCase(ApiTestCase):
+    def test_delete_with_employees(self):
+        self._create_test_employees(3)
+        response = self.client.delete("/api/departments/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Department.query.count(), 0)
+        self.assertEqual(Employee.query.count(), 0)
+
+    def test_delete_with_reassignment(self):
+        self._create_test_employees(3)
+        db.session.add(Department(name="IT"))
+        db.session.commit()
+        response = self.client.delete("/api/departments/1?reassign_to=2")
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(Department.query.one().employees_count, 3)
+
+    def test_delete_with_invalid_reassignment(self):
+        self._create_test_employees(3)
+        for reassign_to in ["1", "100", "abc"]:
+            response = self.client.delete("/api/departments/1?reassign_to={}".format(reassign_to))
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Employee.query.count(), 3)
+
+    def test_delete_queries(self):
+        self._create_test_employees(20)
+        db.session.expunge_all()
+        _, queries = self._count_queries("/departments/1/delete", method="POST")
+        # Deleted employee ids are selected for the change log, which is written with two statements.
+        self.assertEqual(queries, 7)
+        self.assertEqual(Employee.query.count(), 0)
+
+    def test_delete_confirmation(self):
+        self._create_test_employees(3)
+        response = self.client.get("/departments/1/delete")
+        self.assertIn(b"This will remove all 3 employees", response.data)
+
+    def test_delete_failure(self):
+        from unittest import mock
+        self._create_test_employees(3)
+        with mock.patch.object(Department, "delete_by_ids", side_effect=RuntimeError):
+            response = self.client.post("/departments/1/delete")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith("/departments/1"))
+        self.assertEqual(Department.query.count(), 1)
@@ -0,0 +1,37 @@
+import unittest
+from department_app import db
+from department_app.benchmarks import (Benchmark, all_benchmarks, compare_results, create_benchmark_app,
+                                       measure, results_to_dict, run_benchmarks, uncovered_routes)
+from department_app.models.entities import Department, Employee
+from department_app.statistics import rebuild_statistics
+
+class BenchmarksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_benchmark_app(4, 300, seed=1)
+
+    def test_generated_data(self):
+        with self.app.app_context():
+            self.assertEqual(Department.query.count(), 4)
+            self.assertEqual(Employee.query.count(), 300)
+            self.assertEqual(rebuild_statistics(db.session.connection(), check_only=True), [])
+            employees = [employee.to_api_dict() for employee in Employee.query.order_by(Employee.id).limit(10)]
+        with create_benchmark_app(4, 300, seed=1).app_context():
+            self.assertEqual([employee.to_api_dict() for employee in Employee.query.order_by(Employee.id).limit(10)],
+                             employees)
+
+    def test_routes_within_query_budgets(self):
+        benchmarks = all_benchmarks(self.app)
+        self.assertEqual(uncovered_routes(self.app, benchmarks), [])
+        results = run_benchmarks(benchmarks, rounds=1)
+        self.assertEqual([result.name for result in results if result.over_budget], [])
+        comparison = compare_results(results, results_to_dict(results, 4, 300))
+        self.assertEqual([name for name, _, _, more_queries in comparison if more_queries], [])
+
+    def test_query_count(self):
+        with self.app.app_context():
+            departments = Department.query.all()
+            db.session.expire_all()
+            benchmark = Benchmark("lazy", lambda: [department.name for department in departments], max_queries=1)
+            result = measure(benchmark, rounds=1, warmup=0)
+        self.assertEqual(result.queries, 4)
+        self.assertTrue(result.over_budget)
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from department_app import create_app, db
+from department_app.cache import LRUCache
+from department_app.models.entities import Department, Employee
+from department_app.tests.test_api import ApiTestCase
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expiration(self):
+        cache = LRUCache(default_ttl=-1)
+        cache.set("a", 1)
+        cache.set("b", 2, 0)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+
+class ResponseCacheTestCase(ApiTestCase):
+    def test_cached_response(self):
+        self._create_test_employees(2)
+        first, first_queries = self._count_queries("/api/departments")
+        second, second_queries = self._count_queries("/api/departments")
+        self.assertGreater(first_queries, 0)
+        self.assertEqual(second_queries, 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+
+    def test_not_modified(self):
+        self._create_test_employees(2)
+        etag = self.client.get("/api/employees/1").headers["ETag"]
+        response = self.client.get("/api/employees/1", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_invalidation_on_write(self):
+        self._create_test_employees(2)
+        before = self.client.get("/api/departments/1").get_json()
+        response = self.client.put("/api/employees/1", json={"monthly_salary": "3000"})
+        self.assertEqual(response.status_code, 200)
+        after = self.client.get("/api/departments/1").get_json()
+        self.assertEqual(before["content"]["average_monthly_salary"], 1000.5)
+        self.assertEqual(after["content"]["average_monthly_salary"], 2000.5)
+        self.client.delete("/api/employees/2")
+        self.assertEqual(len(self.client.get("/api/employees").get_json()["content"]), 1)
+
+    def test_flashed_messages_are_not_cached(self):
+        self._create_test_employees(1)
+        self.client.get("/departments")
+        self.client.post("/departments/1/delete")
+        response = self.client.get("/departments")
+        self.assertIn(b"deleted successfully", response.data)
+
+    def test_disabled(self):
+        self._create_test_employees(1)
+        self.app.config["RESPONSE_CACHE_ENABLED"] = False
+        self.client.get("/api/departments")
+        _, queries = self._count_queries("/api/departments")
+        self.assertGreater(queries, 0)
+
+class SharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = {"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.directory.name, "app.db")}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disabled_without_shared_backend(self):
+        app = create_app(config=self.config)
+        self.assertFalse(app.config["RESPONSE_CACHE_ENABLED"])
+        self.assertFalse(app.config["FRAGMENT_CACHE_ENABLED"])
+        app = create_app(config=dict(self.config, RESPONSE_CACHE_BACKEND=LRUCache()))
+        self.assertTrue(app.config["RESPONSE_CACHE_ENABLED"])
+        self.assertTrue(app.config["FRAGMENT_CACHE_ENABLED"])
+
+    def test_invalidation_across_workers(self):
+        backend = LRUCache()
+        first, second = (create_app(config=dict(self.config, RESPONSE_CACHE_BACKEND=backend)) for _ in range(2))
+        with first.app_context():
+            db.create_all()
+            department = Department(name="Accounting")
+            db.session.add(Employee(first_name="Anna", last_name="Smith", date_of_birth=date(1980, 1, 1),
+                                    monthly_salary=1000, department=department))
+            db.session.commit()
+            db.session.remove()
+        try:
+            self.assertEqual(first.test_client().get("/api/employees/1").get_json()["content"]["monthly_salary"],
+                             1000)
+            response = second.test_client().put("/api/employees/1", json={"monthly_salary": "2000"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(first.test_client().get("/api/employees/1").get_json()["content"]["monthly_salary"],
+                             2000)
+        finally:
+            for app in (first, second):
+                with app.app_context():
+                    db.engine.dispose()
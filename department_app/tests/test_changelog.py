@@ -0,0 +1,62 @@
+import time
+from department_app import db
+from department_app.models.entities import Change, Department, Employee
+from department_app.tests.test_api import ApiTestCase
+
+class ChangeLogTestCase(ApiTestCase):
+    def _changes(self):
+        return [(change.entity, change.record_id, change.action) for change in Change.query.order_by(Change.seq)]
+
+    def test_changes_recorded_in_commit_order(self):
+        department = self._create_test_employees(2)
+        self.client.put("/api/employees/1", json={"monthly_salary": "1500"})
+        self.client.delete("/api/employees/2")
+        self.client.put("/api/departments/1", json={"name": department.name})
+        self.assertEqual(self._changes(), [("department", 1, "create"), ("employee", 1, "create"),
+                                           ("employee", 2, "create"), ("employee", 1, "update"),
+                                           ("employee", 2, "delete")])
+
+    def test_set_based_deletion_recorded(self):
+        self._create_test_employees(2)
+        db.session.add(Department(name="IT"))
+        db.session.commit()
+        self.client.delete("/api/departments/1?reassign_to=2")
+        self.assertEqual(self._changes()[-3:], [("employee", 1, "update"), ("employee", 2, "update"),
+                                                ("department", 1, "delete")])
+        self.client.delete("/api/departments/2")
+        self.assertEqual(self._changes()[-3:], [("employee", 1, "delete"), ("employee", 2, "delete"),
+                                                ("department", 2, "delete")])
+
+    def test_rolled_back_changes_not_recorded(self):
+        self._create_test_employees(1)
+        count = Change.query.count()
+        db.session.add(Department(name="IT"))
+        db.session.flush()
+        db.session.rollback()
+        self.client.post("/api/departments", json={"name": "Accounting"})
+        self.assertEqual(Change.query.count(), count)
+
+
+class ChangeFeedTestCase(ApiTestCase):
+    def test_feed_pages(self):
+        self._create_test_employees(3)
+        first = self.client.get("/api/changes?limit=3").get_json()
+        self.assertEqual([item["content"]["seq"] for item in first["content"]], [1, 2, 3])
+        self.assertEqual(first["content"][1]["links"]["self"], "/api/employees/1")
+        second = self.client.get(first["links"]["next"]).get_json()
+        self.assertEqual([item["content"]["id"] for item in second["content"]], [3])
+        empty = self.client.get(second["links"]["next"]).get_json()
+        self.assertEqual(empty["content"], [])
+        self.assertEqual(empty["links"]["next"], second["links"]["next"])
+
+    def test_long_polling(self):
+        self.app.config["CHANGES_POLL_INTERVAL"] = 0.01
+        started = time.monotonic()
+        response = self.client.get("/api/changes?wait=0.1")
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(response.get_json()["content"], [])
+
+    def test_invalid_arguments(self):
+        for url in ["/api/changes?since=a", "/api/changes?since=-1", "/api/changes?wait=100",
+                    "/api/changes?limit=0"]:
+            self.assertEqual(self.client.get(url).status_code, 400, url)
@@ -0,0 +1,81 @@
+import csv
+import os
+import tempfile
+from department_app import db
+from department_app.models.entities import Change, Department, Employee
+from department_app.tests.test_entities import BaseTestCase
+
+class ImportCommandTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.runner = self.app.test_cli_runner()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def _write_csv(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", newline="") as file:
+            csv.writer(file).writerows(rows)
+        return path
+
+    def test_import_departments(self):
+        db.session.add(Department(name="IT"))
+        db.session.commit()
+        path = self._write_csv("departments.csv", [["name"], ["Accounting"], ["IT"], ["Sales"], ["Sales"], [""]])
+        result = self.runner.invoke(args=["import", "departments", path, "--batch-size", "2"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Done: 2 rows imported, 3 rejected", result.output)
+        self.assertEqual(sorted(name for name, in db.session.query(Department.name)), ["Accounting", "IT", "Sales"])
+        with open(path + ".rejects.csv", newline="") as file:
+            errors = [row["error"] for row in csv.DictReader(file)]
+        self.assertEqual(errors, ["Department already exists", "Department already exists", "Name must not be empty"])
+        imported = {id for id, in db.session.query(Department.id).filter(Department.name.in_(["Accounting", "Sales"]))}
+        self.assertEqual({change.record_id for change in Change.query.filter_by(entity="department", action="create")},
+                         imported | {1})
+
+    def test_import_rejects_rows_failing_in_database(self):
+        db.session.execute(db.text("CREATE TRIGGER reject_department BEFORE INSERT ON department "
+                                   "WHEN NEW.name = 'Bad' BEGIN SELECT RAISE(ABORT, 'bad name'); END"))
+        db.session.commit()
+        path = self._write_csv("departments.csv", [["name"], ["Accounting"], ["Bad"], ["Sales"], ["Bad"]])
+        result = self.runner.invoke(args=["import", "departments", path, "--batch-size", "2"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Done: 2 rows imported, 2 rejected", result.output)
+        self.assertEqual(sorted(name for name, in db.session.query(Department.name)), ["Accounting", "Sales"])
+        with open(path + ".rejects.csv", newline="") as file:
+            self.assertEqual([(row["name"], row["error"]) for row in csv.DictReader(file)],
+                             [("Bad", "bad name"), ("Bad", "bad name")])
+
+    def test_import_records_changes_of_all_chunks(self):
+        from department_app.bulk import MAX_STATEMENT_PARAMETERS
+        count = MAX_STATEMENT_PARAMETERS // len(Department.__table__.columns) + 10
+        path = self._write_csv("departments.csv", [["name"]] + [["Department {}".format(i)] for i in range(count)])
+        result = self.runner.invoke(args=["import", "departments", path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual([(change.record_id, change.action) for change in Change.query.order_by(Change.seq)],
+                         [(id, "create") for id, in db.session.query(Department.id).order_by(Department.id)])
+
+    def test_import_employees(self):
+        db.session.add(Department(name="IT"))
+        db.session.commit()
+        path = self._write_csv("employees.csv", [
+            ["first_name", "last_name", "date_of_birth", "monthly_salary", "department"],
+            ["Anna", "Smith", "2000-11-11", "1000.24", "IT"],
+            ["Bob", "Smith", "2000-10-10", "900", "Sales"],
+            ["Carl", "Jones", "2000-13-10", "900", "IT"],
+            ["Dan", "Jones", "1990-01-01", "1500", "IT"]])
+        reject_path = os.path.join(self.directory.name, "rejects.csv")
+        result = self.runner.invoke(args=["import", "employees", path, "--reject-file", reject_path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Done: 2 rows imported, 2 rejected", result.output)
+        self.assertEqual(Department.query.one().employees_count, 2)
+        with open(reject_path, newline="") as file:
+            rejects = list(csv.DictReader(file))
+        self.assertEqual([row["first_name"] for row in rejects], ["Bob", "Carl"])
+        self.assertEqual(rejects[0]["error"], "Department not found")
+        self.assertEqual([(change.record_id, change.action) for change in
+                          Change.query.filter_by(entity="employee").order_by(Change.seq)],
+                         [(employee.id, "create") for employee in Employee.query.order_by(Employee.first_name)])
@@ -0,0 +1,72 @@
+from sqlalchemy.orm.exc import StaleDataError
+from department_app import db
+from department_app.models.entities import Department, Employee
+from department_app.tests.test_api import ApiTestCase
+
+class EtagTestCase(ApiTestCase):
+    def test_employee_etag_round_trip(self):
+        employee = self._create_test_employees(1).employees[0]
+        response = self.client.get("/api/employees/{}".format(employee.id))
+        etag = response.get_etag()[0]
+        self.assertEqual(etag, "1")
+        response = self.client.put("/api/employees/{}".format(employee.id), json={"monthly_salary": "2000"},
+                                   headers={"If-Match": '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_etag()[0], "2")
+        response = self.client.put("/api/employees/{}".format(employee.id), json={"monthly_salary": "3000"},
+                                   headers={"If-Match": '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Employee.query.get(employee.id).monthly_salary, 2000)
+        response = self.client.delete("/api/employees/{}".format(employee.id), headers={"If-Match": '"1"'})
+        self.assertEqual(response.status_code, 412)
+        response = self.client.delete("/api/employees/{}".format(employee.id), headers={"If-Match": '"2"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_department_etag_ignores_statistics(self):
+        department = self._create_test_employees(1)
+        response = self.client.get("/api/departments/{}".format(department.id))
+        etag, weak = response.get_etag()
+        self.assertTrue(weak)
+        self.client.post("/api/employees", json={"first_name": "Jane", "last_name": "Doe",
+                                                 "date_of_birth": "1990-01-01", "monthly_salary": "900",
+                                                 "department_id": department.id})
+        response = self.client.get("/api/departments/{}".format(department.id),
+                                   headers={"If-None-Match": 'W/"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get_etag()[0], etag)
+        self.assertEqual(self.client.get("/api/departments/{}".format(department.id),
+                                         headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+        # Statistics changed, but the department itself was not modified.
+        response = self.client.put("/api/departments/{}".format(department.id), json={"name": "Finance"},
+                                   headers={"If-Match": 'W/"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_etag()[0].startswith("2-"))
+        response = self.client.put("/api/departments/{}".format(department.id), json={"name": "Sales"},
+                                   headers={"If-Match": 'W/"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 412)
+        response = self.client.delete("/api/departments/{}".format(department.id), headers={"If-Match": '"2"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_session_update(self):
+        department = self._create_test_employees(1)
+        employee = department.employees[0]
+        # Another transaction updates the employee loaded in the session.
+        db.session.execute(db.update(Employee).where(Employee.id == employee.id)
+                           .values(version=Employee.version + 1)
+                           .execution_options(synchronize_session=False))
+        response = self.client.put("/api/employees/{}".format(employee.id), json={"monthly_salary": "2000"})
+        self.assertEqual(response.status_code, 412)
+        with self.assertRaises(StaleDataError):
+            Department.delete_by_ids([department.id], versions={department.id: department.version + 1})
+        db.session.rollback()
+
+    def test_edit_form_conflict(self):
+        department = self._create_test_employees(1)
+        response = self.client.post("/departments/{}/edit".format(department.id),
+                                    data={"name": "Finance", "version": "1"})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post("/departments/{}/edit".format(department.id),
+                                    data={"name": "Sales", "version": "1"})
+        self.assertEqual(response.status_code, 412)
+        self.assertIn(b'name="version" value="2"', response.data)
+        self.assertEqual(Department.query.get(department.id).name, "Finance")
@@ -79,6 +79,41 @@ class DepartmentTestCase(BaseTestCase):
         department = Department(id=1, name="IT")
         self.assertIsNone(department.average_monthly_salary)
 
+    def test_query_with_statistics(self):
+        accounting = self._create_test_department()
+        it = Department(name="IT")
+        sales = Department(name="Sales")
+        carl = Employee(first_name="Carl", last_name="Jones", 
+                        date_of_birth = date.fromisoformat("1990-01-01"),
+                        monthly_salary = "2000", department=sales)
+        db.session.add_all([it, sales, carl])
+        db.session.commit()
+        departments = Department.query_with_statistics().all()
+        self.assertEqual([department.name for department in departments], ["Sales", "Accounting", "IT"])
+        self.assertEqual([department.employees_count for department in departments], [1, 2, 0])
+        self.assertEqual([department.average_monthly_salary for department in departments], 
+                         [Decimal('2000.00'), Decimal('950.12'), None])
+        self.assertEqual(accounting.to_api_dict()["average_monthly_salary"], 950.12)
+
+    def test_query_with_statistics_order(self):
+        departments = [Department(name="Whole"), Department(name="Cents")]
+        for department, salaries in zip(departments, (["100", "101"], ["100.01"])):
+            for index, salary in enumerate(salaries):
+                db.session.add(Employee(first_name="Name{}".format(index), last_name=department.name,
+                                        date_of_birth=date(1990, 1, 1), monthly_salary=salary,
+                                        department=department))
+        db.session.commit()
+        self.assertEqual([(department.name, department.average_monthly_salary)
+                          for department in Department.query_with_statistics()],
+                         [("Whole", Decimal("100.50")), ("Cents", Decimal("100.01"))])
+
+    def test_query_with_statistics_does_not_load_employees(self):
+        self._create_test_department()
+        db.session.expunge_all()
+        department = Department.query_with_statistics().one()
+        self.assertEqual(department.employees_count, 2)
+        self.assertNotIn("employees", department.__dict__)
+
 class EmployeeTestCase(BaseTestCase):
     def test_to_dict(self):
         anna = Employee(id=1, department_id=2010, first_name="Anna", last_name="Smith", 
@@ -91,3 +126,22 @@ class EmployeeTestCase(BaseTestCase):
                 'monthly_salary': "1000.24",
                 'department_id': "2010"}
         self.assertEqual(anna.to_dict(), expected_dict)
+
+    def test_search_filters(self):
+        department = self._create_test_department()
+        def names(args):
+            query = Employee.query.filter(*Employee.search_filters(args)).order_by(Employee.first_name)
+            return [employee.first_name for employee in query]
+        self.assertEqual(names({"from_date": "2000-10-10", "to_date": "2000-11-01"}), ["Bob"])
+        self.assertEqual(names({"from_date": "2000-11-11", "exact_date": "Yes"}), ["Anna"])
+        self.assertEqual(names({"department_id": str(department.id), "min_salary": "950"}), ["Anna"])
+        self.assertEqual(names({"max_salary": "950.00"}), ["Bob"])
+        self.assertEqual(names({"department_id": "100"}), [])
+        self.assertRaises(ValueError, Employee.search_filters, {"min_salary": "abc"})
+        self.assertRaises(ValueError, Employee.search_filters, {"to_date": "2000-13-01"})
+
+    def test_search_indexes(self):
+        indexes = {tuple(index.columns.keys()) for index in Employee.__table__.indexes}
+        self.assertIn(("date_of_birth",), indexes)
+        self.assertIn(("last_name", "first_name"), indexes)
+        self.assertIn(("department_id", "last_name", "first_name"), indexes)
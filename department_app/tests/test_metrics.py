@@ -0,0 +1,55 @@
+from department_app import create_app, db
+from department_app.metrics import Histogram
+from department_app.models.entities import Department
+from department_app.tests.test_api import ApiTestCase
+
+class MetricsTestCase(ApiTestCase):
+    def test_histogram(self):
+        histogram = Histogram("latency", "Latency.", ("endpoint",), (0.1, 1))
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(value, endpoint="index")
+        samples = {(name, labels.get("le")): value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples[("latency_bucket", "0.1")], 1)
+        self.assertEqual(samples[("latency_bucket", "1")], 2)
+        self.assertEqual(samples[("latency_bucket", "+Inf")], 3)
+        self.assertEqual(samples[("latency_count", None)], 3)
+
+    def test_metrics_endpoint(self):
+        self._create_test_employees(3)
+        self.client.get("/api/employees")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('department_app_request_duration_seconds_count{endpoint="api.employees_api",method="GET",'
+                      'status="200"} 1', text)
+        self.assertIn('department_app_sql_statements_per_request_count{endpoint="api.employees_api"} 1', text)
+        self.assertIn("# TYPE department_app_db_pool_checkouts_total counter", text)
+
+    def test_slow_queries(self):
+        self.app.config["SLOW_QUERY_SECONDS"] = 0
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/api/departments/1")
+        self.assertIn("Slow query in api.view_department_api", logs.output[0])
+
+    def test_n_plus_one_detection(self):
+        for name in ["Accounting", "IT", "Sales"]:
+            db.session.add(Department(name=name))
+        db.session.commit()
+        db.session.expunge_all()
+        self.app.config["N_PLUS_ONE_THRESHOLD"] = 3
+
+        @self.app.route("/test/employees-count")
+        def employees_count():
+            return str(sum(len(department.employees) for department in Department.query.all()))
+
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/test/employees-count")
+        self.assertIn("Possible N+1 queries in employees_count: Department.employees lazily loaded 3 times",
+                      logs.output[0])
+        text = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn('department_app_n_plus_one_total{endpoint="employees_count",'
+                      'relationship="Department.employees"} 1', text)
+
+    def test_disabled(self):
+        app = create_app(True, {"METRICS_ENABLED": False})
+        self.assertEqual(app.test_client().get("/metrics").status_code, 404)
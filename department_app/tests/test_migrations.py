@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import warnings
+from sqlalchemy import exc
+from sqlalchemy.dialects import mysql, postgresql
+from department_app import create_app, db, migrations
+from department_app.migrations import v002_employee_indexes, v003_employee_search_name
+from department_app.models.entities import Department, Employee
+from department_app.search import search_employees
+from department_app.tests.test_entities import BaseTestCase
+
+class MigrationsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + os.path.join(self.directory.name, "department_app.db")
+        self.app = create_app(True, {"SQLALCHEMY_DATABASE_URI": uri})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.connection = db.engine.connect()
+        warnings.simplefilter("ignore", category=exc.SAWarning)
+
+    def tearDown(self):
+        self.connection.close()
+        db.session.remove()
+        db.engine.dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_upgrade_creates_model_schema(self):
+        applied = migrations.upgrade(self.connection)
+        self.assertEqual([migration.version for migration in applied], list(range(1, 9)))
+        self.assertEqual(migrations.upgrade(self.connection), [])
+        inspector = db.inspect(self.connection)
+        for table in db.metadata.sorted_tables:
+            self.assertEqual({column["name"] for column in inspector.get_columns(table.name)},
+                             {column.name for column in table.columns})
+            self.assertEqual({index["name"] for index in inspector.get_indexes(table.name)},
+                             {index.name for index in table.indexes})
+
+    def test_upgrade_backfills_existing_rows(self):
+        migrations.upgrade(self.connection, target=1)
+        self.assertEqual(set(migrations.applied_versions(self.connection)), {1})
+        with self.connection.begin():
+            self.connection.execute(db.text("INSERT INTO department (name) VALUES ('IT')"))
+            self.connection.execute(db.text("INSERT INTO employee (first_name, last_name, date_of_birth, "
+                                            "monthly_salary, department_id) VALUES (:first_name, 'Smith', "
+                                            "'2000-01-01', 1000, 1)"),
+                                    [{"first_name": "Ann {}".format(index)} for index in range(5)])
+        messages = []
+        migrations.upgrade(self.connection, batch_size=2, echo=messages.append)
+        self.assertIn("employee: 4 rows updated", messages)
+        self.assertIn("employee: 5 rows updated", messages)
+        self.assertEqual(Employee.query.filter(Employee.search_name == "smith ann 3").count(), 1)
+        department = Department.query.one()
+        self.assertEqual((department.version, department.employees_count), (1, 5))
+        self.assertEqual(len(search_employees({"q": "ann"}).items), 5)
+        Employee.query.get(1).monthly_salary = 2000
+        db.session.commit()
+        self.assertEqual(Employee.query.get(1).version, 2)
+
+    def test_online_ddl(self):
+        index = db.Index("ix_employee_name", v002_employee_indexes.employee.c.last_name,
+                         v002_employee_indexes.employee.c.first_name)
+        self.assertEqual(migrations.create_index_ddl(index, mysql.dialect()),
+                         "CREATE INDEX ix_employee_name ON employee (last_name, first_name) "
+                         "ALGORITHM=INPLACE LOCK=NONE")
+        self.assertEqual(migrations.create_index_ddl(index, postgresql.dialect()),
+                         "CREATE INDEX CONCURRENTLY ix_employee_name ON employee (last_name, first_name)")
+        self.assertEqual(migrations.add_column_ddl(v003_employee_search_name.employee.c.search_name, mysql.dialect()),
+                         "ALTER TABLE employee ADD COLUMN search_name VARCHAR(161), ALGORITHM=INPLACE, LOCK=NONE")
+
+class DatabaseCommandTestCase(BaseTestCase):
+    def test_upgrade_created_database(self):
+        department_id = self._create_test_department().id
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["db", "status"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("001 initial_schema pending", result.output)
+        result = runner.invoke(args=["db", "upgrade"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("8 migrations applied", result.output)
+        self.assertNotIn("rows updated", result.output)
+        self.assertNotIn("pending", runner.invoke(args=["db", "status"]).output)
+        self.assertIn("Database is up to date", runner.invoke(args=["db", "upgrade"]).output)
+        self.assertEqual(Department.query.get(department_id).employees_count, 2)
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from department_app import create_app, db, replicas
+from department_app.models.entities import Department
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        uris = ["sqlite:///" + os.path.join(self.directory.name, name + ".db")
+                for name in ("primary", "replica1", "replica2")]
+        self.app = create_app(True, {"SQLALCHEMY_DATABASE_URI": uris[0], "SQLALCHEMY_REPLICA_URIS": uris[1:],
+                                     "RESPONSE_CACHE_ENABLED": False})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Department(name="Primary"))
+        db.session.commit()
+        for index, engine in enumerate(replicas.engines()):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(Department.__table__.insert(), {"name": "Replica{}".format(index + 1)})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        for engine in replicas.engines() + [db.engine]:
+            engine.dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def _department_names(self, url="/api/departments"):
+        db.session.remove()
+        return [item["content"]["name"] for item in self.client.get(url).get_json()["content"]]
+
+    def test_round_robin(self):
+        names = [self._department_names()[0] for _ in range(4)]
+        self.assertEqual(sorted(names), ["Replica1", "Replica1", "Replica2", "Replica2"])
+        self.assertNotEqual(names[0], names[1])
+
+    def test_writes_use_primary(self):
+        response = self.client.post("/api/departments", json={"name": "IT"})
+        self.assertEqual(response.status_code, 200)
+        db.session.remove()
+        self.assertEqual(sorted(name for name, in db.session.query(Department.name)), ["IT", "Primary"])
+
+    def test_read_your_writes(self):
+        self.client.post("/api/departments", json={"name": "IT"})
+        self.assertEqual(sorted(self._department_names()), ["IT", "Primary"])
+        with self.client.session_transaction() as session:
+            session["primary_until"] = 0
+        self.assertIn(self._department_names()[0], ["Replica1", "Replica2"])
+
+    def test_edit_views_use_primary(self):
+        response = self.client.get("/departments/1/edit")
+        self.assertIn(b"Primary", response.data)
+
+    def test_read_your_writes_with_response_cache(self):
+        self.app.config["RESPONSE_CACHE_ENABLED"] = True
+        other_client = self.app.test_client()
+        self.client.post("/api/departments", json={"name": "IT"})
+        db.session.remove()
+        other_names = [item["content"]["name"] for item in other_client.get("/api/departments").get_json()["content"]]
+        self.assertIn(other_names[0], ["Replica1", "Replica2"])
+        self.assertEqual(sorted(self._department_names()), ["IT", "Primary"])
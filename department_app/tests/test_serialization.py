@@ -0,0 +1,74 @@
+import json
+from datetime import date
+from flask import jsonify
+from department_app import db, serialization
+from department_app.models.entities import Department, Employee
+from department_app.pagination import paginate
+from department_app.search import search_employees
+from department_app.tests.test_api import ApiTestCase
+
+class SerializationTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, salaries in [("Accounting", ["1000.24", "900", "1234.5"]), ("Закупівлі", ["0.01", "99999999.99"]),
+                               ("Empty", [])]:
+            department = Department(name=name)
+            db.session.add(department)
+            for i, salary in enumerate(salaries):
+                db.session.add(Employee(first_name="Ім'я{}".format(i), last_name=name + "\x7f",
+                                        date_of_birth=date(1980 + i, 1, 1), monthly_salary=salary,
+                                        department=department))
+        db.session.commit()
+        db.session.expire_all()
+
+    def _expected_departments(self, url):
+        with self.app.test_request_context(url) as context:
+            page = paginate(Department.query_with_statistics(), Department.statistics_order_by(),
+                            lambda department: department.statistics_order_key, 2,
+                            context.request.args.get("cursor"))
+            body = jsonify({"content": [{"content": department.to_api_dict(),
+                                         "links": {"self": "/api/departments/{}".format(department.id)}}
+                                        for department in page.items],
+                            "links": page.links()}).get_data()
+        db.session.expire_all()
+        return body
+
+    def _expected_employees(self, url, args):
+        with self.app.test_request_context(url):
+            page = search_employees(args)
+            body = jsonify({"content": [{"content": employee.to_api_dict(),
+                                         "links": {"self": "/api/employees/{}".format(employee.id),
+                                                   "department": "/api/departments/{}".format(
+                                                       employee.department_id)}}
+                                        for employee in page.items],
+                            "links": page.links()}).get_data()
+        db.session.expire_all()
+        return body
+
+    def test_departments_identical_to_orm_serialization(self):
+        url = "/api/departments?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.data, self._expected_departments(url))
+            url = response.get_json()["links"].get("next")
+
+    def test_employees_identical_to_orm_serialization(self):
+        for args in [{"limit": "3"}, {"q": "ім'я закупівлі"}, {"min_salary": "1000"}]:
+            url = "/api/employees?" + "&".join("{}={}".format(*item) for item in args.items())
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, self._expected_employees(url, args))
+
+    def test_pretty_print(self):
+        self.app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
+        self.assertIn(b'\n  "content": [', self.client.get("/api/departments").data)
+
+    def test_dumps_without_orjson(self):
+        data = {"b": [1.5, 1e-05, 1e16, None, True], "a": "Закупівлі\x7f"}
+        expected = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+        self.assertEqual(serialization.dumps(data), expected)
+        orjson, serialization.orjson = serialization.orjson, None
+        try:
+            self.assertEqual(serialization.dumps(data), expected)
+        finally:
+            serialization.orjson = orjson
@@ -0,0 +1,117 @@
+from datetime import date
+from decimal import Decimal
+from department_app import db
+from department_app.models.entities import Department, Employee, DepartmentStatistics
+from department_app.statistics import rebuild_statistics
+from department_app.tests.test_entities import BaseTestCase
+
+class DepartmentStatisticsTestCase(BaseTestCase):
+    def _statistics(self, department_id):
+        db.session.expire_all()
+        return DepartmentStatistics.query.get(department_id)
+
+    def _assert_consistent(self):
+        self.assertEqual(rebuild_statistics(db.session.connection(), check_only=True), [])
+
+    def test_create_employees(self):
+        department = self._create_test_department()
+        statistics = self._statistics(department.id)
+        self.assertEqual(statistics.employees_count, 2)
+        self.assertEqual(statistics.salary_sum, Decimal("1900.24"))
+        self.assertEqual(statistics.salary_min, Decimal("900"))
+        self.assertEqual(statistics.salary_max, Decimal("1000.24"))
+        self.assertEqual(statistics.average_monthly_salary, Decimal("950.12"))
+        self._assert_consistent()
+
+    def test_update_and_move_employees(self):
+        department = self._create_test_department()
+        other = Department(name="IT")
+        db.session.add(other)
+        db.session.commit()
+        anna = Employee.query.filter_by(first_name="Anna").one()
+        anna.monthly_salary = Decimal("3000")
+        db.session.commit()
+        self.assertEqual(self._statistics(department.id).salary_max, Decimal("3000"))
+        anna = Employee.query.filter_by(first_name="Anna").one()
+        anna.department_id = other.id
+        db.session.commit()
+        statistics = self._statistics(department.id)
+        self.assertEqual((statistics.employees_count, statistics.salary_min, statistics.salary_max),
+                         (1, Decimal("900"), Decimal("900")))
+        self.assertEqual(self._statistics(other.id).salary_sum, Decimal("3000"))
+        self._assert_consistent()
+
+    def test_delete_employees(self):
+        department = self._create_test_department()
+        for employee in Employee.query.all():
+            db.session.delete(employee)
+            db.session.commit()
+        statistics = self._statistics(department.id)
+        self.assertEqual(statistics.employees_count, 0)
+        self.assertIsNone(statistics.salary_min)
+        self.assertIsNone(statistics.average_monthly_salary)
+        self._assert_consistent()
+
+    def test_delete_departments(self):
+        department = self._create_test_department()
+        other = Department(name="IT")
+        db.session.add(other)
+        db.session.add(Employee(first_name="Carl", last_name="Jones", date_of_birth=date(1990, 1, 1),
+                                monthly_salary=5000, department=other))
+        db.session.commit()
+        department_id, other_id = department.id, other.id
+        Department.delete_by_ids([department_id], reassign_to=other_id)
+        db.session.commit()
+        statistics = self._statistics(other_id)
+        self.assertEqual((statistics.employees_count, statistics.salary_sum), (3, Decimal("6900.24")))
+        self.assertIsNone(self._statistics(department_id))
+        self._assert_consistent()
+
+    def test_percentiles(self):
+        statistics = DepartmentStatistics(department_id=1)
+        statistics.add_salaries([Decimal(salary) for salary in range(100, 10100, 100)])
+        self.assertEqual(statistics.percentile(0), Decimal("100.00"))
+        self.assertEqual(statistics.percentile(1), Decimal("10000.00"))
+        self.assertTrue(Decimal("4900") <= statistics.percentile(0.5) <= Decimal("5200"))
+
+    def test_rebuild(self):
+        department_id = self._create_test_department().id
+        DepartmentStatistics.query.delete()
+        db.session.commit()
+        self.assertEqual(rebuild_statistics(db.session.connection(), check_only=True), [department_id])
+        result = self.app.test_cli_runner().invoke(args=["statistics", "rebuild", "--check"])
+        self.assertEqual(result.exit_code, 1)
+        result = self.app.test_cli_runner().invoke(args=["statistics", "rebuild"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(self._statistics(department_id).employees_count, 2)
+        self._assert_consistent()
+
+    def test_statistics_api(self):
+        self._create_test_department()
+        db.session.add(Department(name="IT"))
+        db.session.commit()
+        content = self.app.test_client().get("/api/departments/stats").get_json()["content"]
+        self.assertEqual([item["content"]["name"] for item in content], ["Accounting", "IT"])
+        self.assertEqual(content[0]["content"]["employees_count"], 2)
+        self.assertEqual(content[1]["content"]["employees_count"], 0)
+
+    def test_lock_order(self):
+        department = self._create_test_department()
+        other = Department(name="IT")
+        db.session.add(other)
+        db.session.commit()
+        Employee.query.filter_by(first_name="Anna").one().department_id = other.id
+        db.session.commit()
+        locked = []
+        def record(connection, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT") and "FROM department_statistics" in statement:
+                locked.append(tuple(parameters))
+        db.event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            # Moving from the department with the greater id.
+            Employee.query.filter_by(first_name="Anna").one().department_id = department.id
+            db.session.commit()
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual([parameters[0] for parameters in locked], sorted([department.id, other.id]))
+        self._assert_consistent()
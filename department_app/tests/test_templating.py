@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from department_app import create_app, db
+from department_app.tests.test_api import ApiTestCase
+
+class TemplatingTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["RESPONSE_CACHE_ENABLED"] = False
+
+    def test_departments_fragment(self):
+        self._create_test_employees(2)
+        response, queries = self._count_queries("/departments")
+        self.assertTrue(response.is_streamed)
+        self.assertIn("Accounting", response.get_data(as_text=True))
+        self.assertEqual(queries, 1)
+        response, queries = self._count_queries("/departments")
+        self.assertIn("Accounting", response.get_data(as_text=True))
+        self.assertEqual(queries, 0)
+        self.client.post("/departments/1/edit", data={"name": "Finance"})
+        self.assertIn("Finance", self.client.get("/departments").get_data(as_text=True))
+
+    def test_department_employees_fragment(self):
+        self._create_test_employees(2)
+        self.assertIn("1001", self.client.get("/departments/1").get_data(as_text=True))
+        response, queries = self._count_queries("/departments/1")
+        self.assertIn("Smith Name1", response.get_data(as_text=True))
+        self.assertEqual(queries, 1)
+        self.client.post("/employees/2/edit", data={"first_name": "Changed", "last_name": "Smith",
+                                                     "date_of_birth": "1981-01-01", "monthly_salary": "2000",
+                                                     "department_id": "1"})
+        text = self.client.get("/departments/1").get_data(as_text=True)
+        self.assertIn("Smith Changed", text)
+        self.assertIn("2000", text)
+
+    def test_employees_fragment_keyed_by_arguments(self):
+        self._create_test_employees(3)
+        self.assertIn("Name2", self.client.get("/employees").get_data(as_text=True))
+        self.assertNotIn("Name2", self.client.get("/employees?limit=2").get_data(as_text=True))
+        self.assertEqual(self.client.get("/employees?limit=x").status_code, 400)
+
+    def test_flashed_messages_shown_once(self):
+        self._create_test_employees(1)
+        self.client.post("/employees/1/delete")
+        self.assertIn("deleted successfully", self.client.get("/employees").get_data(as_text=True))
+        self.assertNotIn("deleted successfully", self.client.get("/employees").get_data(as_text=True))
+
+class BytecodeCacheTestCase(unittest.TestCase):
+    def test_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            app = create_app(True, {"TEMPLATE_BYTECODE_CACHE_DIR": os.path.join(directory, "templates")})
+            with app.app_context():
+                db.create_all()
+                self.assertEqual(app.test_client().get("/departments").status_code, 200)
+            self.assertTrue(os.listdir(os.path.join(directory, "templates")))
+
+    def test_default_bytecode_cache_directory(self):
+        app = create_app(config={"SQLALCHEMY_DATABASE_URI": "sqlite://", "TEMPLATE_BYTECODE_CACHE_DIR": None})
+        directory = app.jinja_env.bytecode_cache.directory
+        self.assertEqual(os.stat(directory).st_uid, os.getuid())
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
@@ -0,0 +1,42 @@
+"""
+This package contains the blueprints of department app: the HTML user interface (department_app.views.ui)
+and the JSON API (department_app.views.api), which are registered by create_app when enabled
+with UI_ENABLED and API_ENABLED settings, so that API-only and UI-only workers may be deployed.
+"""
+
+import werkzeug
+from werkzeug.routing import Rule
+
+# Werkzeug versions whose private Rule._compile_builder method is known to be overridden correctly.
+LAZY_BUILDER_WERKZEUG_VERSIONS = ("1.0.",)
+
+
+class LazyBuilderRule(Rule):
+    """
+    This class implements URL rule compiling its URL builder functions on first use instead
+    of when the rule is added to the URL map. Werkzeug compiles two Python functions per rule,
+    which makes most of the application creation time, while the application builds few URLs.
+    It overrides a private Werkzeug method, so it is only used with tested Werkzeug versions
+    (see url_rule_class).
+    """
+
+    def _compile_builder(self, append_unknown=True):
+        compiled = []
+
+        def build(rule, *args, **kwargs):
+            if not compiled:
+                compiled.append(Rule._compile_builder(rule, append_unknown).__get__(rule, None))
+            return compiled[0](*args, **kwargs)
+        return build
+
+
+def url_rule_class():
+    """
+    Selects URL rule class of the application: LazyBuilderRule with Werkzeug versions it is known
+    to work with and the standard Werkzeug Rule with other versions.
+
+    Returns: Rule subclass.
+    """
+    if werkzeug.__version__.startswith(LAZY_BUILDER_WERKZEUG_VERSIONS) and hasattr(Rule, "_compile_builder"):
+        return LazyBuilderRule
+    return Rule
@@ -0,0 +1,372 @@
+"""
+This module implements the JSON API of department app as a blueprint mounted at /api.
+
+Modules used by few endpoints only are imported on the first request to those endpoints,
+e.g. salary analytics with numpy.
+"""
+
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
+from sqlalchemy.orm.exc import StaleDataError
+from department_app import db, replicas, cache
+from department_app.bulk import process_bulk, request_items, parse_batch_size
+from department_app.changelog import parse_changes_args, changes_content, wait_for_changes
+from department_app.concurrency import CONFLICT_MESSAGE, etag_matches
+from department_app.export import employees_csv_chunks, employees_ndjson_chunks
+from department_app.models.entities import Department, Employee, DepartmentStatistics
+from department_app.pagination import paginate, parse_limit
+from department_app.search import search_employees
+from department_app.serialization import json_response
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+
+def init_app(app):
+    """
+    Registers the blueprint in the flask application.
+    """
+    app.register_blueprint(api)
+
+
+@api.route("")
+def index():
+    """Returns links to supported root endpoints."""
+    return jsonify({"links":{"departments":"/api/departments", "employees":"/api/employees",
+                             "department_statistics":"/api/departments/stats",
+                             "analytics":"/api/analytics", "pool":"/api/pool",
+                             "employees_ndjson_export":"/api/employees/export.ndjson",
+                             "employees_csv_export":"/api/employees/export.csv",
+                             "changes":"/api/changes"}})
+
+
+@api.route("/departments", methods=["GET"])
+@cache.cached("department", "employee")
+@replicas.read_only
+def departments_api():
+    """Returns a page of departments listing."""
+    try:
+        page = paginate(Department.query_api_rows(), Department.statistics_order_by(),
+                        lambda row: [row.salary_order, row.id],
+                        parse_limit(request.args), request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    result = []
+    for row in page.items:
+        result.append({"content": Department.row_to_api_dict(row),
+                       "links": {"self": "/api/departments/{}".format(row.id)}})
+    return json_response({"content": result, "links": page.links()})
+
+
+@api.route("/departments/stats")
+@cache.cached("department", "employee")
+@replicas.read_only
+def department_statistics_api():
+    """Returns salary statistics of all departments."""
+    rows = db.session.query(Department, DepartmentStatistics) \
+             .outerjoin(DepartmentStatistics, DepartmentStatistics.department_id == Department.id) \
+             .order_by(Department.name)
+    result = []
+    for department, statistics in rows:
+        statistics = statistics or DepartmentStatistics(department_id=department.id)
+        result.append({"content": dict(statistics.to_api_dict(), name=department.name),
+                       "links": {"department": "/api/departments/{}".format(department.id)}})
+    return jsonify({"content": result, "links": {"self": "/api/departments/stats"}})
+
+
+@api.route("/pool")
+def pool_api():
+    """Returns database connection pool metrics of this worker process."""
+    return jsonify({"content": current_app.extensions["pool_metrics"].to_dict(), "links": {"self": "/api/pool"}})
+
+
+@api.route("/analytics")
+def analytics_api():
+    """Returns links to supported analytics endpoints."""
+    return jsonify({"links":{"salaries":"/api/analytics/salaries", "ages":"/api/analytics/ages",
+                             "top_earners":"/api/analytics/top-earners", "payroll":"/api/analytics/payroll"}})
+
+
+@api.route("/analytics/salaries")
+@cache.cached("department", "employee")
+@replicas.read_only
+def salary_analytics_api():
+    """Returns salary statistics of the company and its departments."""
+    from department_app.analytics import salary_analytics
+    try:
+        content = salary_analytics(request.args)
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": content, "links": {"self": request.full_path.rstrip("?")}})
+
+
+@api.route("/analytics/ages")
+@cache.cached("department", "employee")
+@replicas.read_only
+def age_analytics_api():
+    """Returns employee counts and salary statistics by age bands."""
+    from department_app.analytics import age_analytics
+    try:
+        content = age_analytics(request.args)
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": content, "links": {"self": request.full_path.rstrip("?")}})
+
+
+@api.route("/analytics/top-earners")
+@cache.cached("employee")
+@replicas.read_only
+def top_earners_api():
+    """Returns employees with the highest salaries."""
+    from department_app.analytics import top_earners
+    try:
+        employees = top_earners(request.args)
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": [{"content": employee.to_api_dict(),
+                                 "links": {"self": "/api/employees/{}".format(employee.id)}}
+                                for employee in employees],
+                    "links": {"self": request.full_path.rstrip("?")}})
+
+
+@api.route("/analytics/payroll")
+@cache.cached("department", "employee")
+@replicas.read_only
+def payroll_analytics_api():
+    """Returns current payroll totals of the company and its departments."""
+    from department_app.analytics import payroll_analytics
+    try:
+        content = payroll_analytics(request.args)
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": content, "links": {"self": request.full_path.rstrip("?")}})
+
+
+@api.route("/departments/<int:id>")
+@cache.cached("department", "employee")
+@replicas.read_only
+def view_department_api(id):
+    """Returns a single department record."""
+    department = Department.query_with_statistics().filter(Department.id == id).one_or_none()
+    if not department:
+        return jsonify({"error":"Department not found"}), 404
+    response = jsonify({"content": department.to_api_dict(),
+                        "links": {"self": "/api/departments/{}".format(department.id)}})
+    response.set_etag(department.content_etag, weak=True)
+    return response
+
+
+@api.route("/departments/<int:id>", methods=["PUT"])
+@api.route("/departments", methods=["POST"])
+def edit_department_api(id=None):
+    """
+    Creates or modifies department record based on client request.
+    Modification is rejected if If-Match header does not match the current department version.
+    """
+    department = Department() if id is None else \
+        Department.query_with_statistics().filter(Department.id == id).one_or_none()
+    if not department:
+        return jsonify({"error":"Department not found"}), 404
+    if id is not None and not etag_matches(department):
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    try:
+        request_dict = request.get_json(force=True)
+        if request_dict is None:
+            return jsonify({"error":"Invalid json"}), 400
+        department.populate_from_dict(request_dict)
+        db.session.add(department)
+        db.session.flush()
+        id = department.id
+        db.session.commit()
+        department = Department.query_with_statistics().filter(Department.id == id).one()
+        response = jsonify({"content": department.to_api_dict(),
+                            "links": {"self": "/api/departments/{}".format(department.id)}})
+        response.set_etag(department.content_etag, weak=True)
+        return response
+    except (ValueError, TypeError) as e:
+        return jsonify({"error":str(e)}), 400
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    except:
+        db.session.rollback()
+        return jsonify({"error":"Database insertion failed!"}), 400
+
+
+@api.route("/departments/bulk", methods=["POST"])
+def bulk_departments_api():
+    """Creates, modifies and deletes department records in batches based on client request."""
+    try:
+        items = request_items(request)
+        batch_size = parse_batch_size(request.args, current_app.config["BULK_BATCH_SIZE"])
+    except (ValueError, TypeError) as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": process_bulk(Department, "/api/departments", items, batch_size)})
+
+
+@api.route("/departments/<int:id>", methods=["DELETE"])
+def delete_department_api(id):
+    """
+    Deletes department record based by the given id along with its employees
+    or, if reassign_to argument is given, moves its employees to department with reassign_to id.
+    Deletion is rejected if If-Match header does not match the current department version.
+    """
+    department = Department.query_with_statistics().filter(Department.id == id).one_or_none()
+    if not department:
+        return jsonify({"error":"Department not found"}), 404
+    if not etag_matches(department):
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    try:
+        reassign_to = request.args.get("reassign_to", type=int)
+        if "reassign_to" in request.args and reassign_to is None:
+            raise ValueError("Department to reassign employees to is not valid")
+        Department.delete_by_ids([id], reassign_to, {id: department.version})
+        db.session.commit()
+        return jsonify({})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error":str(e)}), 400
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    except:
+        db.session.rollback()
+        return jsonify({"error":"Department record not deleted!"}), 400
+
+
+@api.route("/employees")
+@cache.cached("employee")
+@replicas.read_only
+def employees_api():
+    """Returns a page of employees listing possibly filtered by name, birth date, department and salary."""
+    try:
+        page = search_employees(request.args, Employee.query_api_rows())
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    result = []
+    for row in page.items:
+        result.append({"content": Employee.row_to_api_dict(row),
+                       "links": {"self": "/api/employees/{}".format(row.id),
+                                 "department": "/api/departments/{}".format(row.department_id)}})
+    return json_response({"content": result, "links": page.links()})
+
+
+@api.route("/employees/export.ndjson")
+@replicas.read_only
+def export_employees_ndjson_api():
+    """Streams all employees (possibly filtered as in employees listing) as newline delimited JSON."""
+    try:
+        query = Employee.query.filter(*Employee.search_filters(request.args))
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    chunks = employees_ndjson_chunks(query, current_app.config["EXPORT_BATCH_SIZE"])
+    return Response(stream_with_context(chunks), mimetype="application/x-ndjson")
+
+
+@api.route("/employees/export.csv")
+@replicas.read_only
+def export_employees_csv_api():
+    """Streams all employees (possibly filtered as in employees listing) as CSV file."""
+    try:
+        query = Employee.query.filter(*Employee.search_filters(request.args))
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    chunks = employees_csv_chunks(query, current_app.config["EXPORT_BATCH_SIZE"])
+    return Response(stream_with_context(chunks), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=employees.csv"})
+
+
+@api.route("/employees/<int:id>")
+@cache.cached("employee")
+@replicas.read_only
+def view_employee_api(id):
+    """Returns a single employee record."""
+    employee = Employee.query.get(id)
+    if not employee:
+        return jsonify({"error":"Employee not found"}), 404
+    response = jsonify({"content": employee.to_api_dict(),
+                        "links": {"self": "/api/employees/{}".format(employee.id),
+                                  "department": "/api/departments/{}".format(employee.department_id)}})
+    response.set_etag(employee.etag)
+    return response
+
+
+@api.route("/employees/<int:id>", methods=["PUT"])
+@api.route("/employees", methods=["POST"])
+def edit_employee_api(id=None):
+    """
+    Creates or modifies employee record based on client request.
+    Modification is rejected if If-Match header does not match the current employee ETag.
+    """
+    employee = Employee() if id is None else Employee.query.get(id)
+    if not employee:
+        return jsonify({"error":"Employee not found"}), 404
+    if id is not None and not etag_matches(employee):
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    try:
+        request_dict = request.get_json(force=True)
+        if request_dict is None:
+            return jsonify({"error":"Invalid json"}), 400
+        employee.populate_from_dict(request_dict)
+        db.session.add(employee)
+        db.session.commit()
+        response = jsonify({"content": employee.to_api_dict(),
+                            "links": {"self": "/api/employees/{}".format(employee.id),
+                            "department": "/api/departments/{}".format(employee.department_id)}})
+        response.set_etag(employee.etag)
+        return response
+    except (ValueError, TypeError) as e:
+        return jsonify({"error":str(e)}), 400
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    except:
+        db.session.rollback()
+        return jsonify({"error":"Database insertion failed!"}), 400
+
+
+@api.route("/employees/bulk", methods=["POST"])
+def bulk_employees_api():
+    """Creates, modifies and deletes employee records in batches based on client request."""
+    try:
+        items = request_items(request)
+        batch_size = parse_batch_size(request.args, current_app.config["BULK_BATCH_SIZE"])
+    except (ValueError, TypeError) as e:
+        return jsonify({"error":str(e)}), 400
+    return jsonify({"content": process_bulk(Employee, "/api/employees", items, batch_size)})
+
+
+@api.route("/changes")
+@replicas.read_only
+def changes_api():
+    """
+    Returns a page of changes recorded after the change with sequence number given by since argument,
+    waiting up to wait seconds for changes if there are none yet.
+    """
+    try:
+        since, limit, wait = parse_changes_args(request.args, current_app.config["CHANGES_MAX_WAIT"])
+    except ValueError as e:
+        return jsonify({"error":str(e)}), 400
+    changes = wait_for_changes(since, limit, wait, current_app.config["CHANGES_POLL_INTERVAL"])
+    return json_response(changes_content(changes, since, request.path, request.args.to_dict()))
+
+
+@api.route("/employees/<int:id>", methods=["DELETE"])
+def delete_employee_api(id):
+    """
+    Deletes employee record based by the given id.
+    Deletion is rejected if If-Match header does not match the current employee ETag.
+    """
+    employee = Employee.query.get(id)
+    if not employee:
+        return jsonify({"error":"Employee not found"}), 404
+    if not etag_matches(employee):
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    try:
+        db.session.delete(employee)
+        db.session.commit()
+        return jsonify({})
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"error":CONFLICT_MESSAGE}), 412
+    except:
+        db.session.rollback()
+        return jsonify({"error":"Employee record not deleted!"}), 400
@@ -0,0 +1,202 @@
+"""
+This module implements the HTML user interface of department app as a blueprint.
+
+The user interface stack (Flask-Bootstrap, template bytecode and fragment caches, streamed templates)
+is imported and initialized only when the blueprint is enabled (UI_ENABLED), so API-only workers
+do not pay for it at startup.
+"""
+
+from datetime import date
+from flask import Blueprint, render_template, request, redirect, flash
+from flask_bootstrap import Bootstrap
+from sqlalchemy.orm.exc import StaleDataError
+from department_app import db, replicas, cache
+from department_app.concurrency import CONFLICT_MESSAGE, version_matches
+from department_app.models.entities import Department, Employee
+from department_app.search import search_statement
+from department_app.templating import TemplateCache, stream_template
+
+ui = Blueprint("ui", __name__)
+bootstrap = Bootstrap()
+templates = TemplateCache()
+
+
+def init_app(app):
+    """
+    Initializes the user interface extensions and registers the blueprint in the flask application.
+    """
+    bootstrap.init_app(app)
+    templates.init_app(app)
+    app.register_blueprint(ui)
+
+
+@ui.route("/")
+def index():
+    """Redirects user to departments listing page."""
+    return redirect("/departments")
+
+
+@ui.route("/search")
+@replicas.read_only
+def search():
+    """Displays employee search form."""
+    today = date.today().isoformat()
+    departments = Department.query.order_by(Department.name).all()
+    return render_template("search.html.jinja", today=today, departments=departments)
+
+
+@ui.route("/departments")
+@cache.cached("department", "employee")
+@replicas.read_only
+def departments():
+    """Displays departments list."""
+    return stream_template("departments.html.jinja", departments=Department.query_with_statistics())
+
+
+@ui.route("/departments/<int:id>")
+@cache.cached("department", "employee")
+@replicas.read_only
+def view_department(id):
+    """Displays department."""
+    department = Department.query_with_statistics().filter(Department.id == id).one_or_none()
+    if not department:
+        return "Department not found", 404
+    return stream_template("view_department.html.jinja", department=department)
+
+
+@ui.route("/departments/<int:id>/delete", methods=["GET","POST"])
+def delete_department(id):
+    """Deletes department by id."""
+    department = Department.query_with_statistics().filter(Department.id == id).one_or_none()
+    if not department:
+        return "Department not found", 404
+    if request.method == "POST":
+        name = department.name
+        try:
+            Department.delete_by_ids([id])
+            db.session.commit()
+            flash("Department {} deleted successfully!".format(name))
+            return redirect("/departments")
+        except:
+            db.session.rollback()
+            flash("Department not deleted!")
+            return redirect("/departments/{}".format(id))
+    else:
+        assert request.method == "GET"
+        return render_template("delete_department.html.jinja", department=department)
+
+
+@ui.route("/departments/new/edit", methods=["GET", "POST"])
+@ui.route("/departments/<int:id>/edit", methods=["GET", "POST"])
+def edit_department(id=None):
+    """Displays and processes edit department form for new or existing department."""
+    department = Department() if id is None else Department.query.get(id)
+    response_code = 200
+    if not department:
+        return "Department not found", 404
+    if request.method == "POST" and not version_matches(department, request.form):
+        flash(CONFLICT_MESSAGE)
+        response_code = 412
+    elif request.method == "POST":
+        try:
+            department.populate_from_dict(request.form)
+            db.session.add(department)
+            db.session.commit()
+            return redirect("/departments/{}".format(department.id))
+        except ValueError as e:
+            flash(str(e))
+            response_code = 400
+        except StaleDataError:
+            db.session.rollback()
+            flash(CONFLICT_MESSAGE)
+            department = Department.query.get(id)
+            if not department:
+                return "Department not found", 404
+            response_code = 412
+        except:
+            flash("Database insertion failed!")
+            db.session.rollback()
+            response_code = 400
+    return render_template("edit_department.html.jinja", department=department,
+                            form=department.to_dict()), response_code
+
+
+@ui.route("/employees")
+@replicas.read_only
+def employees():
+    """Displays employees list possibly filtered by name, birth date, department and salary."""
+    try:
+        query, make_page = search_statement(request.args,
+                                            Employee.query.options(db.joinedload(Employee.department)))
+    except ValueError as e:
+        return str(e), 400
+    return stream_template("employees.html.jinja", load_page=lambda: make_page(query.all()))
+
+
+@ui.route("/employees/<int:id>")
+@cache.cached("department", "employee")
+@replicas.read_only
+def view_employee(id):
+    """Displays employee."""
+    employee = Employee.query.options(db.joinedload(Employee.department)) \
+                             .filter(Employee.id == id).one_or_none()
+    if not employee:
+        return "Employee not found", 404
+    return render_template("view_employee.html.jinja", employee=employee)
+
+
+@ui.route("/employees/<int:id>/delete", methods=["GET","POST"])
+def delete_employee(id):
+    """Deletes employee"""
+    employee = Employee.query.get(id)
+    if not employee:
+        return "Employee not found", 404
+    if request.method == "POST":
+        try:
+            db.session.delete(employee)
+            db.session.commit()
+            flash("Employee {} record deleted successfully!".format(employee.full_name))
+            return redirect("/employees")
+        except:
+            flash("Employee record not deleted!")
+            return redirect("/employees/{}".format(employee.id))
+    else:
+        assert request.method == "GET"
+        return render_template("delete_employee.html.jinja", employee=employee)
+
+
+@ui.route("/employees/new/edit", methods=["GET", "POST"])
+@ui.route("/employees/<int:id>/edit", methods=["GET", "POST"])
+def edit_employee(id=None):
+    """Displays and processes edit employee form for new or existing employee."""
+    employee = Employee() if id is None else Employee.query.get(id)
+    departments = Department.query.all()
+    today = date.today().isoformat()
+    response_code = 200
+    if not employee:
+        return "Employee not found", 404
+    if request.method == "POST" and not version_matches(employee, request.form):
+        flash(CONFLICT_MESSAGE)
+        response_code = 412
+    elif request.method == "POST":
+        try:
+            employee.populate_from_dict(request.form)
+            db.session.add(employee)
+            db.session.commit()
+            return redirect("/employees/{}".format(employee.id))
+        except ValueError as e:
+            flash(str(e))
+            response_code = 400
+        except StaleDataError:
+            db.session.rollback()
+            flash(CONFLICT_MESSAGE)
+            employee = Employee.query.get(id)
+            if not employee:
+                return "Employee not found", 404
+            response_code = 412
+        except:
+            flash("Database insertion failed!")
+            db.session.rollback()
+            response_code = 400
+    return render_template("edit_employee.html.jinja", employee=employee,
+                        departments=departments, today=today, form=employee.to_dict()), response_code
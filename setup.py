@@ -9,7 +9,11 @@ setup(
     install_requires=[
         'flask',
         'flask-bootstrap',
-        'flask-sqlalchemy'
-        #'flask-migrate'
-    ]
+        'flask-sqlalchemy',
+        'numpy'
+    ],
+    extras_require={
+        'async': ['aiomysql', 'aiosqlite', 'uvicorn'],
+        'fast-json': ['orjson']
+    }
 )